@@ -7,6 +7,10 @@ from pydantic import BaseModel
 from fastapi import HTTPException
 from sqlalchemy.orm import Session, Query
 from app_api.core.logging_config import logger
+from app_api.core.metrics import redis_command_duration, cache_requests
+
+# Канал, в который публикуются события об изменении записей, чтобы клиенты (бот) сбрасывали свой кэш
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
 
 
 def apply_filter(
@@ -217,6 +221,7 @@ def patch_record(
     cache = Cache(redis=redis, cache_key=cache_key, base_model=base_model)
     cache.delete_key()
     cache.set(query=query, ex=ex)
+    cache.publish_invalidation()
     return query
 
 
@@ -267,7 +272,9 @@ class Cache:
         Returns:
             Optional[Any]: Десериализованный объект модели, если он найден в кэше, иначе None
         """
-        record = self.redis.get(self.cache_key)
+        with redis_command_duration.time(command="get"):
+            record = self.redis.get(self.cache_key)
+        cache_requests.inc(result="miss" if record is None else "hit")
         if record is not None:
             logger.info(f"Found record in cache by key {self.cache_key}")
             cache = self.base_model.model_validate_json(record)
@@ -280,7 +287,9 @@ class Cache:
         Returns:
             List[Any]: Список десериализованных объектов модели, если они найдены в кэше
         """
-        records: str | None = self.redis.get(self.cache_key)
+        with redis_command_duration.time(command="get"):
+            records: str | None = self.redis.get(self.cache_key)
+        cache_requests.inc(result="miss" if records is None else "hit")
         if records is not None:
             cached = self.base_model.model_validate(json.loads(records))
             logger.info(f"Found records in cache by key {self.cache_key} ")
@@ -295,7 +304,8 @@ class Cache:
             ex (Optional[int]): Время жизни кэша в секундах
         """
         cached = self.base_model.model_validate(query).model_dump_json()
-        self.redis.set(self.cache_key, cached, ex=ex)
+        with redis_command_duration.time(command="set"):
+            self.redis.set(self.cache_key, cached, ex=ex)
         logger.info(f"Set cache by key {self.cache_key}  with ex={ex}")
 
     def set_list(self, cached_data, ex=None):
@@ -306,16 +316,26 @@ class Cache:
             cached_data (dict): Список записей для сохранения в кэш
             ex (Optional[int]): Время жизни кэша в секундах
         """
-        self.redis.set(self.cache_key, json.dumps(cached_data), ex=ex)
+        with redis_command_duration.time(command="set"):
+            self.redis.set(self.cache_key, json.dumps(cached_data), ex=ex)
         logger.info(f"Set cache by key {self.cache_key} with ex={ex}")
 
     def delete_key(self):
         """
         Удаляет запись из кэша по текущему ключу.
         """
-        record = self.redis.delete(self.cache_key)
+        with redis_command_duration.time(command="delete"):
+            record = self.redis.delete(self.cache_key)
         logger.info(f"Delete {record} record in cache by key {self.cache_key}")
 
+    def publish_invalidation(self):
+        """
+        Публикует событие об изменении записи по текущему ключу в канал CACHE_INVALIDATION_CHANNEL.
+        """
+        with redis_command_duration.time(command="publish"):
+            self.redis.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"key": self.cache_key}))
+        logger.info(f"Published invalidation of {self.cache_key}")
+
     def delete_keys_by_pattern(self, pattern: str, cursor="0"):
         """
         Удаляет ключи из кэша, соответствующие заданному шаблону.
@@ -327,8 +347,10 @@ class Cache:
         with self.redis as redis_connection:
             keys_to_delete = []
             while cursor != 0:
-                cursor, keys = redis_connection.scan(cursor=cursor, match=pattern, count=100)
+                with redis_command_duration.time(command="scan"):
+                    cursor, keys = redis_connection.scan(cursor=cursor, match=pattern, count=100)
                 keys_to_delete.extend(keys)
             if keys_to_delete:
-                redis_connection.delete(*keys_to_delete)
+                with redis_command_duration.time(command="delete"):
+                    redis_connection.delete(*keys_to_delete)
                 logger.info(f"Deleted {len(keys_to_delete)} keys by pattern {pattern}")
@@ -0,0 +1,351 @@
+import random
+import datetime
+from redis import Redis
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app_api.core.config import setting
+from app_api.core.logging_config import logger
+from app_api.gpt_server import validation
+from app_api.gpt_server.openai_api import LLM, Response
+from app_api.gpt_server.batch import (BatchItem, OpenAIBatchClient, LocalBatchClient, FINISHED_STATUSES,
+                                      collect_results)
+from app_api.models.interaction import GenerationBatches, GenerationBatchStage
+from app_api.models.education import Courses, SubModules, ModuleContents, Questions, QuestionType, ContentType
+from app_api.api.endpoints.prompts.crud import get_prompt
+from app_api.api.endpoints.gpt_models.crud import get_model_by_id
+from ..courses.crud import get_course, invalidate_module_content, invalidate_question, IMAGE_PENDING_KEY
+from ..courses.images import submit_course_images
+from ..courses.schemas import CourseSchema, PatchCourseSchema, ImageMode
+from ...dependencies import patch_record
+from ...telegram_html import render_lesson_messages
+from .schemas import CreateGenerationBatchSchema
+
+
+def get_sub_modules(db: Session, course_id: int) -> list[SubModules]:
+    query = select(SubModules).where(SubModules.module.has(course_id=course_id)).order_by(SubModules.id)
+    return list(db.scalars(query))
+
+
+def get_text_contents(db: Session, sub_module_id: int) -> list[ModuleContents]:
+    """
+    Возвращает текстовые материалы подмодуля в том же порядке, что и update_content_data_and_questions,
+    чтобы запросы пакета совпадали с синхронной генерацией.
+    """
+    query = select(ModuleContents).filter_by(sub_module_id=sub_module_id)
+    query = query.where(ModuleContents.content_type.is_distinct_from(ContentType.image))
+    return list(db.scalars(query.order_by(ModuleContents.order_number.desc())))
+
+
+def build_content_items(db: Session, redis: Redis, course_ids: list[int], language: str) -> list[BatchItem]:
+    """
+    Собирает запросы первого этапа: материал каждой темы (generate_module_content). Изображения создаются
+    этапом изображений (courses/images.py) после сохранения материала.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для доступа к кэшу
+        course_ids (list[int]): ID курсов
+        language (str): Язык материала
+
+    Returns:
+        list[BatchItem]: Запросы пакета.
+    """
+    prompt_content = get_prompt(db=db, redis=redis, name="generate_module_content")
+    model_content = get_model_by_id(db=db, redis=redis, model_id=prompt_content.gpt_model_id)
+    items = []
+    for course_id in course_ids:
+        course = get_course(db=db, redis=redis, course_id=course_id)
+        first_time = True
+        for sub_module in get_sub_modules(db=db, course_id=course_id):
+            previews_sections = []
+            for content in get_text_contents(db=db, sub_module_id=sub_module.id):
+                items.append(BatchItem(
+                    custom_id=f"generate_module_content:{content.id}",
+                    prompt_name="generate_module_content",
+                    model=model_content,
+                    base_model=validation.ContentResponse,
+                    messages=LLM.module_content_messages(
+                        system_content=prompt_content.system,
+                        user_content=prompt_content.user,
+                        course_title=course.title,
+                        sub_module_title=sub_module.title,
+                        content_title=content.title,
+                        previews_sections=list(previews_sections),
+                        summary=course.summary,
+                        is_first_time=first_time,
+                        language=language,
+                        release=model_content.release
+                    )
+                ))
+                first_time = False
+                previews_sections.append(content.title)
+    return items
+
+
+def build_question_items(db: Session, redis: Redis, course_ids: list[int], language: str) -> list[BatchItem]:
+    """
+    Собирает запросы второго этапа по уже сохраненному материалу: вопрос с вариантами ответа к каждой теме и
+    открытый вопрос к случайной теме подмодуля. Тема для открытого вопроса выбирается детерминированно по ID
+    подмодуля, чтобы запросы можно было собрать заново при разборе результатов.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для доступа к кэшу
+        course_ids (list[int]): ID курсов
+        language (str): Язык вопросов
+
+    Returns:
+        list[BatchItem]: Запросы пакета.
+    """
+    prompt_multiple_choice = get_prompt(db=db, redis=redis, name="generate_multiple_choice_question")
+    prompt_open = get_prompt(db=db, redis=redis, name="generate_open_question")
+    model_multiple_choice = get_model_by_id(db=db, redis=redis, model_id=prompt_multiple_choice.gpt_model_id)
+    model_open = get_model_by_id(db=db, redis=redis, model_id=prompt_open.gpt_model_id)
+    items = []
+    for course_id in course_ids:
+        for sub_module in get_sub_modules(db=db, course_id=course_id):
+            generated_contents = [
+                {key: value for key, value in content.content_data.items()
+                 if key not in ("telegram_html", IMAGE_PENDING_KEY)}
+                for content in get_text_contents(db=db, sub_module_id=sub_module.id) if content.content_data
+            ]
+            if not generated_contents:
+                continue
+            for order_number, generated_content in enumerate(generated_contents, start=1):
+                items.append(BatchItem(
+                    custom_id=f"generate_multiple_choice_question:{sub_module.id}:{order_number}",
+                    prompt_name="generate_multiple_choice_question",
+                    model=model_multiple_choice,
+                    base_model=validation.MultipleChoiceQuestionResponse,
+                    messages=LLM.question_messages(
+                        content=generated_content,
+                        user_content=prompt_multiple_choice.user,
+                        language=language
+                    )
+                ))
+            items.append(BatchItem(
+                custom_id=f"generate_open_question:{sub_module.id}:{len(generated_contents) + 1}",
+                prompt_name="generate_open_question",
+                model=model_open,
+                base_model=validation.OpenQuestionResponse,
+                messages=LLM.question_messages(
+                    content=random.Random(sub_module.id).choice(generated_contents),
+                    user_content=prompt_open.user,
+                    language=language
+                )
+            ))
+    return items
+
+
+def add_usage(batch: GenerationBatches, responses: dict[str, Response]):
+    for response in responses.values():
+        batch.input_token += response.input_tokens
+        batch.output_token += response.output_tokens
+        batch.spent_amount += response.spent_amount
+
+
+def set_course_state(db: Session, redis: Redis, course_id: int, course_patch: PatchCourseSchema):
+    patch_record(
+        db=db,
+        redis=redis,
+        identifier=course_id,
+        sql_model=Courses,
+        filters=[["id", course_id, "eq"]],
+        base_model=CourseSchema,
+        patch_schema=course_patch,
+        cache_key=f"course:id:{course_id}",
+    )
+
+
+def save_contents(db: Session, responses: dict[str, Response], image_mode: ImageMode) -> list[ModuleContents]:
+    """
+    Сохраняет материал тем и возвращает измененные темы. Кроме режима ImageMode.skip темы помечаются
+    IMAGE_PENDING_KEY: изображения создает этап изображений, так же как при синхронной генерации.
+    """
+    contents = []
+    for custom_id, response in responses.items():
+        _, content_id = custom_id.split(":")
+        content = db.get(ModuleContents, int(content_id))
+        content.content_data = {
+            **response.content["response"],
+            "telegram_html": render_lesson_messages(content_data=response.content["response"])
+        }
+        if image_mode != ImageMode.skip:
+            content.content_data[IMAGE_PENDING_KEY] = True
+        content.content_type = ContentType.text
+        contents.append(content)
+    db.flush()
+    return contents
+
+
+def save_questions(db: Session, responses: dict[str, Response]) -> list[Questions]:
+    """
+    Сохраняет вопросы и возвращает сохраненные вопросы. Существующий вопрос подмодуля с тем же порядковым номером
+    обновляется, чтобы ответы пользователей при повторной генерации остались привязаны к вопросу.
+    """
+    questions = []
+    for custom_id, response in responses.items():
+        prompt_name, sub_module_id, order_number = custom_id.split(":")
+        question = db.scalars(select(Questions).filter_by(
+            sub_module_id=int(sub_module_id), order_number=int(order_number)
+        )).first()
+        if question is None:
+            question = Questions(sub_module_id=int(sub_module_id), order_number=int(order_number))
+            db.add(question)
+        question.content = response.content["question"]
+        if prompt_name == "generate_open_question":
+            question.question_type = QuestionType.open
+            question.options = None
+        else:
+            question.question_type = QuestionType.multiple_choice
+            question.options = response.content["answers"]
+        questions.append(question)
+    db.flush()
+    return questions
+
+
+def submit_items(batch: GenerationBatches, items: list[BatchItem], client: OpenAIBatchClient | LocalBatchClient):
+    batch.batch_id = client.submit([item.line() for item in items])
+    batch.status = "validating"
+    batch.requests = len(items)
+    batch.submitted_at = datetime.datetime.utcnow()
+
+
+def create_generation_batch(
+        db: Session,
+        redis: Redis,
+        create_batch: CreateGenerationBatchSchema,
+        client: OpenAIBatchClient | LocalBatchClient
+) -> GenerationBatches:
+    """
+    Отправляет пакет первого этапа генерации материала курсов.
+
+    Еще не сгенерированные курсы становятся недоступными до окончания генерации. Уже сгенерированные курсы
+    (повторная генерация после изменения промпта) остаются доступными, материал заменяется при разборе
+    результатов.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для доступа к кэшу
+        create_batch (CreateGenerationBatchSchema): Курсы и язык материала
+        client (OpenAIBatchClient | LocalBatchClient): Клиент пакетов
+
+    Returns:
+        GenerationBatches: Запись о пакетной генерации.
+    """
+    items = build_content_items(
+        db=db, redis=redis, course_ids=create_batch.course_ids, language=create_batch.language
+    )
+    if not items:
+        raise HTTPException(status_code=400, detail="Nothing to generate")
+    batch = GenerationBatches(course_ids=create_batch.course_ids, language=create_batch.language)
+    submit_items(batch=batch, items=items, client=client)
+    db.add(batch)
+    db.commit()
+    for course_id in create_batch.course_ids:
+        if not get_course(db=db, redis=redis, course_id=course_id).is_generated:
+            set_course_state(db=db, redis=redis, course_id=course_id, course_patch=PatchCourseSchema(available=False))
+    db.refresh(batch)
+    logger.info(f"Submitted generation batch {batch.batch_id} with {len(items)} requests")
+    return batch
+
+
+def get_generation_batch(db: Session, batch_id: int) -> GenerationBatches:
+    batch = db.get(GenerationBatches, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Generation batch not found")
+    return batch
+
+
+def poll_generation_batch(
+        db: Session,
+        redis: Redis,
+        batch_id: int,
+        client: OpenAIBatchClient | LocalBatchClient,
+        gpt: LLM
+) -> GenerationBatches:
+    """
+    Проверяет статус текущего пакета и, если он завершен, сохраняет результаты.
+
+    После этапа content сохраняется материал, изображения тем ставятся в очередь этапа изображений по
+    IMAGE_MODE и отправляется пакет вопросов. После этапа
+    questions сохраняются вопросы, и курсы отмечаются сгенерированными. Запросы, для которых пакет не вернул
+    валидный ответ (ошибка, истечение срока, невалидный JSON), выполняются синхронно.
+
+    Запись пакета блокируется (SELECT ... FOR UPDATE SKIP LOCKED) до сохранения результатов этапа и перехода
+    на следующий этап. Параллельная проверка того же пакета (повторный запуск cron) не ждет блокировку и
+    возвращает запись как есть, а следующая проверка видит уже новый этап, поэтому результаты не сохраняются
+    дважды.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для доступа к кэшу
+        batch_id (int): ID записи о пакетной генерации
+        client (OpenAIBatchClient | LocalBatchClient): Клиент пакетов
+        gpt (LLM): Объект LLM для повторного выполнения запросов
+
+    Returns:
+        GenerationBatches: Обновленная запись о пакетной генерации.
+    """
+    batch = db.scalars(
+        select(GenerationBatches)
+        .filter_by(id=batch_id)
+        .with_for_update(skip_locked=True)
+        .execution_options(populate_existing=True)
+    ).first()
+    if batch is None:
+        # Пакет обрабатывается другим запросом: его результаты не сохраняются повторно
+        batch = get_generation_batch(db=db, batch_id=batch_id)
+        logger.info(f"Generation batch {batch.id} is being processed by another poll")
+        return batch
+    if batch.stage == GenerationBatchStage.done:
+        db.commit()
+        return batch
+    batch.status = client.status(batch.batch_id)
+    if batch.status not in FINISHED_STATUSES:
+        db.commit()
+        return batch
+    latency_ms = (datetime.datetime.utcnow() - batch.submitted_at).total_seconds() * 1000
+    results = client.results(batch.batch_id)
+    if batch.stage == GenerationBatchStage.content:
+        items = build_content_items(db=db, redis=redis, course_ids=batch.course_ids, language=batch.language)
+        responses = collect_results(items=items, results=results, latency_ms=latency_ms, gpt=gpt)
+        add_usage(batch=batch, responses=responses)
+        # Режим изображений не хранится в записи пакета, поэтому берется из настройки на момент разбора
+        image_mode = ImageMode(setting.IMAGE_MODE)
+        contents = save_contents(db=db, responses=responses, image_mode=image_mode)
+        submit_items(
+            batch=batch,
+            items=build_question_items(db=db, redis=redis, course_ids=batch.course_ids, language=batch.language),
+            client=client
+        )
+        batch.stage = GenerationBatchStage.questions
+        db.commit()
+        # Повторная генерация заменяет материал уже доступных курсов, бот кэширует его до
+        # READ_CACHE_IMMUTABLE_TTL, поэтому событие публикуется для каждой темы
+        for content in contents:
+            invalidate_module_content(redis=redis, content=content)
+        if image_mode == ImageMode.background:
+            for course_id in batch.course_ids:
+                submit_course_images(db=db, redis=redis, course_id=course_id)
+    else:
+        items = build_question_items(db=db, redis=redis, course_ids=batch.course_ids, language=batch.language)
+        responses = collect_results(items=items, results=results, latency_ms=latency_ms, gpt=gpt)
+        add_usage(batch=batch, responses=responses)
+        questions = save_questions(db=db, responses=responses)
+        batch.stage = GenerationBatchStage.done
+        db.commit()
+        for question in questions:
+            invalidate_question(redis=redis, question=question)
+        for course_id in batch.course_ids:
+            set_course_state(
+                db=db,
+                redis=redis,
+                course_id=course_id,
+                course_patch=PatchCourseSchema(is_generated=True, available=True)
+            )
+    db.refresh(batch)
+    logger.info(f"Generation batch {batch.id} moved to stage {batch.stage.value}")
+    return batch
@@ -0,0 +1,66 @@
+from redis import Redis
+from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends
+from app_api.db.session import get_db
+from app_api.db.redis_connection import get_redis
+from app_api.gpt_server.openai_api import LLM
+from app_api.gpt_server.batch import get_batch_client
+from .crud import create_generation_batch, get_generation_batch, poll_generation_batch
+from .schemas import CreateGenerationBatchSchema, GenerationBatchSchema
+
+generation_batches = APIRouter(prefix="/generation-batches", tags=["Generation Batches"])
+
+
+@generation_batches.post(path="",
+                         response_model=GenerationBatchSchema,
+                         summary="Отправляет пакетную генерацию материала курсов"
+                         )
+def generation_batch_route(create_batch: CreateGenerationBatchSchema,
+                           db: Session = Depends(get_db),
+                           redis: Redis = Depends(get_redis)
+                           ):
+    """
+    Отправляет генерацию материала курсов через Batch API.
+
+    Подходит для неинтерактивной генерации: подготовки популярных курсов каталога и повторной генерации после
+    изменения промптов. Результат приходит в течение суток по цене пакета (LLM_BATCH_PRICE_FACTOR от обычной).
+    Генерация идет в два пакета: материал тем, затем вопросы по нему. Переход между этапами выполняет
+    `POST /generation-batches/{id}/poll`.
+
+    ### Параметры
+    - `course_ids` (list[int]): ID курсов с составленным планом.
+    - `language` (str): Язык материала.
+
+    ### Возвращает
+    - `GenerationBatchSchema`: Запись о пакетной генерации.
+    """
+    return create_generation_batch(db=db, redis=redis, create_batch=create_batch, client=get_batch_client())
+
+
+@generation_batches.get(path="/{batch_id}",
+                        response_model=GenerationBatchSchema,
+                        summary="Получает состояние пакетной генерации"
+                        )
+def generation_batch_route(batch_id: int, db: Session = Depends(get_db)):
+    return get_generation_batch(db=db, batch_id=batch_id)
+
+
+@generation_batches.post(path="/{batch_id}/poll",
+                         response_model=GenerationBatchSchema,
+                         summary="Проверяет пакет и сохраняет результаты"
+                         )
+def generation_batch_route(batch_id: int,
+                           db: Session = Depends(get_db),
+                           redis: Redis = Depends(get_redis)
+                           ):
+    """
+    Проверяет статус текущего пакета у провайдера. Если пакет завершен, сохраняет материал и отправляет пакет
+    вопросов либо сохраняет вопросы и отмечает курсы сгенерированными. Вызывается периодически, например по cron.
+
+    ### Параметры
+    - `batch_id` (int): ID записи о пакетной генерации.
+
+    ### Возвращает
+    - `GenerationBatchSchema`: Обновленная запись о пакетной генерации.
+    """
+    return poll_generation_batch(db=db, redis=redis, batch_id=batch_id, client=get_batch_client(), gpt=LLM())
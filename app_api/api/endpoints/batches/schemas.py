@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, Field
+from app_api.models.interaction import GenerationBatchStage
+
+
+class CreateGenerationBatchSchema(BaseModel):
+    course_ids: list[int] = Field(title="ID курсов, материал которых генерируется пакетом", examples=[[1, 2, 3]])
+    language: str = Field(title="Язык материала", examples=["Русский"])
+
+
+class GenerationBatchSchema(BaseModel):
+    id: int = Field(title="Уникальный ID", examples=[1])
+    batch_id: str = Field(title="ID текущего пакета у провайдера", examples=["batch_abc123"])
+    stage: GenerationBatchStage = Field(title="Этап генерации", examples=["content"])
+    status: str = Field(title="Статус текущего пакета у провайдера", examples=["in_progress"])
+    course_ids: list[int] = Field(title="ID курсов", examples=[[1, 2, 3]])
+    language: str = Field(title="Язык материала", examples=["Русский"])
+    requests: int = Field(title="Количество запросов в текущем пакете", examples=[120])
+    input_token: int = Field(title="Количество входящих токенов", examples=[215000])
+    output_token: int = Field(title="Количество исходящих токенов", examples=[98000])
+    spent_amount: float = Field(title="Стоимость генерации", examples=[2.06])
+    submitted_at: datetime = Field(title="Дата отправки текущего пакета")
+    created_at: datetime = Field(title="Дата создания")
+    last_updated_at: Optional[datetime] = Field(title="Дата последнего обновления", default=None)
+
+    class Config:
+        from_attributes = True
@@ -1,13 +1,16 @@
 import random
 import threading
+import contextvars
 from typing import Type
 from redis import Redis
+from fastapi import HTTPException
 from sqlalchemy import select
 from collections import Counter
 from sqlalchemy.orm import Session, scoped_session
 
-from app_api.db.storage import download_file_from_url, upload_file
-from app_api.gpt_server.openai_api import LLM
+from app_api.core.logging_config import logger
+from app_api.core.tracing import traced
+from app_api.gpt_server.openai_api import LLM, Response
 from app_api.db.session import SessionLocal
 from app_api.models.education import CurrentStage
 from concurrent.futures import ThreadPoolExecutor
@@ -15,11 +18,16 @@ from app_api.models.education import UserCourseTracker
 from app_api.api.endpoints.prompts.crud import get_prompt
 from ..prompts.schemas import PromptsSchema
 from ...dependencies import get_record, Cache, patch_record
+from ...telegram_html import render_lesson_messages, is_rendered
 from app_api.api.endpoints.gpt_models.crud import get_model_by_id
 from app_api.api.endpoints.user_courses.schemas import UserCoursesSchema
 from app_api.models.education import Courses, Modules, SubModules, ModuleContents, Questions, QuestionType, ContentType
 from .schemas import (CreateCoursePlanSchema, CourseSchema, ModulesSchema, SubModulesSchema, ModuleContentsSchema,
-                      QuestionsSchema, PatchCourseSchema)
+                      QuestionsSchema, PatchCourseSchema, ImageMode)
+
+# Ключ в content_data текста урока: изображение урока еще не создано. Снимается этапом изображений после
+# сохранения изображения, поэтому переживает ошибки и перезапуск API (см. courses/images.py)
+IMAGE_PENDING_KEY = "image_pending"
 
 
 def add_course_data(
@@ -283,6 +291,95 @@ def get_module_content(
     return query
 
 
+def set_content_telegram_file_id(
+        db: Session,
+        redis: Redis,
+        content_id: int,
+        telegram_file_id: str,
+) -> ModuleContents:
+    """
+    Сохраняет в content_data изображения file_id, под которым оно уже загружено в Telegram, чтобы бот отправлял
+    его по file_id, а не скачивал и не загружал файл заново.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных.
+        redis (Redis): Клиент Redis для доступа к кэшу.
+        content_id (int): ID контента с изображением.
+        telegram_file_id (str): file_id изображения в Telegram.
+
+    Returns:
+        ModuleContents: Обновленный контент.
+
+    Raises:
+        HTTPException: Если контент не найден или не является изображением.
+    """
+    content = db.get(ModuleContents, content_id)
+    if content is None or content.content_type != ContentType.image:
+        raise HTTPException(status_code=404, detail=f"Image content `{content_id}` not found")
+    # JSON колонка не отслеживает изменения внутри словаря, поэтому присваиваем новый объект
+    content.content_data = {**(content.content_data or {}), "telegram_file_id": telegram_file_id}
+    db.commit()
+    db.refresh(content)
+    invalidate_module_content(redis=redis, content=content)
+    return content
+
+
+def invalidate_module_content(redis: Redis, content: ModuleContents):
+    """
+    Удаляет контент из кэша API и публикует событие, по которому бот удаляет его из своего кэша.
+
+    Args:
+        redis (Redis): Клиент Redis для доступа к кэшу.
+        content (ModuleContents): Измененный контент.
+    """
+    Cache(
+        redis=redis,
+        cache_key=f"module_content:order_number:{content.order_number}:sub_module_id:content_type:"
+                  f"{content.content_type}:{content.sub_module_id}"
+    ).delete_key()
+    # Бот кэширует контент по своему ключу, поэтому событие публикуется отдельно
+    Cache(
+        redis=redis,
+        cache_key=f"module_content:sub_module_id:{content.sub_module_id}:order_number:{content.order_number}"
+                  f":content_type:{content.content_type.value}"
+    ).publish_invalidation()
+
+
+def render_stored_lessons(db: Session, redis: Redis, batch_size: int = 100) -> int:
+    """
+    Разовая миграция: сохраняет Telegram HTML уроков, сгенерированных до того, как рендеринг перенесли в
+    генерацию (без нее такие уроки рендерятся при каждом чтении из базы). Запускается скриптом
+    app_api/db/render_telegram_html.py.
+
+    Изменения отправляются в базу (flush) каждые batch_size уроков и фиксируются одним коммитом в конце,
+    после чего кэш контента уроков сбрасывается.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных.
+        redis (Redis): Клиент Redis для доступа к кэшу.
+        batch_size (int): Количество уроков, которые читаются из базы за раз и отправляются в нее одним flush.
+
+    Returns:
+        int: Количество обновленных уроков.
+    """
+    query = select(ModuleContents).filter_by(content_type=ContentType.text).order_by(ModuleContents.id)
+    rendered = 0
+    for content in db.scalars(query.execution_options(yield_per=batch_size)):
+        if not content.content_data or is_rendered(content.content_data):
+            continue
+        content.content_data = {
+            **content.content_data,
+            "telegram_html": render_lesson_messages(content_data=content.content_data)
+        }
+        rendered += 1
+        if rendered % batch_size == 0:
+            db.flush()
+    db.commit()
+    Cache(redis=redis).delete_keys_by_pattern(pattern="module_content:*")
+    logger.info(f"Rendered Telegram HTML for {rendered} lessons")
+    return rendered
+
+
 def get_question(
         db: Session,
         redis: Redis,
@@ -316,6 +413,113 @@ def get_question(
     return query
 
 
+def invalidate_question(redis: Redis, question: Questions):
+    """
+    Удаляет вопрос из кэша API и публикует событие, по которому бот удаляет его из своего кэша.
+
+    Args:
+        redis (Redis): Клиент Redis для доступа к кэшу.
+        question (Questions): Измененный вопрос.
+    """
+    for cache_key in (f"question:order_number:{question.order_number}:sub_module_id:{question.sub_module_id}",
+                      f"get_question:order_number:{question.order_number}:sub_module_id:{question.sub_module_id}"):
+        Cache(redis=redis, cache_key=cache_key).delete_key()
+    Cache(
+        redis=redis,
+        cache_key=f"question:sub_module_id:{question.sub_module_id}:order_number:{question.order_number}"
+    ).publish_invalidation()
+
+
+def generate_questions(
+        session: Session,
+        redis: Redis,
+        gpt: LLM,
+        generated_contents: list[dict],
+        language: str
+) -> tuple[list[dict], list[Response]]:
+    """
+    Генерирует вопросы подмодуля: вопрос с вариантами ответа к каждому материалу и открытый вопрос.
+
+    Если в базе есть промпт generate_sub_module_questions, все вопросы запрашиваются одним запросом, и материалы
+    передаются модели один раз. Если промпта нет или ответ не прошел валидацию, вопросы генерируются отдельными
+    запросами к generate_multiple_choice_question и generate_open_question.
+
+    Args:
+        session (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для кэширования данных
+        gpt (LLM): Объект LLM для генерации вопросов
+        generated_contents (list[dict]): Сгенерированные материалы подмодуля
+        language (str): Язык вопросов
+
+    Returns:
+        tuple[list[dict], list[Response]]: Поля вопросов (content, question_type, options) в порядке номеров
+         и ответы модели для учета токенов.
+    """
+    prompt_questions = get_prompt(db=session, redis=redis, name="generate_sub_module_questions", only_check=True)
+    if prompt_questions is not None:
+        model_questions = get_model_by_id(db=session, redis=redis, model_id=prompt_questions.gpt_model_id)
+        try:
+            response = gpt.generate_sub_module_questions(
+                contents=generated_contents,
+                system_content=prompt_questions.system,
+                user_content=prompt_questions.user,
+                language=language,
+                model=model_questions
+            )
+        except Exception as error:
+            logger.warning(f"Combined question generation failed, generating questions one by one: {error}")
+        else:
+            questions = [
+                {
+                    "content": question["question"],
+                    "question_type": QuestionType.multiple_choice,
+                    "options": question["answers"]
+                }
+                for question in response.content["multiple_choice"]
+            ]
+            questions.append({
+                "content": response.content["open_question"]["question"],
+                "question_type": QuestionType.open,
+                "options": None
+            })
+            return questions, [response]
+    questions = []
+    responses = []
+    prompt_multiple_choice = get_prompt(db=session, redis=redis, name="generate_multiple_choice_question")
+    model_multiple_choice = get_model_by_id(db=session, redis=redis, model_id=prompt_multiple_choice.gpt_model_id)
+    for generated_content in generated_contents:
+        mc_questions = gpt.generate_multiple_choice_question(
+            content=generated_content,
+            model=model_multiple_choice,
+            user_content=prompt_multiple_choice.user,
+            language=language
+        )
+        responses.append(mc_questions)
+        questions.append({
+            "content": mc_questions.content["question"],
+            "question_type": QuestionType.multiple_choice,
+            "options": mc_questions.content["answers"]
+        })
+    prompt_open = get_prompt(db=session, redis=redis, name="generate_open_question")
+    model_open = get_model_by_id(db=session, redis=redis, model_id=prompt_open.gpt_model_id)
+    random_content = random.choice(generated_contents)
+    open_question_content = gpt.generate_open_question(
+        content=random_content,
+        user_content=prompt_open.user,
+        model=model_open,
+        language=language
+
+    )
+    responses.append(open_question_content)
+    questions.append({
+        "content": open_question_content.content["question"],
+        "question_type": QuestionType.open,
+        "options": None
+    })
+    return questions, responses
+
+
+@traced("courses.update_content_data_and_questions")
 def update_content_data_and_questions(
         course_title: str,
         summary: str,
@@ -324,14 +528,15 @@ def update_content_data_and_questions(
         sub_module: Type[SubModules] | SubModules,
         redis: Redis,
         gpt: LLM,
-        ScopedSession: scoped_session
+        ScopedSession: scoped_session,
+        image_mode: ImageMode = ImageMode.background
 ):
     """
     Обновляет данные контента и вопросы для указанного подмодуля курса.
 
-    Функция генерирует текстовый и изображенный контент для подмодуля курса,
-    а также создаёт вопросы с несколькими вариантами ответа и открытые вопросы,
-    используя GPT-модель.
+    Функция генерирует текстовый контент для подмодуля курса, а также создаёт вопросы с несколькими вариантами
+    ответа и открытые вопросы, используя GPT-модель. Изображения уроков создаются отдельным этапом
+    (courses/images.py) и здесь не ожидаются.
 
     Args:
         course_title (str): Название курса
@@ -342,6 +547,7 @@ def update_content_data_and_questions(
         redis (Redis): Клиент Redis для кэширования данных
         gpt (LLM): Объект LLM для генерации контента и вопросов
         ScopedSession (scoped_session): Скоуп сессия для работы с базой данных
+        image_mode (ImageMode): Режим создания изображений, кроме ImageMode.skip уроки помечаются IMAGE_PENDING_KEY
 
     Returns:
         dict: Словарь с информацией о затратах, потраченных и выходных токенах.
@@ -356,10 +562,6 @@ def update_content_data_and_questions(
     input_token = 0
     output_token = 0
     prompt_content = get_prompt(db=session, redis=redis, name="generate_module_content")
-    generate_prompt = get_prompt(db=session, redis=redis, name="generate_prompt")
-    generate_image = get_prompt(db=session, redis=redis, name="generate_image")
-    model_image = get_model_by_id(db=session, redis=redis, model_id=generate_image.gpt_model_id)
-    model_prompt = get_model_by_id(db=session, redis=redis, model_id=generate_prompt.gpt_model_id)
     model_content = get_model_by_id(db=session, redis=redis, model_id=prompt_content.gpt_model_id)
     for content in module_contents:
         content_cache_key = f"module_content:order_number:{content.order_number}:sub_module_id:{content.sub_module_id}"
@@ -381,107 +583,56 @@ def update_content_data_and_questions(
         spent_amount += generated_content.spent_amount
         input_token += generated_content.input_tokens
         output_token += generated_content.output_tokens
-        content.content_data = generated_content.content["response"]
+        content.content_data = {
+            **generated_content.content["response"],
+            "telegram_html": render_lesson_messages(content_data=generated_content.content["response"])
+        }
+        if image_mode != ImageMode.skip:
+            content.content_data[IMAGE_PENDING_KEY] = True
         content.content_type = ContentType.text
         session.add(content)
         session.flush()
         generated_contents.append(generated_content.content["response"])
         previews_sections.append(content.title)
         content_cache.set(query=content, ex=259200)
-        image_content_cache_key = f"{content_cache_key}:content_type:{ContentType.image}"
-        content_cache = Cache(redis=redis, cache_key=image_content_cache_key, base_model=ModuleContentsSchema)
-        generate_prompt_image = gpt.generate_prompt(
-            system_content=generate_prompt.system,
-            user_content=generate_prompt.user,
-            content_title=course_title,
-            sub_module_title=sub_module.title,
-            course_title=content.title,
-            model=model_prompt
-        )
-        spent_amount += generate_prompt_image.spent_amount
-        input_token += generate_prompt_image.input_tokens
-        output_token += generate_prompt_image.output_tokens
-        url_image = gpt.generate_image(prompt=generate_prompt_image.content["prompt"], model=model_image)
-        image = download_file_from_url(url_image)
-        fid = upload_file(image)
-        image_content = ModuleContents(
-            sub_module_id=content.sub_module_id,
-            title=content.title,
-            content_type=ContentType.image,
-            content_data={"fid": fid},
-            order_number=content.order_number
-        )
-        session.add(image_content)
-        session.flush()
-        spent_amount += 0.04
-        content_cache.set(query=image_content, ex=259200)
-    prompt_multiple_choice = get_prompt(db=session, redis=redis, name="generate_multiple_choice_question")
-    model_multiple_choice = get_model_by_id(db=session, redis=redis, model_id=prompt_multiple_choice.gpt_model_id)
-    question_order_number = 0
-    for generated_content in generated_contents:
-        question_order_number += 1
-        mc_questions = gpt.generate_multiple_choice_question(
-            content=generated_content,
-            model=model_multiple_choice,
-            user_content=prompt_multiple_choice.user,
-            language=language
-        )
-        spent_amount += mc_questions.spent_amount
-        input_token += mc_questions.input_tokens
-        output_token += mc_questions.output_tokens
-        question = Questions(
-            sub_module_id=sub_module.id,
-            content=mc_questions.content["question"],
-            question_type=QuestionType.multiple_choice,
-            options=mc_questions.content["answers"],
-            order_number=question_order_number
-        )
+    questions, responses = generate_questions(
+        session=session,
+        redis=redis,
+        gpt=gpt,
+        generated_contents=generated_contents,
+        language=language
+    )
+    for response in responses:
+        spent_amount += response.spent_amount
+        input_token += response.input_tokens
+        output_token += response.output_tokens
+    for order_number, question in enumerate(questions, start=1):
+        question = Questions(sub_module_id=sub_module.id, order_number=order_number, **question)
         question_cache_key = f"question:order_number:{question.order_number}:sub_module_id:{sub_module.id}"
         question_cache = Cache(redis=redis, cache_key=question_cache_key, base_model=QuestionsSchema)
         session.add(question)
         session.flush()
         question_cache.set(query=question, ex=259200)
-    prompt_open = get_prompt(db=session, redis=redis, name="generate_open_question")
-    model_open = get_model_by_id(db=session, redis=redis, model_id=prompt_open.gpt_model_id)
-    random_content = random.choice(generated_contents)
-    open_question_content = gpt.generate_open_question(
-        content=random_content,
-        user_content=prompt_open.user,
-        model=model_open,
-        language=language
-
-    )
-    spent_amount += open_question_content.spent_amount
-    input_token += open_question_content.input_tokens
-    output_token += open_question_content.output_tokens
-    open_question = Questions(
-        sub_module_id=sub_module.id,
-        content=open_question_content.content["question"],
-        question_type=QuestionType.open,
-        order_number=question_order_number + 1
-    )
-    question_cache_key = f"question:order_number:{open_question.order_number}:sub_module_id:{sub_module.id}"
-    question_cache = Cache(redis=redis, cache_key=question_cache_key, base_model=QuestionsSchema)
-    session.add(open_question)
-    session.flush()
-    question_cache.set(query=open_question, ex=259200)
     session.commit()
     return {"spent_amount": spent_amount, "input_token": input_token, "output_token": output_token}
 
 
+@traced("courses.generate_main_content")
 def generate_main_content(
         db: Session,
         language: str,
         course: CourseSchema,
         redis: Redis,
-        gpt: LLM
+        gpt: LLM,
+        image_mode: ImageMode = ImageMode.background
 ):
     """
     Генерирует основной контент курса, обновляет и сохраняет его в базу данных и кэш.
 
     Функция обновляет состояние курса на "недоступно" до завершения генерации контента.
-    Генерируется текстовый контент и изображения, а также создаются вопросы для каждого
-    подмодуля курса. Вся информация сохраняется в базу данных и кэш.
+    Генерируется текстовый контент и создаются вопросы для каждого подмодуля курса. Вся информация
+    сохраняется в базу данных и кэш. Изображения уроков в курс не входят: их ставит в очередь вызывающий
+    код в зависимости от image_mode.
 
     Args:
         db (Session): Сессия SQLAlchemy для доступа к базе данных
@@ -489,6 +640,7 @@ def generate_main_content(
         course (CourseSchema): Схема курса, для которого генерируется контент
         redis (Redis): Клиент Redis для кэширования данных
         gpt (LLM): Объект LLM для генерации контента и вопросов
+        image_mode (ImageMode): Режим создания изображений уроков
     """
     course_patch = PatchCourseSchema(available=False)
     patch_record(
@@ -508,7 +660,9 @@ def generate_main_content(
     with ThreadPoolExecutor() as executor:
         futures = []
         for sub_module in sub_modules:
+            # Каждая задача получает копию контекста, чтобы спаны подмодулей попали в трассировку запроса
             futures.append(executor.submit(
+                contextvars.copy_context().run,
                 update_content_data_and_questions,
                 course_title=course.title,
                 summary=course.summary,
@@ -517,7 +671,8 @@ def generate_main_content(
                 language=language,
                 gpt=gpt,
                 first_time=first_time,
-                ScopedSession=ScopedSession
+                ScopedSession=ScopedSession,
+                image_mode=image_mode
             )
             )
             first_time = False
@@ -546,6 +701,7 @@ def generate_main_content(
     cache = Cache(redis=redis, cache_key=f"user_course:id:{user_course.id}", base_model=UserCoursesSchema)
     cache.delete_key()
     cache.set(query=user_course, ex=259200)
+    cache.publish_invalidation()
     cache.delete_keys_by_pattern(pattern=f"archived_user_courses:user:{user_course.user_id}*")
     cache.delete_keys_by_pattern(pattern=f"unfinished_user_courses:user:{user_course.user_id}*")
     cache.delete_keys_by_pattern(pattern=f"active_user_courses:user:{user_course.user_id}*")
@@ -0,0 +1,228 @@
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from redis import Redis
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app_api.core.config import setting
+from app_api.core.logging_config import logger
+from app_api.core.tracing import traced
+from app_api.db.session import SessionLocal
+from app_api.db.image_variants import ingest_generated_image
+from app_api.gpt_server.openai_api import LLM, IMAGE_GENERATION_PRICE
+from app_api.models.education import SubModules, ModuleContents, ContentType
+from app_api.api.endpoints.prompts.crud import get_prompt
+from app_api.api.endpoints.gpt_models.crud import get_model_by_id
+from ..user_courses.crud import add_user_course_usage
+from ...dependencies import Cache
+from .crud import get_module_content, IMAGE_PENDING_KEY
+from .schemas import ModuleContentsSchema
+
+
+class ImageStage:
+    """
+    Этап создания изображений уроков: описание (generate_prompt), изображение (generate_image) и перенос в
+    хранилище.
+
+    Выполняется в своем пуле из workers потоков, отдельно от генерации материала и вопросов, поэтому курс
+    становится доступен, не дожидаясь изображений, а количество одновременных запросов к генерации
+    изображений ограничено независимо от текстовых запросов. Урок, изображение которого уже создается,
+    повторно не ставится в очередь.
+
+    Очередь хранится только в памяти, а признак урока без изображения - в базе (IMAGE_PENDING_KEY в content_data
+    текста урока), и снимается только после сохранения изображения. Если создание изображения завершилось
+    ошибкой или API перезапустился, изображение создается заново при следующем обращении к уроку
+    (request_pending_images).
+    """
+
+    def __init__(self, workers: int = setting.IMAGE_STAGE_WORKERS):
+        """
+        Args:
+            workers (int): Максимум изображений, которые создаются одновременно
+        """
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-stage")
+        self.__lock = threading.Lock()
+        self.__pending: set[tuple[int, int]] = set()
+
+    def submit(self, redis: Redis, sub_module_id: int, order_number: int, user_course_id: int | None = None) -> bool:
+        """
+        Ставит в очередь создание изображения урока.
+
+        Args:
+            redis (Redis): Клиент Redis для доступа к кэшу
+            sub_module_id (int): ID подмодуля
+            order_number (int): Порядковый номер урока в подмодуле
+            user_course_id (int | None): ID курса пользователя, на который записываются расходы
+
+        Returns:
+            bool: False, если изображение урока уже в очереди.
+        """
+        key = (sub_module_id, order_number)
+        with self.__lock:
+            if key in self.__pending:
+                return False
+            self.__pending.add(key)
+        # Копия контекста, чтобы спан изображения попал в трассировку запроса, который его поставил в очередь
+        future = self.__executor.submit(
+            contextvars.copy_context().run,
+            self._create,
+            redis=redis,
+            sub_module_id=sub_module_id,
+            order_number=order_number,
+            user_course_id=user_course_id
+        )
+        future.add_done_callback(lambda done: self._finish(key=key, future=done))
+        return True
+
+    def _finish(self, key: tuple[int, int], future: Future):
+        with self.__lock:
+            self.__pending.discard(key)
+        if future.exception() is not None:
+            logger.error(f"Failed to create image for sub module {key[0]} lesson {key[1]}: {future.exception()}")
+
+    @staticmethod
+    def _clear_pending(session: Session, redis: Redis, text: ModuleContents):
+        """
+        Снимает с текста урока IMAGE_PENDING_KEY, сохраняет изменения и обновляет кэш текста.
+        """
+        if not (text.content_data or {}).get(IMAGE_PENDING_KEY):
+            session.commit()
+            return
+        text.content_data = {key: value for key, value in text.content_data.items() if key != IMAGE_PENDING_KEY}
+        session.commit()
+        Cache(
+            redis=redis,
+            cache_key=f"module_content:order_number:{text.order_number}:sub_module_id:content_type:"
+                      f"{ContentType.text}:{text.sub_module_id}",
+            base_model=ModuleContentsSchema
+        ).set(query=text, ex=259200)
+
+    @staticmethod
+    @traced("courses.create_lesson_image")
+    def _create(redis: Redis, sub_module_id: int, order_number: int, user_course_id: int | None):
+        session = SessionLocal()
+        try:
+            contents = session.scalars(select(ModuleContents).filter_by(
+                sub_module_id=sub_module_id, order_number=order_number
+            )).all()
+            text = next((content for content in contents if content.content_type == ContentType.text), None)
+            if text is None:
+                return
+            if any(content.content_type == ContentType.image for content in contents):
+                ImageStage._clear_pending(session=session, redis=redis, text=text)
+                return
+            sub_module = session.get(SubModules, sub_module_id)
+            course = sub_module.module.course
+            prompt_image = get_prompt(db=session, redis=redis, name="generate_prompt")
+            generate_image = get_prompt(db=session, redis=redis, name="generate_image")
+            model_prompt = get_model_by_id(db=session, redis=redis, model_id=prompt_image.gpt_model_id)
+            model_image = get_model_by_id(db=session, redis=redis, model_id=generate_image.gpt_model_id)
+            gpt = LLM()
+            image_prompt = gpt.generate_prompt(
+                system_content=prompt_image.system,
+                user_content=prompt_image.user,
+                content_title=course.title,
+                sub_module_title=sub_module.title,
+                course_title=text.title,
+                model=model_prompt
+            )
+            image = gpt.generate_image(prompt=image_prompt.content["prompt"], model=model_image,
+                                       response_format=setting.IMAGE_RESPONSE_FORMAT)
+            content_data = ingest_generated_image(image=image, response_format=setting.IMAGE_RESPONSE_FORMAT)
+            image_content = ModuleContents(
+                sub_module_id=sub_module_id,
+                title=text.title,
+                content_type=ContentType.image,
+                content_data=content_data,
+                order_number=order_number
+            )
+            session.add(image_content)
+            session.flush()
+            ImageStage._clear_pending(session=session, redis=redis, text=text)
+            Cache(
+                redis=redis,
+                cache_key=f"module_content:order_number:{order_number}:sub_module_id:content_type:"
+                          f"{ContentType.image}:{sub_module_id}",
+                base_model=ModuleContentsSchema
+            ).set(query=image_content, ex=259200)
+            if user_course_id is not None:
+                add_user_course_usage(
+                    db=session,
+                    redis=redis,
+                    user_course_id=user_course_id,
+                    input_tokens=image_prompt.input_tokens,
+                    output_tokens=image_prompt.output_tokens,
+                    spent_amount=image_prompt.spent_amount + IMAGE_GENERATION_PRICE
+                )
+            logger.info(f"Image created for sub module {sub_module_id} lesson {order_number}")
+        finally:
+            session.close()
+
+
+image_stage = ImageStage()
+
+
+def submit_course_images(db: Session, redis: Redis, course_id: int, user_course_id: int | None = None) -> int:
+    """
+    Ставит в очередь изображения всех уроков курса, у которых их еще нет.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для доступа к кэшу
+        course_id (int): ID курса
+        user_course_id (int | None): ID курса пользователя, на который записываются расходы
+
+    Returns:
+        int: Количество уроков, поставленных в очередь.
+    """
+    lessons = db.execute(
+        select(ModuleContents.sub_module_id, ModuleContents.order_number)
+        .join(SubModules, SubModules.id == ModuleContents.sub_module_id)
+        .where(SubModules.module.has(course_id=course_id), ModuleContents.content_type == ContentType.text)
+        .order_by(ModuleContents.sub_module_id, ModuleContents.order_number)
+    ).all()
+    submitted = 0
+    for sub_module_id, order_number in lessons:
+        submitted += image_stage.submit(
+            redis=redis,
+            sub_module_id=sub_module_id,
+            order_number=order_number,
+            user_course_id=user_course_id
+        )
+    return submitted
+
+
+def request_pending_images(
+        db: Session,
+        redis: Redis,
+        sub_module_id: int,
+        order_number: int,
+        user_course_id: int | None = None
+):
+    """
+    Ставит в очередь изображение урока, до которого дошел ученик, и следующего урока подмодуля, если они
+    помечены IMAGE_PENDING_KEY: курс сгенерирован в режиме ImageMode.lazy либо создание изображения в режиме
+    ImageMode.background завершилось ошибкой или было прервано перезапуском. Уроки курсов в режиме
+    ImageMode.skip не помечаются и изображений не получают.
+
+    Изображение текущего урока появится у следующих учеников, следующего - скорее всего уже у этого ученика.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для доступа к кэшу
+        sub_module_id (int): ID подмодуля
+        order_number (int): Порядковый номер урока
+        user_course_id (int | None): ID курса пользователя, на который записываются расходы
+    """
+    for number in (order_number, order_number + 1):
+        text = get_module_content(db=db, redis=redis, sub_module_id=sub_module_id, order_number=number,
+                                  content_type=ContentType.text, only_check=True)
+        if text is None or not (text.content_data or {}).get(IMAGE_PENDING_KEY):
+            continue
+        image = get_module_content(db=db, redis=redis, sub_module_id=sub_module_id, order_number=number,
+                                   content_type=ContentType.image, only_check=True)
+        if image is None:
+            image_stage.submit(redis=redis, sub_module_id=sub_module_id, order_number=number,
+                               user_course_id=user_course_id)
@@ -6,12 +6,14 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from app_api.db.redis_connection import get_redis
 from app_api.models.education import ContentType
 from .schemas import (CourseTitleSchema, CreateCoursePlanSchema, QuestionsSchema, QuestionsForSurveySchema,
-                      ModuleContentsSchema)
+                      ModuleContentsSchema, ContentTelegramFileSchema, ImageMode)
+from .images import submit_course_images, request_pending_images
+from app_api.core.config import setting
 from app_api.gpt_server.openai_api import LLM
 from app_api.gpt_server.validation import AllowCourseResponse, PlanResponse
 from app_api.api.endpoints.gpt_models.crud import get_model_by_id
 from .crud import add_course_data, get_course, get_question, get_module_content, \
-    generate_main_content
+    generate_main_content, set_content_telegram_file_id
 from app_api.api.endpoints.prompts.crud import get_prompt
 from ..user_courses.schemas import UserCoursesSchema
 
@@ -90,6 +92,7 @@ def course_route(create_course: CreateCoursePlanSchema,
               )
 def course_route(course_id: int,
                  language: str,
+                 images: ImageMode | None = Query(default=None, description="Режим создания изображений уроков"),
                  db: Session = Depends(get_db),
                  redis: Redis = Depends(get_redis)
                  ):
@@ -103,6 +106,9 @@ def course_route(course_id: int,
     ### Параметры
     - `course_id` (int): ID курса, для которого надо составить материал.
     - `language` (str): Язык, на котором будет подготавливаться курс
+    - `images` (ImageMode): Изображения уроков: `background` - в фоне после материала, `lazy` - при первом
+      обращении к уроку, `skip` - без изображений (например, для промо курсов). По умолчанию IMAGE_MODE.
+      Ответ не ждет изображений, их расходы добавляются к курсу пользователя по мере создания.
 
     ### Возвращает
 
@@ -114,7 +120,11 @@ def course_route(course_id: int,
         raise HTTPException(status_code=409, detail=f"Course already generated")
     if not course.available:
         raise HTTPException(status_code=409, detail=f"Course not available")
-    user_course = generate_main_content(db=db, course=course, redis=redis, gpt=gpt, language=language)
+    image_mode = images or ImageMode(setting.IMAGE_MODE)
+    user_course = generate_main_content(db=db, course=course, redis=redis, gpt=gpt, language=language,
+                                        image_mode=image_mode)
+    if image_mode == ImageMode.background:
+        submit_course_images(db=db, redis=redis, course_id=course.id, user_course_id=user_course.id)
     return user_course
 
 
@@ -139,11 +149,44 @@ def course_route(sub_module_id: int,
                  db: Session = Depends(get_db),
                  redis: Redis = Depends(get_redis)
                  ):
+    if content_type == ContentType.image:
+        content = get_module_content(db=db, redis=redis, sub_module_id=sub_module_id,
+                                     order_number=order_number, content_type=content_type, only_check=True)
+        if content is None:
+            request_pending_images(db=db, redis=redis, sub_module_id=sub_module_id, order_number=order_number)
+            raise HTTPException(status_code=404, detail=f"Record `{sub_module_id}` not found")
+        return content
     content = get_module_content(db=db, redis=redis, sub_module_id=sub_module_id,
                                  order_number=order_number, content_type=content_type)
     return content
 
 
+@courses.patch(path="/contents/{content_id}/telegram-file",
+               response_model=ModuleContentsSchema,
+               summary="Сохраняет file_id изображения в Telegram")
+def course_route(content_id: int,
+                 telegram_file: ContentTelegramFileSchema,
+                 db: Session = Depends(get_db),
+                 redis: Redis = Depends(get_redis)
+                 ):
+    """
+    Запоминает file_id, под которым изображение контента уже загружено в Telegram.
+
+    Бот отправляет изображение по этому file_id всем следующим ученикам курса, не скачивая его из хранилища.
+
+
+    ### Параметры
+    - `content_id` (int): ID контента с изображением.
+    - `telegram_file_id` (str): file_id изображения в Telegram.
+
+    ### Возвращает
+    - `ModuleContentsSchema`: Обновленный контент.
+    """
+    content = set_content_telegram_file_id(db=db, redis=redis, content_id=content_id,
+                                           telegram_file_id=telegram_file.telegram_file_id)
+    return content
+
+
 @courses.post(path="/questions-for-survey",
               response_model=QuestionsForSurveySchema,
               summary="Генерирует вопросы для опроса пользователя о теме")
@@ -1,7 +1,18 @@
+import enum
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from app_api.models.education import QuestionType, ContentType
+from app_api.api.telegram_html import render_lesson_messages, is_rendered
+
+
+class ImageMode(enum.Enum):
+    """
+    Когда создаются изображения уроков: в фоне после материала, при первом обращении к уроку или не создаются.
+    """
+    background = "background"
+    lazy = "lazy"
+    skip = "skip"
 
 
 class CourseTitleSchema(BaseModel):
@@ -83,6 +94,19 @@ class ModuleContentsSchema(BaseModel):
     class Config:
         from_attributes = True
 
+    @model_validator(mode="after")
+    def render_telegram_html(self):
+        # Уроки, сохраненные до рендеринга при генерации, рендерятся при чтении, чтобы бот получал готовый
+        # Telegram HTML всегда; в кэш попадает уже отрендеренный урок
+        if self.content_type == ContentType.text and self.content_data and not is_rendered(self.content_data):
+            self.content_data = {**self.content_data, "telegram_html": render_lesson_messages(self.content_data)}
+        return self
+
+
+class ContentTelegramFileSchema(BaseModel):
+    telegram_file_id: str = Field(title="file_id загруженного в Telegram изображения",
+                                  examples=["AgACAgIAAxkDAAIBYmZ..."])
+
 
 class QuestionsSchema(BaseModel):
     id: int = Field(title="Уникальный ID", examples=[1])
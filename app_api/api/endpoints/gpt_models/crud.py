@@ -1,7 +1,7 @@
 from redis import Redis
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from app_api.models.interaction import GPTModels
+from app_api.models.interaction import GPTModels, GPTModelBackends
 from app_api.api.dependencies import get_record, add_record, Cache, patch_record
 from .schemas import GPTModelsSchema, AddGPTModelsSchema, PatchGPTModelsSchema
 
@@ -118,6 +118,12 @@ def add_model(
         input_price=model.input_price,
         output_price=model.output_price
     )
+    if model.base_url or model.api_key_env or model.max_concurrency:
+        record.backend = GPTModelBackends(
+            base_url=model.base_url,
+            api_key_env=model.api_key_env,
+            max_concurrency=model.max_concurrency
+        )
 
     record = add_record(
         db=db,
@@ -6,6 +6,11 @@ class BaseGPTModelsSchema(BaseModel):
     input_price: float = Field(title="Стоимость входящих 1M токенов", examples=[10.00])
     output_price: float = Field(title="Стоимость исходящих 1M токенов", examples=[30.00])
     description: str = Field(default=None, title="Никнейм в telegram", examples=["Самая последняя модель"])
+    base_url: str | None = Field(default=None, title="Адрес OpenAI-совместимого API, по умолчанию API OpenAI",
+                                 examples=["http://localhost:8000/v1"])
+    api_key_env: str | None = Field(default=None, title="Переменная окружения с ключом API",
+                                    examples=["LOCAL_LLM_API_KEY"])
+    max_concurrency: int | None = Field(default=None, title="Максимум одновременных запросов к API", examples=[8])
 
     class Config:
         from_attributes = True
@@ -25,6 +30,9 @@ class PatchGPTModelsSchema(BaseModel):
     input_price: float = Field(default=None, title="Стоимость входящих 1M токенов", examples=[10.00])
     output_price: float = Field(default=None, title="Стоимость исходящих 1M токенов", examples=[30.00])
     description: str = Field(default=None, title="Никнейм в telegram", examples=["Самая последняя модель"])
+    base_url: str = Field(default=None, title="Адрес OpenAI-совместимого API", examples=["http://localhost:8000/v1"])
+    api_key_env: str = Field(default=None, title="Переменная окружения с ключом API", examples=["LOCAL_LLM_API_KEY"])
+    max_concurrency: int = Field(default=None, title="Максимум одновременных запросов к API", examples=[8])
 
 
 class GPTModelsNotFoundErrorSchema(BaseModel):
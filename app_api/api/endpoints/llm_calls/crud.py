@@ -0,0 +1,132 @@
+import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, cast, Date, Integer
+from sqlalchemy.dialects.postgresql import insert
+from app_api.models.interaction import LLMCalls, LLMCallsDaily, LLMLatencyDaily
+from .schemas import LLMCostDailySchema, LLMLatencyDailySchema, LLMRollupSchema
+
+
+def refresh_llm_rollups(db: Session, date_from: datetime.date) -> LLMRollupSchema:
+    """
+    Пересчитывает агрегированные таблицы llm_calls_daily и llm_latency_daily по журналу llm_calls.
+
+    Дни начиная с date_from пересчитываются целиком и перезаписываются (INSERT ... ON CONFLICT DO UPDATE),
+    поэтому повторный пересчет безопасен.
+
+    Args:
+        db (Session): Сессия SQL Alchemy для доступа к базе данных.
+        date_from (datetime.date): Первый пересчитываемый день (UTC)
+
+    Returns:
+        LLMRollupSchema: Количество записанных строк в каждой таблице.
+    """
+    day = cast(LLMCalls.created_at, Date)
+    since = datetime.datetime.combine(date_from, datetime.time.min)
+
+    cost_query = select(
+        day,
+        LLMCalls.prompt_name,
+        LLMCalls.model,
+        func.count(),
+        func.count().filter(LLMCalls.success.is_(False)),
+        func.coalesce(func.sum(LLMCalls.retries), 0),
+        func.count().filter(LLMCalls.cache_hit.is_(True)),
+        func.coalesce(func.sum(LLMCalls.input_tokens), 0),
+        func.coalesce(func.sum(LLMCalls.output_tokens), 0),
+        func.coalesce(func.sum(LLMCalls.cost), 0),
+    ).where(LLMCalls.created_at >= since).group_by(day, LLMCalls.prompt_name, LLMCalls.model)
+    cost_columns = ["day", "prompt_name", "model", "calls", "errors", "retries", "cache_hits", "input_tokens",
+                    "output_tokens", "cost"]
+    cost_insert = insert(LLMCallsDaily).from_select(cost_columns, cost_query)
+    cost_insert = cost_insert.on_conflict_do_update(
+        index_elements=["day", "prompt_name", "model"],
+        set_={column: cost_insert.excluded[column] for column in cost_columns[3:]}
+    )
+    cost_rows = db.execute(cost_insert).rowcount
+
+    latency_query = select(
+        day,
+        LLMCalls.model,
+        func.count(),
+        func.percentile_cont(0.5).within_group(LLMCalls.latency_ms),
+        func.percentile_cont(0.95).within_group(LLMCalls.latency_ms),
+        func.max(LLMCalls.latency_ms),
+    ).where(LLMCalls.created_at >= since, LLMCalls.success.is_(True)).group_by(day, LLMCalls.model)
+    latency_columns = ["day", "model", "calls", "p50_ms", "p95_ms", "max_ms"]
+    latency_insert = insert(LLMLatencyDaily).from_select(latency_columns, latency_query)
+    latency_insert = latency_insert.on_conflict_do_update(
+        index_elements=["day", "model"],
+        set_={column: latency_insert.excluded[column] for column in latency_columns[2:]}
+    )
+    latency_rows = db.execute(latency_insert).rowcount
+    db.commit()
+    return LLMRollupSchema(date_from=date_from, cost_rows=cost_rows, latency_rows=latency_rows)
+
+
+def get_cost_report(
+        db: Session,
+        date_from: datetime.date | None = None,
+        date_to: datetime.date | None = None,
+        prompt_name: str | None = None
+) -> list[LLMCostDailySchema]:
+    """
+    Возвращает стоимость и расход токенов по промптам за каждый день из таблицы llm_calls_daily.
+
+    Args:
+        db (Session): Сессия SQL Alchemy для доступа к базе данных.
+        date_from (datetime.date | None): Начало периода включительно
+        date_to (datetime.date | None): Конец периода включительно
+        prompt_name (str | None): Название промпта, если нужен отчет только по нему
+
+    Returns:
+        list[LLMCostDailySchema]: Строки отчета, отсортированные по дню и стоимости.
+    """
+    cost = func.sum(LLMCallsDaily.cost).label("cost")
+    query = select(
+        LLMCallsDaily.day,
+        LLMCallsDaily.prompt_name,
+        cast(func.sum(LLMCallsDaily.calls), Integer).label("calls"),
+        cast(func.sum(LLMCallsDaily.errors), Integer).label("errors"),
+        cast(func.sum(LLMCallsDaily.retries), Integer).label("retries"),
+        cast(func.sum(LLMCallsDaily.cache_hits), Integer).label("cache_hits"),
+        func.sum(LLMCallsDaily.input_tokens).label("input_tokens"),
+        func.sum(LLMCallsDaily.output_tokens).label("output_tokens"),
+        cost,
+    ).group_by(LLMCallsDaily.day, LLMCallsDaily.prompt_name)
+    if date_from is not None:
+        query = query.where(LLMCallsDaily.day >= date_from)
+    if date_to is not None:
+        query = query.where(LLMCallsDaily.day <= date_to)
+    if prompt_name is not None:
+        query = query.where(LLMCallsDaily.prompt_name == prompt_name)
+    query = query.order_by(LLMCallsDaily.day.desc(), cost.desc())
+    return [LLMCostDailySchema.model_validate(row) for row in db.execute(query).all()]
+
+
+def get_latency_report(
+        db: Session,
+        date_from: datetime.date | None = None,
+        date_to: datetime.date | None = None,
+        model: str | None = None
+) -> list[LLMLatencyDailySchema]:
+    """
+    Возвращает перцентили времени ответа по моделям за каждый день из таблицы llm_latency_daily.
+
+    Args:
+        db (Session): Сессия SQL Alchemy для доступа к базе данных.
+        date_from (datetime.date | None): Начало периода включительно
+        date_to (datetime.date | None): Конец периода включительно
+        model (str | None): Релиз модели, если нужен отчет только по ней
+
+    Returns:
+        list[LLMLatencyDailySchema]: Строки отчета, отсортированные по дню и модели.
+    """
+    query = select(LLMLatencyDaily)
+    if date_from is not None:
+        query = query.where(LLMLatencyDaily.day >= date_from)
+    if date_to is not None:
+        query = query.where(LLMLatencyDaily.day <= date_to)
+    if model is not None:
+        query = query.where(LLMLatencyDaily.model == model)
+    query = query.order_by(LLMLatencyDaily.day.desc(), LLMLatencyDaily.model)
+    return [LLMLatencyDailySchema.model_validate(row) for row in db.execute(query).scalars().all()]
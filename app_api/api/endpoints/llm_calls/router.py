@@ -0,0 +1,80 @@
+import datetime
+from sqlalchemy.orm import Session
+from app_api.db.session import get_db
+from fastapi import APIRouter, Depends, Query
+from .crud import get_cost_report, get_latency_report, refresh_llm_rollups
+from .schemas import LLMCostDailySchema, LLMLatencyDailySchema, LLMRollupSchema
+
+llm_calls = APIRouter(prefix="/llm-calls", tags=["LLM Calls"])
+
+
+@llm_calls.get(path="/cost",
+               response_model=list[LLMCostDailySchema],
+               summary="Стоимость вызовов LLM по промптам за день"
+               )
+def cost_route(date_from: datetime.date | None = Query(default=None, description="Начало периода (UTC)"),
+               date_to: datetime.date | None = Query(default=None, description="Конец периода (UTC)"),
+               prompt_name: str | None = Query(default=None, description="Название промпта"),
+               db: Session = Depends(get_db)
+               ):
+    """
+    Возвращает стоимость, токены, ошибки и повторы вызовов LLM по каждому промпту за каждый день.
+
+    Данные берутся из агрегированной таблицы llm_calls_daily, которая пересчитывается в фоне
+    раз в LLM_ROLLUP_INTERVAL секунд, поэтому последние вызовы могут появиться в отчете с задержкой.
+
+    ### Параметры
+    - `date_from` (date): Начало периода включительно.
+    - `date_to` (date): Конец периода включительно.
+    - `prompt_name` (str): Название промпта.
+
+    ### Возвращает
+    - `list[LLMCostDailySchema]`: Строки отчета.
+    """
+    return get_cost_report(db=db, date_from=date_from, date_to=date_to, prompt_name=prompt_name)
+
+
+@llm_calls.get(path="/latency",
+               response_model=list[LLMLatencyDailySchema],
+               summary="Время ответа LLM по моделям за день"
+               )
+def latency_route(date_from: datetime.date | None = Query(default=None, description="Начало периода (UTC)"),
+                  date_to: datetime.date | None = Query(default=None, description="Конец периода (UTC)"),
+                  model: str | None = Query(default=None, description="Релиз модели"),
+                  db: Session = Depends(get_db)
+                  ):
+    """
+    Возвращает медиану, 95-й перцентиль и максимум времени успешных вызовов LLM по каждой модели за каждый день.
+
+    Данные берутся из агрегированной таблицы llm_latency_daily.
+
+    ### Параметры
+    - `date_from` (date): Начало периода включительно.
+    - `date_to` (date): Конец периода включительно.
+    - `model` (str): Релиз модели.
+
+    ### Возвращает
+    - `list[LLMLatencyDailySchema]`: Строки отчета.
+    """
+    return get_latency_report(db=db, date_from=date_from, date_to=date_to, model=model)
+
+
+@llm_calls.post(path="/rollup",
+                response_model=LLMRollupSchema,
+                summary="Пересчет агрегированных таблиц журнала LLM"
+                )
+def rollup_route(date_from: datetime.date = Query(description="Первый пересчитываемый день (UTC)"),
+                 db: Session = Depends(get_db)
+                 ):
+    """
+    Пересчитывает агрегированные таблицы журнала вызовов LLM начиная с указанного дня.
+
+    Используется для заполнения отчетов за прошлые дни, текущий и предыдущий день пересчитываются автоматически.
+
+    ### Параметры
+    - `date_from` (date): Первый пересчитываемый день.
+
+    ### Возвращает
+    - `LLMRollupSchema`: Количество записанных строк.
+    """
+    return refresh_llm_rollups(db=db, date_from=date_from)
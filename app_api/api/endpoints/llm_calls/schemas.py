@@ -0,0 +1,36 @@
+from datetime import date
+from pydantic import BaseModel, Field
+
+
+class LLMCostDailySchema(BaseModel):
+    day: date = Field(title="День (UTC)")
+    prompt_name: str = Field(title="Название промпта", examples=["generate_module_content"])
+    calls: int = Field(title="Количество вызовов", examples=[120])
+    errors: int = Field(title="Количество неудачных вызовов", examples=[2])
+    retries: int = Field(title="Количество повторных попыток", examples=[5])
+    cache_hits: int = Field(title="Количество вызовов с попаданием в кэш промпта", examples=[40])
+    input_tokens: int = Field(title="Количество входящих токенов", examples=[215000])
+    output_tokens: int = Field(title="Количество исходящих токенов", examples=[98000])
+    cost: float = Field(title="Стоимость", examples=[4.12])
+
+    class Config:
+        from_attributes = True
+
+
+class LLMLatencyDailySchema(BaseModel):
+    day: date = Field(title="День (UTC)")
+    model: str = Field(title="Релиз модели", examples=["gpt-4-turbo-2024-04-09"])
+    calls: int = Field(title="Количество вызовов", examples=[120])
+    p50_ms: float = Field(title="Медиана времени ответа, мс", examples=[8400.0])
+    p95_ms: float = Field(title="95-й перцентиль времени ответа, мс", examples=[21500.0])
+    max_ms: float = Field(title="Максимальное время ответа, мс", examples=[48000.0])
+
+    class Config:
+        from_attributes = True
+
+
+class LLMRollupSchema(BaseModel):
+    date_from: date = Field(title="Первый пересчитанный день")
+    cost_rows: int = Field(title="Количество строк в llm_calls_daily", examples=[24])
+    latency_rows: int = Field(title="Количество строк в llm_latency_daily", examples=[4])
+
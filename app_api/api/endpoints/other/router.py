@@ -2,14 +2,15 @@ from redis import Redis
 from sqlalchemy.orm import Session
 from app_api.db.session import get_db
 from fastapi import APIRouter, Depends, Path
+from fastapi.responses import StreamingResponse
 from app_api.db.redis_connection import get_redis
 from app_api.gpt_server.openai_api import LLM
 from app_api.gpt_server.validation import ContentAnswerResponse
+from app_api.api.sse import llm_streaming_response
 from .schemas import SummarizeSchema, SurveySchema, GenerateImageSchema, ContentQuestionSchema
 from ..gpt_models.crud import get_model_by_id, get_model
 from ..prompts.crud import get_prompt
-from ..user_courses.crud import get_user_course, patch_user_courses
-from ..user_courses.schemas import PatchUserCoursesSchema
+from ..user_courses.crud import add_user_course_usage
 
 others = APIRouter(prefix="/other", tags=["Other"])
 
@@ -66,16 +67,44 @@ def other_route(question: ContentQuestionSchema,
         language=question.language,
         history=question.history
     )
-    user_course = get_user_course(db=db, redis=redis, user_course_id=question.user_course_id)
-    patch_course = PatchUserCoursesSchema(
-        input_token=user_course.input_token + response.input_tokens,
-        output_token=user_course.output_token + response.output_tokens,
-        spent_amount=user_course.spent_amount + response.spent_amount,
+    add_user_course_usage(
+        db=db,
+        redis=redis,
+        user_course_id=question.user_course_id,
+        input_tokens=response.input_tokens,
+        output_tokens=response.output_tokens,
+        spent_amount=response.spent_amount
     )
-    patch_user_courses(db=db, redis=redis, user_course_id=question.user_course_id, user_course=patch_course)
     return response.content
 
 
+@others.post(path="/get-answer/stream",
+             summary="Получает ответ по вопросу пользователя по мере генерации (SSE)",
+             response_class=StreamingResponse
+             )
+def other_route(question: ContentQuestionSchema,
+                db: Session = Depends(get_db),
+                redis: Redis = Depends(get_redis)
+                ):
+    """
+    Передает ответ на вопрос пользователя по пройденному материалу событиями Server-Sent Events: `delta` с новым
+    текстом ответа, затем `done` с `ContentAnswerResponse` либо `error`.
+    """
+    prompt = get_prompt(db=db, redis=redis, name="generate_content_answers")
+    model = get_model_by_id(db=db, redis=redis, model_id=prompt.gpt_model_id)
+    gpt = LLM()
+    stream = gpt.generate_content_answers(
+        model=model,
+        user_content=prompt.user,
+        system_content=prompt.system,
+        content=question.content,
+        language=question.language,
+        history=question.history,
+        stream=True
+    )
+    return llm_streaming_response(stream=stream, redis=redis, user_course_id=question.user_course_id)
+
+
 @others.post(path="/generate-image",
              summary="Генерирует изображение для курса"
              )
@@ -2,7 +2,7 @@ from types import SimpleNamespace
 
 from redis import Redis
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import select, update, func
 from sqlalchemy.orm import Session
 from app_api.models.education import UserCourseTracker, ContentType, UserAnswers
 from app_api.api.dependencies import get_record, Cache, get_records, patch_record, add_record
@@ -223,9 +223,11 @@ def add_user_courses(
 
     cache = Cache(redis=redis, cache_key=f"active_user_courses:user:{user.id}", base_model=UserCoursesSchema)
     query = db.scalars(select(UserCourseTracker).filter_by(active=True, user_id=user.id)).first()
+    deactivated_cache = None
     if query is not None:
         query.active = False
         cache.delete_keys_by_pattern(pattern=f"unfinished_user_courses:user:{user.id}*")
+        deactivated_cache = Cache(redis=redis, cache_key=f"user_course:id:{query.id}", base_model=UserCoursesSchema)
 
     user_course = UserCourseTracker(
         user_id=user.id,
@@ -242,6 +244,9 @@ def add_user_courses(
     db.commit()
     db.refresh(user_course)
     cache.set(query=user_course)
+    if deactivated_cache is not None:
+        deactivated_cache.delete_key()
+        deactivated_cache.publish_invalidation()
 
     return user_course
 
@@ -250,6 +255,7 @@ def get_next_stage(
         db: Session,
         redis: Redis,
         user_course_id: int,
+        user_course: UserCoursesSchema | None = None,
 ):
     """
     Определяет и возвращает следующую стадию курса пользователя.
@@ -263,6 +269,8 @@ def get_next_stage(
         db (Session): Сессия SQLAlchemy для доступа к базе данных
         redis (Redis): Клиент Redis для доступа к кэшу
         user_course_id (int): ID курса пользователя
+        user_course (UserCoursesSchema | None): Уже полученный курс пользователя, если None, берется из кэша или
+         базы данных
 
     Returns:
         dict: Словарь, содержащий следующую стадию курса и соответствующие данные.
@@ -271,7 +279,8 @@ def get_next_stage(
     Raises:
         HTTPException: Если курс пользователя не найден (404) или не активен (409).
     """
-    user_course = get_user_course(db=db, redis=redis, user_course_id=user_course_id)
+    if user_course is None:
+        user_course = get_user_course(db=db, redis=redis, user_course_id=user_course_id)
     current_stage = user_course.current_stage
     current_order_number = user_course.current_order_number
     if user_course is None:
@@ -396,6 +405,69 @@ def get_next_stage(
     return {"stage": CurrentStage.completed.value}
 
 
+def advance_user_course(
+        db: Session,
+        redis: Redis,
+        user_course_id: int,
+) -> dict:
+    """
+    Переводит курс пользователя на следующую стадию и возвращает всё, что нужно показать пользователю.
+
+    Строка курса блокируется (SELECT ... FOR UPDATE) на время вычисления и сохранения следующей стадии, поэтому
+    повторное нажатие кнопки не перескочит через стадию.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для доступа к кэшу
+        user_course_id (int): ID курса пользователя
+
+    Returns:
+        dict: Обновленный курс пользователя (user_course), текст и изображение урока (text_content, image_content)
+        для стадии education либо вопрос (question) для стадий question и ask_question.
+
+    Raises:
+        HTTPException: Если курс пользователя не найден (404) или не активен (409).
+    """
+    locked_user_course = db.scalars(
+        select(UserCourseTracker).filter_by(id=user_course_id).with_for_update()
+    ).first()
+    if locked_user_course is None:
+        raise HTTPException(status_code=404, detail=f"User course`{user_course_id}` not found")
+    next_stage = get_next_stage(
+        db=db,
+        redis=redis,
+        user_course_id=user_course_id,
+        user_course=UserCoursesSchema.model_validate(locked_user_course)
+    )
+    data = next_stage.get("data", {})
+    user_course = patch_user_courses(
+        db=db,
+        redis=redis,
+        user_course_id=user_course_id,
+        user_course=PatchUserCoursesSchema(current_stage=next_stage["stage"], **data)
+    )
+    advance = {"user_course": user_course, "text_content": None, "image_content": None, "question": None}
+    if next_stage["stage"] == CurrentStage.education.value:
+        for content_type in ContentType:
+            advance[f"{content_type.value}_content"] = get_module_content(
+                db=db,
+                redis=redis,
+                sub_module_id=user_course.current_sub_module_id,
+                order_number=user_course.current_order_number,
+                content_type=content_type,
+                only_check=True
+            )
+    elif next_stage["stage"] in [CurrentStage.question.value, CurrentStage.ask_question.value]:
+        advance["question"] = get_question(
+            db=db,
+            redis=redis,
+            sub_module_id=user_course.current_sub_module_id,
+            order_number=user_course.current_order_number,
+            only_check=True
+        )
+    return advance
+
+
 def patch_user_courses(
         db: Session,
         redis: Redis,
@@ -437,6 +509,59 @@ def patch_user_courses(
     return user_course
 
 
+def add_user_course_usage(
+        db: Session,
+        redis: Redis,
+        user_course_id: int,
+        input_tokens: int,
+        output_tokens: int,
+        spent_amount: float,
+) -> UserCoursesSchema:
+    """
+    Атомарно добавляет потраченные токены и сумму к счетчикам курса пользователя.
+
+    Выполняется одним запросом UPDATE ... SET input_token = input_token + :x RETURNING, поэтому параллельные
+    запросы к LLM не теряют обновления. Используется всеми эндпоинтами, которые обращаются к LLM от имени курса
+    пользователя. Кэш курса обновляется значением из RETURNING, кэши списков курсов не сбрасываются, так как
+    счетчики в них не используются.
+
+    Args:
+        db (Session): Сессия SQLAlchemy для доступа к базе данных
+        redis (Redis): Клиент Redis для доступа к кэшу
+        user_course_id (int): ID курса пользователя
+        input_tokens (int): Количество входящих токенов
+        output_tokens (int): Количество исходящих токенов
+        spent_amount (float): Потраченная сумма
+
+    Returns:
+        UserCoursesSchema: Курс пользователя с обновленными счетчиками.
+
+    Raises:
+        HTTPException: Если курс пользователя не найден.
+    """
+    query = (
+        update(UserCourseTracker)
+        .where(UserCourseTracker.id == user_course_id)
+        .values(
+            input_token=func.coalesce(UserCourseTracker.input_token, 0) + input_tokens,
+            output_token=func.coalesce(UserCourseTracker.output_token, 0) + output_tokens,
+            spent_amount=func.coalesce(UserCourseTracker.spent_amount, 0) + spent_amount,
+        )
+        .returning(UserCourseTracker)
+    )
+    user_course = db.scalars(query).first()
+    if user_course is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=f"User course`{user_course_id}` not found")
+    # Сериализуем до commit, чтобы не делать повторный SELECT для истекших после commit атрибутов
+    user_course = UserCoursesSchema.model_validate(user_course)
+    db.commit()
+    cache = Cache(redis=redis, cache_key=f"user_course:id:{user_course_id}", base_model=UserCoursesSchema)
+    cache.set(query=user_course)
+    cache.publish_invalidation()
+    return user_course
+
+
 def add_answers(
         db: Session,
         redis: Redis,
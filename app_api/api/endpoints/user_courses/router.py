@@ -5,19 +5,24 @@ from redis import Redis
 from sqlalchemy.orm import Session
 from app_api.db.session import get_db
 from fastapi import APIRouter, Depends, Path, Query
+from fastapi.responses import StreamingResponse
 from app_api.db.redis_connection import get_redis
 from app_api.api.endpoints.users.schemas import UsersNotFoundErrorSchema
 from app_api.gpt_server.openai_api import LLM
-from app_api.gpt_server.validation import AnswersResponse, HelpResponse
+from app_api.gpt_server.validation import AnswersResponse
+from app_api.api.sse import llm_streaming_response
+from app_api.api.telegram_html import with_telegram_html
 from .schemas import (UserCoursesSchema, UserCoursesNotFoundErrorSchema, PaginatedUserCoursesSchema,
                       AddUserCoursesSchema, UserCoursesNextStageSchema, PatchUserCoursesSchema, AddUserAnswersSchema,
-                      CheckAnswersSchema, HelpAnswersSchema)
+                      CheckAnswersSchema, HelpAnswersSchema, UserCoursesAdvanceSchema, HelpTelegramSchema)
 from .crud import (get_user_course, get_archived_user_courses, get_unfinished_user_courses, get_active_user_courses,
                    add_user_courses, get_next_stage, patch_user_courses, add_answers, archive_user_courses,
-                   resume_user_courses, pause_user_courses, restart_user_courses, get_user_courses
+                   resume_user_courses, pause_user_courses, restart_user_courses, get_user_courses,
+                   advance_user_course, add_user_course_usage
                    )
 from ..gpt_models.crud import get_model_by_id
 from ..prompts.crud import get_prompt
+from ..courses.images import request_pending_images
 
 user_courses = APIRouter(tags=["Users"])
 
@@ -130,6 +135,43 @@ def user_courses_route(user_course_id: int = Path(description="ID курса п
     return next_stage
 
 
+@user_courses.post(path="/courses/{user_course_id}/advance",
+                   response_model=UserCoursesAdvanceSchema,
+                   summary="Переход на следующий шаг обучения",
+                   responses={404: {"model": UserCoursesNotFoundErrorSchema, "description": "Course not found"}}
+                   )
+def user_courses_route(user_course_id: int = Path(description="ID курса пользователя", example=1),
+                       db: Session = Depends(get_db),
+                       redis: Redis = Depends(get_redis)
+                       ):
+    """
+    Вычисляет следующий шаг обучения, сохраняет его и сразу возвращает материал или вопрос этого шага.
+
+    Заменяет последовательность запросов next-stage, PATCH курса и получения контента одним запросом.
+
+    ### Параметры
+    - `user_course_id` (int): ID Курса пользователя.
+
+    ### Возвращает
+    - `UserCoursesAdvanceSchema`: Обновленный курс пользователя и материал (text_content, image_content) или
+     вопрос (question) нового шага
+
+    ### Исключения
+    - `HTTPException` с кодом 404: Вызывается, если курс пользователя с указанным ID не найден.
+    - `HTTPException` с кодом 409: Вызывается, если курс пользователя не активен.
+    """
+    advance = advance_user_course(db=db, redis=redis, user_course_id=user_course_id)
+    if advance["text_content"] is not None:
+        request_pending_images(
+            db=db,
+            redis=redis,
+            sub_module_id=advance["text_content"].sub_module_id,
+            order_number=advance["text_content"].order_number,
+            user_course_id=user_course_id
+        )
+    return advance
+
+
 @user_courses.post(path="/{telegram_id}/courses",
                    response_model=UserCoursesSchema,
                    summary="Добавляет запись круса пользователя",
@@ -213,18 +255,53 @@ def user_courses_route(answer: CheckAnswersSchema,
         user_content=prompt.user,
         model=model
     )
-    user_course = get_user_course(db=db, redis=redis, user_course_id=user_course_id)
-    patch_course = PatchUserCoursesSchema(
-        input_token=user_course.input_token + feedback.input_tokens,
-        output_token=user_course.output_token + feedback.output_tokens,
-        spent_amount=user_course.spent_amount + feedback.spent_amount,
+    add_user_course_usage(
+        db=db,
+        redis=redis,
+        user_course_id=user_course_id,
+        input_tokens=feedback.input_tokens,
+        output_tokens=feedback.output_tokens,
+        spent_amount=feedback.spent_amount
     )
-    patch_user_courses(db=db, redis=redis, user_course_id=user_course_id, user_course=patch_course)
     return feedback.content
 
 
+@user_courses.post(path="/courses/{user_course_id}/answers/check/stream",
+                   summary="Проверяет ответ пользователя, комментарий отдается по мере генерации (SSE)",
+                   response_class=StreamingResponse
+                   )
+def user_courses_route(answer: CheckAnswersSchema,
+                       user_course_id: int = Path(description="ID курса пользователя", example=1),
+                       db: Session = Depends(get_db),
+                       redis: Redis = Depends(get_redis),
+                       ):
+    """
+    Проверяет ответ пользователя и передает комментарий модели событиями Server-Sent Events.
+
+    ### Параметры
+    - `user_course_id` (int): ID курса пользователя.
+
+    ### Возвращает
+    - `text/event-stream`: События `delta` с новым текстом комментария, затем `done` с `AnswersResponse`
+      либо `error`, если ответ не удалось получить.
+    """
+    prompt = get_prompt(db=db, redis=redis, name="generate_answer")
+    model = get_model_by_id(db=db, redis=redis, model_id=prompt.gpt_model_id)
+    gpt = LLM()
+    stream = gpt.generate_answer(
+        question=answer.question,
+        answer=answer.answer,
+        language=answer.language,
+        system_content=prompt.system,
+        user_content=prompt.user,
+        model=model,
+        stream=True
+    )
+    return llm_streaming_response(stream=stream, redis=redis, user_course_id=user_course_id)
+
+
 @user_courses.post(path="/courses/{user_course_id}/answers/help",
-                   response_model=HelpResponse,
+                   response_model=HelpTelegramSchema,
                    summary="Дает комментарий на неправильный ответ пользователя"
                    )
 def user_courses_route(help_content: HelpAnswersSchema,
@@ -256,14 +333,51 @@ def user_courses_route(help_content: HelpAnswersSchema,
         user_content=prompt.user,
         model=model
     )
-    user_course = get_user_course(db=db, redis=redis, user_course_id=user_course_id)
-    patch_course = PatchUserCoursesSchema(
-        input_token=user_course.input_token + feedback.input_tokens,
-        output_token=user_course.output_token + feedback.output_tokens,
-        spent_amount=user_course.spent_amount + feedback.spent_amount,
+    add_user_course_usage(
+        db=db,
+        redis=redis,
+        user_course_id=user_course_id,
+        input_tokens=feedback.input_tokens,
+        output_tokens=feedback.output_tokens,
+        spent_amount=feedback.spent_amount
     )
-    patch_user_courses(db=db, redis=redis, user_course_id=user_course_id, user_course=patch_course)
-    return feedback.content
+    return with_telegram_html(feedback.content)
+
+
+@user_courses.post(path="/courses/{user_course_id}/answers/help/stream",
+                   summary="Дает комментарий на неправильный ответ пользователя по мере генерации (SSE)",
+                   response_class=StreamingResponse
+                   )
+def user_courses_route(help_content: HelpAnswersSchema,
+                       user_course_id: int = Path(description="ID курса пользователя", example=1),
+                       db: Session = Depends(get_db),
+                       redis: Redis = Depends(get_redis),
+                       ):
+    """
+    Передает комментарий на неправильный ответ пользователя событиями Server-Sent Events.
+
+    ### Параметры
+    - `user_course_id` (int): ID курса пользователя.
+
+    ### Возвращает
+    - `text/event-stream`: События `delta` с новым текстом комментария, затем `done` с `HelpTelegramSchema`
+      либо `error`, если ответ не удалось получить.
+    """
+    prompt = get_prompt(db=db, redis=redis, name="corrector")
+    model = get_model_by_id(db=db, redis=redis, model_id=prompt.gpt_model_id)
+    gpt = LLM()
+    stream = gpt.generate_correct(
+        question=help_content.question,
+        answer=help_content.answer,
+        language=help_content.language,
+        feedback=help_content.feedback,
+        system_content=prompt.system,
+        user_content=prompt.user,
+        model=model,
+        stream=True
+    )
+    return llm_streaming_response(stream=stream, redis=redis, user_course_id=user_course_id,
+                                  render=with_telegram_html)
 
 
 @user_courses.get(path="/{telegram_id}/courses",
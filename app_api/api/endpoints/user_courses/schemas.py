@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, Field
 from app_api.models.education import CurrentStage
+from app_api.api.endpoints.courses.schemas import ModuleContentsSchema, QuestionsSchema
 
 
 class BaseUserCoursesSchema(BaseModel):
@@ -61,6 +62,12 @@ class HelpAnswersSchema(CheckAnswersSchema):
     feedback: str = Field(title="Правильный ответ (обратная связь)", examples=["Неправильны ответ"])
 
 
+class HelpTelegramSchema(BaseModel):
+    response: str = Field(title="Комментарий на ответ пользователя", examples=["Комментарий"])
+    telegram_html: str = Field(title="Комментарий, очищенный для отправки в Telegram с parse_mode HTML",
+                               examples=["<b>Комментарий</b>"])
+
+
 class PaginatedUserCoursesSchema(BaseModel):
     total_records: int = Field(title="Количество записей", examples=[12])
     page: int = Field(title="Страница", examples=[2])
@@ -86,6 +93,14 @@ class UserCoursesNextStageSchema(BaseModel):
     data: Optional[NextStageIDSchema] = Field(default={}, title="Следующие ID обучения")
 
 
+class UserCoursesAdvanceSchema(BaseModel):
+    user_course: UserCoursesSchema = Field(title="Курс пользователя после перехода на следующую стадию")
+    text_content: Optional[ModuleContentsSchema] = Field(default=None, title="Текст урока для стадии education")
+    image_content: Optional[ModuleContentsSchema] = Field(default=None,
+                                                          title="Изображение урока для стадии education")
+    question: Optional[QuestionsSchema] = Field(default=None, title="Вопрос для стадий question и ask_question")
+
+
 class PatchUserCoursesSchema(BaseModel):
     current_module_id: int | None = Field(title="Уникальный ID модуля, на котором находится пользователь", default=None)
     current_sub_module_id: int | None = Field(title="Уникальный ID субмодуля, на котором находится пользователь",
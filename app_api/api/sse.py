@@ -0,0 +1,92 @@
+import json
+from typing import Callable, Iterator
+
+from fastapi.responses import StreamingResponse
+from redis import Redis
+
+from app_api.core.logging_config import logger
+from app_api.db.session import SessionLocal
+from app_api.gpt_server.openai_api import ResponseStream
+from app_api.api.endpoints.user_courses.crud import add_user_course_usage
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Формирует событие Server-Sent Events.
+
+    Args:
+        event (str): Тип события
+        data (dict): Данные события, передаются одной строкой JSON
+
+    Returns:
+        str: Текст события, завершенный пустой строкой.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def llm_events(
+        stream: ResponseStream,
+        redis: Redis,
+        user_course_id: int,
+        render: Callable[[dict], dict] | None = None
+) -> Iterator[str]:
+    """
+    Передает потоковый ответ модели событиями delta, затем учитывает токены и отправляет событие done.
+
+    Учет токенов выполняется в отдельной сессии: сессия запроса из get_db к этому моменту может быть закрыта.
+    При ошибке генерации или валидации отправляется событие error.
+
+    Args:
+        stream (ResponseStream): Потоковый ответ модели
+        redis (Redis): Клиент Redis для доступа к кэшу
+        user_course_id (int): ID курса пользователя, на который записываются токены
+        render (Callable[[dict], dict] | None): Преобразует проверенный ответ модели перед событием done
+
+    Yields:
+        str: События delta ({"text": ...}), done (проверенный ответ модели) или error ({"detail": ...}).
+    """
+    try:
+        for delta in stream:
+            yield sse_event("delta", {"text": delta})
+    except Exception as error:
+        logger.error(f"Streaming generation failed: {error}")
+        yield sse_event("error", {"detail": "Generate error!"})
+        return
+    response = stream.response
+    with SessionLocal() as db:
+        add_user_course_usage(
+            db=db,
+            redis=redis,
+            user_course_id=user_course_id,
+            input_tokens=response.input_tokens,
+            output_tokens=response.output_tokens,
+            spent_amount=response.spent_amount
+        )
+    yield sse_event("done", render(response.content) if render else response.content)
+
+
+def llm_streaming_response(
+        stream: ResponseStream,
+        redis: Redis,
+        user_course_id: int,
+        render: Callable[[dict], dict] | None = None
+) -> StreamingResponse:
+    """
+    Возвращает ответ text/event-stream с событиями потоковой генерации.
+
+    Args:
+        stream (ResponseStream): Потоковый ответ модели
+        redis (Redis): Клиент Redis для доступа к кэшу
+        user_course_id (int): ID курса пользователя, на который записываются токены
+        render (Callable[[dict], dict] | None): Преобразует проверенный ответ модели перед событием done
+
+    Returns:
+        StreamingResponse: Ответ с событиями llm_events.
+    """
+    return StreamingResponse(
+        llm_events(stream=stream, redis=redis, user_course_id=user_course_id, render=render),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
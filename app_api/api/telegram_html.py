@@ -0,0 +1,230 @@
+import re
+from html import escape
+from html.parser import HTMLParser
+
+# Лимит Telegram на длину текста сообщения
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Запас под тег спойлера, которым бот оборачивает уже отправленные сообщения
+SPOILER_RESERVE = 64
+ALLOWED_TAGS = ("code", "b", "i", "u", "s", "pre")
+HTML_TOKEN_PATTERN = re.compile(r"(<[^>]+>|\s+)")
+HTML_TAG_PATTERN = re.compile(r"<(/?)([a-zA-Z0-9-]+)[^>]*>")
+
+
+class TelegramHTMLSanitizer(HTMLParser):
+    """
+    Потоковый очиститель HTML для Telegram без построения дерева документа.
+
+    Оставляет только разрешенные теги (без атрибутов, кроме class у code), остальные теги удаляет, сохраняя
+    их текст, экранирует текст и закрывает незакрытые теги.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.open_tags: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        if tag not in ALLOWED_TAGS:
+            return
+        attributes = ""
+        if tag == "code":
+            language = dict(attrs).get("class")
+            if language:
+                attributes = f' class="{escape(language)}"'
+        self.parts.append(f"<{tag}{attributes}>")
+        self.open_tags.append(tag)
+
+    def handle_endtag(self, tag: str):
+        if tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.parts.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data: str):
+        self.parts.append(escape(data, quote=False))
+
+    def result(self) -> str:
+        """
+        Завершает разбор и возвращает очищенный HTML.
+
+        Returns:
+            str: Очищенный HTML, в котором все теги закрыты.
+        """
+        self.close()
+        while self.open_tags:
+            self.parts.append(f"</{self.open_tags.pop()}>")
+        return "".join(self.parts)
+
+
+def sanitize_telegram_html(html: str | None) -> str:
+    """
+    Очищает HTML от всех тегов, кроме поддерживаемых Telegram, и экранирует текст.
+
+    Args:
+        html (str | None): Исходный HTML
+
+    Returns:
+        str: Безопасный для отправки с parse_mode="HTML" текст.
+    """
+    if not html:
+        return ""
+    sanitizer = TelegramHTMLSanitizer()
+    sanitizer.feed(html)
+    return sanitizer.result()
+
+
+def with_telegram_html(content: dict) -> dict:
+    """
+    Добавляет к ответу модели поле telegram_html: текст response, очищенный для отправки в Telegram.
+
+    Args:
+        content (dict): Ответ модели с полем response
+
+    Returns:
+        dict: Ответ модели с полем telegram_html.
+    """
+    return {**content, "telegram_html": sanitize_telegram_html(content.get("response"))}
+
+
+def render_lesson_blocks(content_data: dict) -> list[str]:
+    """
+    Преобразует контент урока в список очищенных HTML блоков: введение, разделы и заключение.
+
+    Args:
+        content_data (dict): Контент урока (title, introduction, sections, conclusion)
+
+    Returns:
+        list[str]: Непустые HTML блоки в порядке отображения.
+    """
+    blocks = [sanitize_telegram_html(content_data.get("introduction"))]
+    for section in content_data.get("sections", []):
+        body = ""
+        title = section.get("title")
+        content = section.get("content")
+        if title:
+            body += f"{sanitize_telegram_html(title)}\n\n"
+        if content:
+            body += f"{sanitize_telegram_html(content)}\n"
+        blocks.append(body)
+    blocks.append(sanitize_telegram_html(content_data.get("conclusion")))
+    return [block.strip() for block in blocks if block and block.strip()]
+
+
+def pack_html_blocks(
+        blocks: list[str],
+        limit: int = TELEGRAM_MESSAGE_LIMIT - SPOILER_RESERVE
+) -> list[str]:
+    """
+    Упаковывает HTML блоки в минимальное количество сообщений, не превышающих лимит.
+
+    Блоки объединяются через пустую строку, слишком длинный блок разбивается по границам слов
+    с закрытием и повторным открытием незакрытых тегов.
+
+    Args:
+        blocks (list[str]): HTML блоки в порядке отображения
+        limit (int): Максимальная длина одного сообщения
+
+    Returns:
+        list[str]: Тексты сообщений.
+    """
+    messages = []
+    current = ""
+    for block in blocks:
+        candidate = f"{current}\n\n{block}" if current else block
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if len(block) <= limit:
+            messages.append(current)
+            current = block
+            continue
+        *full_parts, current = split_html(text=candidate, limit=limit)
+        messages.extend(full_parts)
+    if current:
+        messages.append(current)
+    return messages
+
+
+def split_html(text: str, limit: int) -> list[str]:
+    """
+    Разбивает HTML текст на части не длиннее лимита, не разрывая теги.
+
+    Args:
+        text (str): Очищенный HTML текст
+        limit (int): Максимальная длина части
+
+    Returns:
+        list[str]: Части текста, в каждой из которых все теги закрыты.
+    """
+    if len(text) <= limit:
+        return [text]
+    parts = []
+    open_tags: list[tuple[str, str]] = []
+    current = ""
+    for token in HTML_TOKEN_PATTERN.split(text):
+        if not token:
+            continue
+        closing = "".join(f"</{name}>" for name, _ in reversed(open_tags))
+        if current and len(current) + len(token) + len(closing) > limit:
+            parts.append(current.rstrip() + closing)
+            current = "".join(tag for _, tag in open_tags)
+            if token.isspace():
+                continue
+        while len(current) + len(token) + len(closing) > limit:
+            # Слово длиннее лимита режется без учёта границ
+            cut = max(limit - len(current) - len(closing), 1)
+            parts.append(current + token[:cut] + closing)
+            current = "".join(tag for _, tag in open_tags)
+            token = token[cut:]
+        current += token
+        tag = HTML_TAG_PATTERN.fullmatch(token)
+        if tag and tag.group(1):
+            for index in range(len(open_tags) - 1, -1, -1):
+                if open_tags[index][0] == tag.group(2):
+                    del open_tags[index]
+                    break
+        elif tag:
+            open_tags.append((tag.group(2), token))
+    if current.strip():
+        parts.append(current)
+    return parts
+
+
+def render_lesson_messages(content_data: dict) -> dict:
+    """
+    Готовит урок к отправке в Telegram: очищает HTML и упаковывает текст в сообщения.
+
+    Результат сохраняется в content_data под ключом telegram_html, чтобы бот не очищал один и тот же урок
+    для каждого ученика. Бот не разбирает HTML сам: заголовок отправляется подписью к изображению (messages)
+    либо вместе с текстом урока (titled_messages).
+
+    Args:
+        content_data (dict): Контент урока (title, introduction, sections, conclusion)
+
+    Returns:
+        dict: Заголовок (title), тексты сообщений без заголовка (messages) и с заголовком (titled_messages).
+    """
+    title = sanitize_telegram_html(content_data.get("title"))
+    blocks = render_lesson_blocks(content_data=content_data)
+    return {
+        "title": title,
+        "messages": pack_html_blocks(blocks=blocks),
+        "titled_messages": pack_html_blocks(blocks=[title, *blocks] if title else blocks),
+    }
+
+
+def is_rendered(content_data: dict | None) -> bool:
+    """
+    Проверяет, что в content_data урока уже есть Telegram HTML текущего формата.
+
+    Args:
+        content_data (dict | None): Контент урока
+
+    Returns:
+        bool: False, если урок нужно отрендерить (render_lesson_messages).
+    """
+    return "titled_messages" in (content_data or {}).get("telegram_html", {})
@@ -1,12 +1,79 @@
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings
 
 
+class LLMRoute(BaseModel):
+    """
+    Политика маршрутизации запросов промпта: fallbacks и hedge_model - названия моделей из gpt_models.
+
+    Дублирующий запрос (hedge) требует hedge_model: дублирование в ту же модель только удваивает стоимость
+    медленных запросов.
+    """
+    fallbacks: list[str] = []
+    hedge: bool = False
+    hedge_model: str | None = None
+    hedge_after_ms: float = 5000
+    attempts: int | None = None
+
+    @model_validator(mode="after")
+    def check_hedge_model(self):
+        if self.hedge and not self.hedge_model:
+            raise ValueError("hedge requires hedge_model")
+        return self
+
+
 class Settings(BaseSettings):
     OPENAI_API_KEY: str
     DATABASE_URL: str
     REDIS_URL: str
     SEAWEEDFS_MASTER_URL: str
     SEAWEEDFS_VOLUME_URL: str
+    SQL_ECHO: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    TRACE_EXPORT_PATH: str | None = None
+    LLM_LEDGER_BATCH_SIZE: int = 200
+    LLM_LEDGER_FLUSH_INTERVAL: float = 5
+    LLM_LEDGER_MAX_BUFFER: int = 10000
+    LLM_ROLLUP_INTERVAL: float = 300
+    LLM_STREAM_VALIDATION: bool = True
+    LLM_STRICT_SCHEMA: bool = True
+    LLM_BATCH_BACKEND: str = "openai"
+    LLM_BATCH_LOCAL_DIR: str = "batches"
+    LLM_BATCH_PRICE_FACTOR: float = 0.5
+    LLM_INPUT_TOKEN_BUDGETS: dict[str, int] = {"generate_content_answers": 6000, "generate_module_content": 3000}
+    LLM_PREVIEWS_SECTIONS_LIMIT: int = 20
+    # Выносит значения переменных из шаблонов промптов в конец запроса ради кэша промптов провайдера
+    # (gpt_server/assembly.py). Меняет текст запросов, поэтому включается после проверки промптов из таблицы prompts
+    LLM_PREFIX_STABLE_PROMPTS: bool = False
+    LLM_CACHED_INPUT_PRICE_FACTOR: float = 0.5
+    # Без политик запросы идут только в модель промпта. Пример:
+    # LLM_ROUTES='{"allow_topic": {"hedge": true, "hedge_model": "GPT-4o mini", "hedge_after_ms": 3000}}'
+    LLM_ROUTES: dict[str, LLMRoute] = {}
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_LATENCY_WINDOW: int = 200
+    LLM_LATENCY_MIN_SAMPLES: int = 20
+    LLM_HEDGE_WORKERS: int = 16
+    LLM_ROUTE_MODELS_TTL: float = 60
+    LLM_MAX_CONCURRENCY: int = 64
+    IMAGE_MODE: str = "background"
+    IMAGE_STAGE_WORKERS: int = 4
+    IMAGE_RESPONSE_FORMAT: str = "url"
+    STORAGE_POOL_SIZE: int = 16
+    STORAGE_MAX_TRANSFERS: int = 4
+    STORAGE_CHUNK_SIZE: int = 65536
+    # Перекодирование изображений уроков в сжатые варианты display и thumbnail: бот отправляет в несколько раз
+    # меньше байт на урок, но ингест занимает память под декодированное изображение (около 4 МБ на 1024x1024)
+    # и процессор на сжатие. Исходник при этом не держится в памяти: он пишется частями во временный файл на
+    # диске, поэтому нужно место во временном каталоге. Без перекодирования изображение переносится в хранилище
+    # потоком, частями по STORAGE_CHUNK_SIZE байт, и отправляется ботом как есть.
+    IMAGE_TRANSCODE: bool = True
+    IMAGE_KEEP_ORIGINAL: bool = True
+    IMAGE_DISPLAY_FORMAT: str = "JPEG"
+    IMAGE_DISPLAY_MAX_SIDE: int = 1280
+    IMAGE_DISPLAY_QUALITY: int = 82
+    IMAGE_THUMBNAIL_FORMAT: str = "WEBP"
+    IMAGE_THUMBNAIL_SIDE: int = 320
+    IMAGE_THUMBNAIL_QUALITY: int = 75
 
 
 setting = Settings()
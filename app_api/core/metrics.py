@@ -0,0 +1,246 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+# Границы корзин гистограмм времени в секундах
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """
+    Базовый класс метрики с набором меток. Значения хранятся отдельно для каждой комбинации меток.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        """
+        Args:
+            name (str): Название метрики
+            documentation (str): Описание метрики для строки HELP
+            labelnames (tuple[str, ...]): Названия меток
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+    def render(self) -> str:
+        """
+        Возвращает метрику в текстовом формате Prometheus.
+
+        Returns:
+            str: Строки HELP, TYPE и значения метрики.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    Монотонно возрастающий счетчик.
+    """
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        Увеличивает счетчик.
+
+        Args:
+            amount (float): Величина увеличения
+            **labels: Значения меток
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Значение, которое может как увеличиваться, так и уменьшаться.
+    """
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        """
+        Устанавливает значение.
+
+        Args:
+            value (float): Новое значение
+            **labels: Значения меток
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """
+    Гистограмма наблюдений с фиксированными границами корзин, суммой и количеством.
+    """
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        """
+        Args:
+            name (str): Название метрики
+            documentation (str): Описание метрики для строки HELP
+            labelnames (tuple[str, ...]): Названия меток
+            buckets (tuple[float, ...]): Верхние границы корзин по возрастанию
+        """
+        super().__init__(name=name, documentation=documentation, labelnames=labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """
+        Добавляет наблюдение.
+
+        Args:
+            value (float): Наблюдаемое значение
+            **labels: Значения меток
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Контекстный менеджер, который добавляет наблюдение с длительностью блока в секундах.
+
+        Args:
+            **labels: Значения меток
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, extra=f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса API, который отдается эндпоинтом /metrics.
+
+    Кроме метрик, которые обновляются по событиям, реестр вызывает сборщики перед каждой выгрузкой, чтобы
+    заполнить метрики текущего состояния (например, занятость пула соединений).
+    """
+
+    def __init__(self):
+        self.__metrics: dict[str, Metric] = {}
+        self.__collectors: list[Callable[[], None]] = []
+        self.__lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Регистрирует метрику. Повторная регистрация метрики с тем же названием возвращает уже существующую.
+
+        Args:
+            metric (Metric): Метрика
+
+        Returns:
+            Metric: Зарегистрированная метрика.
+        """
+        with self.__lock:
+            return self.__metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name=name, documentation=documentation, labelnames=labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name=name, documentation=documentation, labelnames=labelnames))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(
+            Histogram(name=name, documentation=documentation, labelnames=labelnames, buckets=buckets)
+        )
+
+    def add_collector(self, collector: Callable[[], None]):
+        """
+        Добавляет функцию, которая обновляет метрики перед каждой выгрузкой.
+
+        Args:
+            collector (Callable[[], None]): Функция сбора
+        """
+        with self.__lock:
+            self.__collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Возвращает все метрики в текстовом формате Prometheus.
+
+        Returns:
+            str: Текст для ответа эндпоинта /metrics.
+        """
+        with self.__lock:
+            collectors = list(self.__collectors)
+            metrics = list(self.__metrics.values())
+        for collector in collectors:
+            collector()
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+redis_command_duration = registry.histogram(
+    name="redis_command_duration_seconds",
+    documentation="Время выполнения команд Redis из класса Cache",
+    labelnames=("command",)
+)
+cache_requests = registry.counter(
+    name="cache_requests_total",
+    documentation="Чтения кэша Redis с результатом hit или miss",
+    labelnames=("result",)
+)
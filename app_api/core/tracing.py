@@ -0,0 +1,305 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Mapping
+
+from .config import setting
+from .logging_config import logger
+
+# Заголовок W3C Trace Context: версия-trace_id-span_id-флаги
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+SERVICE_NAME = "app_api"
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    Отрезок времени выполнения операции внутри трассировки.
+
+    Поля совпадают с форматом OTLP/JSON (traceId, spanId, parentSpanId, время в наносекундах), поэтому
+    выгруженные спаны можно отправить в коллектор OpenTelemetry или построить по ним временную шкалу.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict[str, Any] | None = None):
+        """
+        Args:
+            name (str): Название операции
+            trace_id (str): Идентификатор трассировки (32 hex символа)
+            parent_id (str | None): Идентификатор родительского спана (16 hex символов)
+            attributes (dict[str, Any] | None): Атрибуты спана
+        """
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.status = "OK"
+        self.error: str | None = None
+
+    def set_attribute(self, key: str, value: Any):
+        """
+        Устанавливает атрибут спана.
+
+        Args:
+            key (str): Название атрибута
+            value (Any): Значение атрибута
+        """
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException | str):
+        """
+        Отмечает спан как завершившийся ошибкой.
+
+        Args:
+            error (BaseException | str): Ошибка или ее описание
+        """
+        self.status = "ERROR"
+        self.error = str(error)
+
+    @property
+    def traceparent(self) -> str:
+        """
+        Возвращает значение заголовка traceparent для передачи контекста в другой сервис.
+
+        Returns:
+            str: Значение заголовка в формате W3C Trace Context.
+        """
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        """
+        Преобразует спан в словарь в формате OTLP/JSON.
+
+        Returns:
+            dict: Спан для записи экспортером.
+        """
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": self.status},
+            "service": SERVICE_NAME,
+            "thread": threading.current_thread().name,
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"]["message"] = self.error
+        return span
+
+
+class FileSpanExporter:
+    """
+    Экспортер, который пишет завершенные спаны в файл в формате JSON Lines в фоновом потоке.
+
+    Файл играет роль локального коллектора: его можно прочитать скриптом benchmarks.trace_timeline или
+    переслать в коллектор OpenTelemetry.
+    """
+
+    def __init__(self, path: str, max_queue: int = 100000):
+        """
+        Args:
+            path (str): Путь к файлу со спанами
+            max_queue (int): Максимальное количество спанов в очереди, при превышении спаны отбрасываются
+        """
+        self.path = path
+        self.__queue: queue.Queue[dict | None] = queue.Queue(maxsize=max_queue)
+        self.__thread = threading.Thread(target=self.__run, name="span-exporter", daemon=True)
+        self.__thread.start()
+
+    def export(self, span: Span):
+        """
+        Ставит спан в очередь на запись.
+
+        Args:
+            span (Span): Завершенный спан
+        """
+        try:
+            self.__queue.put_nowait(span.to_dict())
+        except queue.Full:
+            logger.warning(f"Span queue is full, dropping span {span.name}")
+
+    def shutdown(self):
+        """
+        Дописывает спаны из очереди в файл и останавливает фоновый поток.
+        """
+        self.__queue.put(None)
+        self.__thread.join(timeout=5)
+
+    def __run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            while True:
+                span = self.__queue.get()
+                if span is None:
+                    file.flush()
+                    return
+                file.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+                if self.__queue.empty():
+                    file.flush()
+
+
+class Tracer:
+    """
+    Трассировщик, который создает спаны и связывает их в дерево через contextvars.
+
+    Если экспортер не задан, спаны все равно создаются, чтобы передавать контекст трассировки дальше,
+    но никуда не записываются.
+    """
+
+    def __init__(self, exporter: FileSpanExporter | None = None):
+        """
+        Args:
+            exporter (FileSpanExporter | None): Экспортер завершенных спанов
+        """
+        self.exporter = exporter
+
+    @contextmanager
+    def span(
+            self,
+            name: str,
+            attributes: dict[str, Any] | None = None,
+            traceparent: str | None = None
+    ) -> Iterator[Span]:
+        """
+        Создает спан, который становится текущим на время выполнения блока.
+
+        Args:
+            name (str): Название операции
+            attributes (dict[str, Any] | None): Атрибуты спана
+            traceparent (str | None): Заголовок traceparent входящего запроса, если спан продолжает
+                трассировку другого сервиса
+
+        Yields:
+            Span: Созданный спан.
+        """
+        parent = _current_span.get()
+        remote = parse_traceparent(traceparent) if parent is None else None
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        elif remote is not None:
+            trace_id, parent_id = remote
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+        span = Span(name=name, trace_id=trace_id, parent_id=parent_id, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.set_error(error)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end(span)
+
+    def start_span(self, name: str, attributes: dict[str, Any] | None = None) -> Span | None:
+        """
+        Создает дочерний спан текущего спана без смены текущего спана. Используется в обработчиках событий,
+        где начало и конец операции находятся в разных функциях.
+
+        Args:
+            name (str): Название операции
+            attributes (dict[str, Any] | None): Атрибуты спана
+
+        Returns:
+            Span | None: Спан, который нужно завершить через end, или None, если текущего спана нет.
+        """
+        parent = _current_span.get()
+        if parent is None or self.exporter is None:
+            return None
+        return Span(name=name, trace_id=parent.trace_id, parent_id=parent.span_id, attributes=attributes)
+
+    def end(self, span: Span):
+        """
+        Завершает спан и передает его экспортеру.
+
+        Args:
+            span (Span): Спан
+        """
+        span.end_ns = time.time_ns()
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """
+    Разбирает заголовок traceparent.
+
+    Args:
+        value (str | None): Значение заголовка
+
+    Returns:
+        tuple[str, str] | None: Идентификатор трассировки и родительского спана или None, если заголовок
+        отсутствует или некорректен.
+    """
+    if not value:
+        return None
+    match = TRACEPARENT_PATTERN.match(value.strip().lower())
+    if match is None or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return match.group(1), match.group(2)
+
+
+def current_span() -> Span | None:
+    """
+    Возвращает текущий спан.
+
+    Returns:
+        Span | None: Текущий спан или None вне трассировки.
+    """
+    return _current_span.get()
+
+
+def inject_headers(headers: Mapping[str, str] | None = None) -> dict[str, str]:
+    """
+    Добавляет к заголовкам исходящего запроса traceparent текущего спана.
+
+    Args:
+        headers (Mapping[str, str] | None): Исходные заголовки
+
+    Returns:
+        dict[str, str]: Заголовки с traceparent, если есть текущий спан.
+    """
+    headers = dict(headers or {})
+    span = _current_span.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.traceparent
+    return headers
+
+
+def traced(name: str) -> Callable:
+    """
+    Декоратор, который выполняет функцию внутри спана с указанным названием.
+
+    Args:
+        name (str): Название операции
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+tracer = Tracer(exporter=FileSpanExporter(path=setting.TRACE_EXPORT_PATH) if setting.TRACE_EXPORT_PATH else None)
+if tracer.exporter is not None:
+    atexit.register(tracer.exporter.shutdown)
@@ -0,0 +1,156 @@
+import tempfile
+from io import BytesIO
+from typing import BinaryIO, NamedTuple
+
+from app_api.core.config import setting
+from app_api.core.logging_config import logger
+from app_api.core.tracing import tracer
+from app_api.db.storage import (download_to_file, base64_chunks, file_chunks, upload_file, upload_stream,
+                                store_generated_image, transfer_slots)
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CONTENT_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class ImageVariant(NamedTuple):
+    """
+    Вариант изображения урока.
+
+    Attributes:
+        name (str): Название варианта: original, display или thumbnail
+        content (bytes): Содержимое файла
+        format (str): Формат файла в терминах Pillow (JPEG, WEBP, PNG)
+        width (int): Ширина в пикселях
+        height (int): Высота в пикселях
+    """
+    name: str
+    content: bytes
+    format: str
+    width: int
+    height: int
+
+
+def _encode(image, name: str, image_format: str, quality: int) -> ImageVariant:
+    buffer = BytesIO()
+    options = {"quality": quality, "optimize": True}
+    if image_format == "JPEG":
+        options["progressive"] = True
+    elif image_format == "WEBP":
+        options = {"quality": quality, "method": 6}
+    image.save(buffer, format=image_format, **options)
+    return ImageVariant(name=name, content=buffer.getvalue(), format=image_format, width=image.width,
+                        height=image.height)
+
+
+def transcode_image(
+        content: bytes | BinaryIO,
+        keep_original: bool = setting.IMAGE_KEEP_ORIGINAL
+) -> list[ImageVariant]:
+    """
+    Создает варианты изображения: display - для отправки в Telegram (сторона не больше IMAGE_DISPLAY_MAX_SIDE,
+    формат IMAGE_DISPLAY_FORMAT) и thumbnail - превью (сторона IMAGE_THUMBNAIL_SIDE, формат
+    IMAGE_THUMBNAIL_FORMAT). Изображение не увеличивается.
+
+    Args:
+        content (bytes | BinaryIO): Исходное изображение или файл с ним, открытый на чтение с начала
+        keep_original (bool): Добавить исходное изображение вариантом original (только для bytes)
+
+    Returns:
+        list[ImageVariant]: Варианты изображения, первым идет display.
+    """
+    in_memory = isinstance(content, bytes)
+    with Image.open(BytesIO(content) if in_memory else content) as source:
+        original = None
+        if keep_original and in_memory:
+            original = ImageVariant(name="original", content=content, format=source.format, width=source.width,
+                                    height=source.height)
+        display = source.convert("RGB")
+    display.thumbnail((setting.IMAGE_DISPLAY_MAX_SIDE, setting.IMAGE_DISPLAY_MAX_SIDE), Image.LANCZOS)
+    thumbnail = display.copy()
+    thumbnail.thumbnail((setting.IMAGE_THUMBNAIL_SIDE, setting.IMAGE_THUMBNAIL_SIDE), Image.LANCZOS)
+    variants = [
+        _encode(display, name="display", image_format=setting.IMAGE_DISPLAY_FORMAT,
+                quality=setting.IMAGE_DISPLAY_QUALITY),
+        _encode(thumbnail, name="thumbnail", image_format=setting.IMAGE_THUMBNAIL_FORMAT,
+                quality=setting.IMAGE_THUMBNAIL_QUALITY),
+    ]
+    if original is not None:
+        variants.append(original)
+    return variants
+
+
+def _variant_data(fid: str | None, image_format: str, width: int, height: int, size: int) -> dict:
+    return {
+        "fid": fid,
+        "format": image_format.lower(),
+        "content_type": CONTENT_TYPES.get(image_format, "application/octet-stream"),
+        "width": width,
+        "height": height,
+        "size": size,
+    }
+
+
+def ingest_generated_image(image: str, response_format: str = "url") -> dict:
+    """
+    Сохраняет изображение из ответа генерации изображения вместе с вариантами и возвращает content_data
+    контента урока.
+
+    В content_data["fid"] записывается вариант display, поэтому бот отправляет сжатое изображение, не зная о
+    вариантах. Все варианты с форматом, размерами и размером файла перечислены в content_data["variants"].
+    Если IMAGE_TRANSCODE выключен или Pillow не установлен, изображение переносится в хранилище как есть,
+    потоком (см. store_generated_image).
+
+    Исходное изображение скачивается (или декодируется из base64) частями во временный файл на диске, из него
+    же загружается вариант original и читается изображение для перекодирования. В памяти остаются только
+    декодированное изображение и сжатые варианты display и thumbnail.
+
+    Args:
+        image (str): URL изображения или изображение в base64
+        response_format (str): Формат ответа генерации: url или b64_json
+
+    Returns:
+        dict: content_data изображения урока.
+    """
+    if not setting.IMAGE_TRANSCODE or Image is None:
+        if setting.IMAGE_TRANSCODE:
+            logger.warning("Pillow is not installed, storing the image without variants")
+        return {"fid": store_generated_image(image=image, response_format=response_format)}
+    # Декодированное изображение и варианты находятся в памяти, поэтому ингест занимает слот передачи
+    with transfer_slots, tracer.span(name="storage.ingest_generated_image") as span, \
+            tempfile.TemporaryFile() as file:
+        if response_format == "b64_json":
+            size = sum(file.write(chunk) for chunk in base64_chunks(image))
+        else:
+            size = download_to_file(url=image, file=file)
+        if size is None:
+            return {"fid": None}
+        file.seek(0)
+        variants = {}
+        for variant in transcode_image(content=file, keep_original=False):
+            variants[variant.name] = _variant_data(
+                fid=upload_file(variant.content),
+                image_format=variant.format,
+                width=variant.width,
+                height=variant.height,
+                size=len(variant.content)
+            )
+        if setting.IMAGE_KEEP_ORIGINAL:
+            file.seek(0)
+            with Image.open(file) as source:
+                image_format, width, height = source.format, source.width, source.height
+            file.seek(0)
+            variants["original"] = _variant_data(
+                fid=upload_stream(chunks=file_chunks(file),
+                                  content_type=CONTENT_TYPES.get(image_format, "application/octet-stream")),
+                image_format=image_format,
+                width=width,
+                height=height,
+                size=size
+            )
+        span.set_attribute("file.size", size)
+        span.set_attribute("image.display_size", variants["display"]["size"])
+    return {"fid": variants["display"]["fid"], "variants": variants}
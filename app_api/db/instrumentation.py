@@ -0,0 +1,142 @@
+import time
+
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+from ..core.config import setting
+from ..core.logging_config import logger
+from ..core.metrics import registry
+from ..core.tracing import tracer
+
+# Максимальная длина запроса и параметров в журнале медленных запросов
+SLOW_QUERY_LOG_LIMIT = 2000
+
+db_query_duration = registry.histogram(
+    name="db_query_duration_seconds",
+    documentation="Время выполнения SQL запросов",
+    labelnames=("operation",)
+)
+db_query_rows = registry.counter(
+    name="db_query_rows_total",
+    documentation="Количество строк, затронутых SQL запросами (rowcount)",
+    labelnames=("operation",)
+)
+db_query_errors = registry.counter(
+    name="db_query_errors_total",
+    documentation="Количество SQL запросов, завершившихся ошибкой",
+    labelnames=("operation",)
+)
+db_slow_queries = registry.counter(
+    name="db_slow_queries_total",
+    documentation="Количество SQL запросов дольше SLOW_QUERY_THRESHOLD_MS",
+    labelnames=("operation",)
+)
+db_pool_checkout_wait = registry.histogram(
+    name="db_pool_checkout_wait_seconds",
+    documentation="Время ожидания соединения из пула"
+)
+db_pool_overflow_checkouts = registry.counter(
+    name="db_pool_overflow_checkouts_total",
+    documentation="Количество выдач соединения сверх pool_size (overflow)"
+)
+db_pool_timeouts = registry.counter(
+    name="db_pool_timeouts_total",
+    documentation="Количество неудачных ожиданий соединения из пула"
+)
+db_pool_size = registry.gauge(name="db_pool_size", documentation="Размер пула соединений (pool_size)")
+db_pool_checked_out = registry.gauge(name="db_pool_checked_out", documentation="Количество выданных соединений")
+db_pool_overflow = registry.gauge(name="db_pool_overflow", documentation="Текущее количество overflow соединений")
+
+
+def query_operation(statement: str) -> str:
+    """
+    Определяет тип SQL запроса по первому слову.
+
+    Args:
+        statement (str): Текст запроса
+
+    Returns:
+        str: SELECT, INSERT, UPDATE, DELETE или OTHER.
+    """
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return operation if operation in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool, который замеряет время ожидания соединения и считает выдачи сверх pool_size и тайм-ауты.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            db_pool_timeouts.inc()
+            raise
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - started)
+        if self.overflow() > 0:
+            db_pool_overflow_checkouts.inc()
+        return connection
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = tracer.start_span(
+        name=f"db.{query_operation(statement)}",
+        attributes={"db.statement": statement[:SLOW_QUERY_LOG_LIMIT], "db.executemany": executemany}
+    )
+    conn.info.setdefault("query_started", []).append((time.perf_counter(), span))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started, span = conn.info["query_started"].pop()
+    duration = time.perf_counter() - started
+    operation = query_operation(statement)
+    if span is not None:
+        span.set_attribute("db.rows", cursor.rowcount)
+        tracer.end(span)
+    db_query_duration.observe(duration, operation=operation)
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        db_query_rows.inc(cursor.rowcount, operation=operation)
+    if duration * 1000 >= setting.SLOW_QUERY_THRESHOLD_MS:
+        db_slow_queries.inc(operation=operation)
+        logger.warning(
+            f"Slow query {duration * 1000:.1f} ms, rows={cursor.rowcount}: "
+            f"{statement[:SLOW_QUERY_LOG_LIMIT]} params={str(parameters)[:SLOW_QUERY_LOG_LIMIT]}"
+        )
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        started = context.connection.info.get("query_started")
+        if started:
+            _, span = started.pop()
+            if span is not None:
+                span.set_error(context.original_exception)
+                tracer.end(span)
+    db_query_errors.inc(operation=query_operation(context.statement or ""))
+
+
+def instrument_engine(engine: Engine):
+    """
+    Подключает к движку сбор метрик SQL запросов, спаны запросов (если идет трассировка) и журнал медленных
+    запросов, а также метрики текущего состояния пула соединений, которые обновляются при каждой выгрузке
+    /metrics.
+
+    Args:
+        engine (Engine): Движок базы данных
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    def collect_pool_metrics():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            db_pool_size.set(pool.size())
+            db_pool_checked_out.set(pool.checkedout())
+            db_pool_overflow.set(max(pool.overflow(), 0))
+
+    registry.add_collector(collect_pool_metrics)
@@ -0,0 +1,27 @@
+from .session import SessionLocal
+from .redis_connection import get_redis_connection
+from ..api.endpoints.courses.crud import render_stored_lessons
+# Модели связаны по именам классов, поэтому для запросов вне API должны быть импортированы все
+from ..models import user, education, interaction  # noqa: F401
+
+
+def render_telegram_html() -> int:
+    """
+    Сохраняет Telegram HTML уроков, сгенерированных до того, как рендеринг перенесли в генерацию.
+
+    Разовый скрипт обслуживания, запускается из корня репозитория:
+        python -m app_api.db.render_telegram_html
+
+    Returns:
+        int: Количество обновленных уроков.
+    """
+    redis = get_redis_connection()
+    try:
+        with SessionLocal() as db:
+            return render_stored_lessons(db=db, redis=redis)
+    finally:
+        redis.close()
+
+
+if __name__ == "__main__":
+    print(f"Rendered Telegram HTML for {render_telegram_html()} lessons")
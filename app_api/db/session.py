@@ -3,10 +3,11 @@ from sqlalchemy import create_engine, Engine
 from sqlalchemy.orm import sessionmaker, Session
 
 from ..core.config import setting
+from .instrumentation import InstrumentedQueuePool, instrument_engine
 
 
 def create_local_engine(
-        echo=True,
+        echo=setting.SQL_ECHO,
         pool_size=20,
         max_overflow=15,
         pool_recycle=300,
@@ -21,7 +22,8 @@ def create_local_engine(
     Создаёт и возвращает объект движка базы данных с заданными параметрами подключения.
 
     Args:
-      echo (bool): Включает или выключает логирование для всех операций с базой данных. По умолчанию True
+      echo (bool): Включает или выключает логирование для всех операций с базой данных. По умолчанию SQL_ECHO
+       из настроек, медленные запросы логируются независимо от него (SLOW_QUERY_THRESHOLD_MS)
       pool_size (int): Максимальное количество постоянных соединений, которые могут быть открыты в пуле. По умолчанию 20
       max_overflow (int): Максимальное количество временных соединений, которые могут быть открыты сверх pool_size,
        если пул исчерпан. По умолчанию 15
@@ -45,6 +47,7 @@ def create_local_engine(
     return create_engine(
         setting.DATABASE_URL,
         echo=echo,
+        poolclass=InstrumentedQueuePool,
         pool_size=pool_size,
         max_overflow=max_overflow,
         pool_recycle=pool_recycle,
@@ -60,6 +63,7 @@ def create_local_engine(
 
 
 engine = create_local_engine()
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
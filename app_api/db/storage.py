@@ -1,6 +1,22 @@
+import base64
+import threading
+import uuid
+from typing import BinaryIO, Iterable, Iterator
+
 import requests
+from requests.adapters import HTTPAdapter
+
 from app_api.core.config import setting
 from app_api.core.logging_config import logger
+from app_api.core.tracing import tracer
+
+# Пул соединений к мастеру и volume серверу SeaweedFS (и к адресам изображений), общий для всех потоков
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=setting.STORAGE_POOL_SIZE))
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=setting.STORAGE_POOL_SIZE))
+
+# Ограничивает количество одновременных передач файлов, а значит и занятую ими память
+transfer_slots = threading.BoundedSemaphore(setting.STORAGE_MAX_TRANSFERS)
 
 
 def download_file_from_url(url: str) -> bytes | None:
@@ -16,15 +32,114 @@ def download_file_from_url(url: str) -> bytes | None:
     Raises:
         requests.RequestException: Если возникает ошибка при выполнении запроса.
     """
-    response = requests.get(url, stream=True)
+    with tracer.span(name="storage.download_file_from_url") as span:
+        response = session.get(url)
+        content = response.content
+        span.set_attribute("http.status_code", response.status_code)
+        span.set_attribute("file.size", len(content))
     if response.status_code == 200:
         logger.info(f"File downloaded from {url[:30]}...")
-        return response.content
+        return content
     else:
         logger.error(f"Failed to download file from {url[:30]}...")
         return None
 
 
+def download_to_file(url: str, file: BinaryIO) -> int | None:
+    """
+    Скачивает файл по URL в открытый файл частями по STORAGE_CHUNK_SIZE байт, не собирая его в памяти.
+
+    Args:
+        url (str): URL для скачивания файла
+        file (BinaryIO): Файл, открытый на запись
+
+    Returns:
+        int | None: Размер файла в байтах, если загрузка успешна, иначе None.
+
+    Raises:
+        requests.RequestException: Если возникает ошибка при выполнении запроса.
+    """
+    with tracer.span(name="storage.download_to_file") as span, session.get(url, stream=True) as response:
+        span.set_attribute("http.status_code", response.status_code)
+        if response.status_code != 200:
+            logger.error(f"Failed to download file from {url[:30]}...")
+            return None
+        size = 0
+        for chunk in response.iter_content(chunk_size=setting.STORAGE_CHUNK_SIZE):
+            size += file.write(chunk)
+        span.set_attribute("file.size", size)
+    logger.info(f"File downloaded from {url[:30]}...")
+    return size
+
+
+def base64_chunks(data: str) -> Iterator[bytes]:
+    """
+    Декодирует строку base64 частями примерно по STORAGE_CHUNK_SIZE байт, а не целиком.
+    """
+    # Длина части кратна 4, чтобы каждая часть декодировалась отдельно
+    step = setting.STORAGE_CHUNK_SIZE // 3 * 4
+    return (base64.b64decode(data[start:start + step]) for start in range(0, len(data), step))
+
+
+def file_chunks(file: BinaryIO) -> Iterator[bytes]:
+    """
+    Читает открытый файл с текущей позиции частями по STORAGE_CHUNK_SIZE байт.
+    """
+    return iter(lambda: file.read(setting.STORAGE_CHUNK_SIZE), b"")
+
+
+def _assign_fid() -> str:
+    with tracer.span(name="seaweedfs.assign"):
+        response = session.get(f"{setting.SEAWEEDFS_MASTER_URL}/dir/assign")
+        return response.json()["fid"]
+
+
+def _multipart_body(chunks: Iterable[bytes], boundary: str, content_type: str) -> Iterator[bytes]:
+    """
+    Формирует тело multipart/form-data с одним файлом по частям, не собирая файл в памяти.
+    """
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="uploaded_file"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    yield from chunks
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def upload_stream(chunks: Iterable[bytes], content_type: str = "application/octet-stream") -> str | None:
+    """
+    Загружает файл в систему SeaweedFS по частям (chunked transfer encoding).
+
+    Args:
+        chunks (Iterable[bytes]): Части содержимого файла
+        content_type (str): MIME-тип файла
+
+    Returns:
+        str | None: Идентификатор загруженного файла (fid), если загрузка успешна, иначе None.
+
+    Raises:
+        requests.RequestException: Если возникает ошибка при выполнении запроса.
+        KeyError: Если в ответе сервера отсутствует ключ 'fid'.
+    """
+    with tracer.span(name="storage.upload_stream") as span:
+        fid = _assign_fid()
+        span.set_attribute("seaweedfs.fid", fid)
+        boundary = uuid.uuid4().hex
+        with tracer.span(name="seaweedfs.upload"):
+            upload_response = session.post(
+                f"{setting.SEAWEEDFS_VOLUME_URL}/{fid}",
+                data=_multipart_body(chunks=chunks, boundary=boundary, content_type=content_type),
+                headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+            )
+        span.set_attribute("http.status_code", upload_response.status_code)
+    if upload_response.status_code == 201:
+        logger.info("File uploaded successfully")
+        return fid
+    else:
+        logger.error("Failed to upload file")
+
+
 def upload_file(file_content: bytes) -> str | None:
     """
     Загружает файл в систему SeaweedFS.
@@ -39,14 +154,75 @@ def upload_file(file_content: bytes) -> str | None:
         requests.RequestException: Если возникает ошибка при выполнении запроса.
         KeyError: Если в ответе сервера отсутствует ключ 'fid'.
     """
-    response = requests.get(f"{setting.SEAWEEDFS_MASTER_URL}/dir/assign")
-    fid_info = response.json()
-    fid = fid_info['fid']
-    upload_url = f"{setting.SEAWEEDFS_VOLUME_URL}/{fid}"
-    upload_response = requests.post(upload_url, files={'file': ('uploaded_file', file_content)})
+    with tracer.span(name="storage.upload_file", attributes={"file.size": len(file_content)}) as span:
+        fid = _assign_fid()
+        span.set_attribute("seaweedfs.fid", fid)
+        upload_url = f"{setting.SEAWEEDFS_VOLUME_URL}/{fid}"
+        with tracer.span(name="seaweedfs.upload"):
+            upload_response = session.post(upload_url, files={'file': ('uploaded_file', file_content)})
+        span.set_attribute("http.status_code", upload_response.status_code)
 
     if upload_response.status_code == 201:
         logger.info("File uploaded successfully")
         return fid
     else:
         logger.error("Failed to upload file")
+
+
+def transfer_file_from_url(url: str) -> str | None:
+    """
+    Переносит файл по URL в SeaweedFS: тело ответа передается в загрузку частями по STORAGE_CHUNK_SIZE байт,
+    поэтому в памяти находится только одна часть файла. Одновременно выполняется не больше
+    STORAGE_MAX_TRANSFERS передач.
+
+    Args:
+        url (str): URL файла
+
+    Returns:
+        str | None: Идентификатор загруженного файла (fid), если скачивание и загрузка успешны, иначе None.
+
+    Raises:
+        requests.RequestException: Если возникает ошибка при выполнении запроса.
+    """
+    with transfer_slots, tracer.span(name="storage.transfer_file_from_url") as span:
+        with session.get(url, stream=True) as response:
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code != 200:
+                logger.error(f"Failed to download file from {url[:30]}...")
+                return None
+            return upload_stream(
+                chunks=response.iter_content(chunk_size=setting.STORAGE_CHUNK_SIZE),
+                content_type=response.headers.get("Content-Type", "application/octet-stream")
+            )
+
+
+def upload_base64(data: str, content_type: str = "image/png") -> str | None:
+    """
+    Загружает в SeaweedFS файл, полученный в base64 (ответ генерации изображения с response_format b64_json).
+    Строка декодируется частями, а не целиком.
+
+    Args:
+        data (str): Содержимое файла в base64
+        content_type (str): MIME-тип файла
+
+    Returns:
+        str | None: Идентификатор загруженного файла (fid), если загрузка успешна, иначе None.
+    """
+    with transfer_slots:
+        return upload_stream(chunks=base64_chunks(data), content_type=content_type)
+
+
+def store_generated_image(image: str, response_format: str = "url") -> str | None:
+    """
+    Сохраняет в SeaweedFS изображение из ответа генерации изображения.
+
+    Args:
+        image (str): URL изображения или изображение в base64
+        response_format (str): Формат ответа генерации: url или b64_json
+
+    Returns:
+        str | None: Идентификатор загруженного файла (fid), если сохранение успешно, иначе None.
+    """
+    if response_format == "b64_json":
+        return upload_base64(data=image)
+    return transfer_file_from_url(url=image)
@@ -0,0 +1,102 @@
+from string import Formatter
+from typing import Any
+
+from ..core.config import setting
+
+
+class PromptTemplate:
+    """
+    Сборка сообщений запроса по шаблонам из таблицы prompts.
+
+    При включенном LLM_PREFIX_STABLE_PROMPTS инструкции идут первыми и не меняются от запроса к запросу:
+    плейсхолдеры {name} в них заменяются ссылками [name], а значения переменных и дополнительные указания
+    передаются последним пользовательским сообщением. Так начало запроса совпадает у всех вызовов промпта, и
+    провайдер берет его из кэша промптов (кэшируется одинаковый префикс от 1024 токенов). При выключенной
+    настройке значения подставляются в шаблон, как раньше.
+
+    Системное сообщение - шаблон, только если format_system включен (проверка темы курса), в остальных промптах
+    оно отправляется как есть, в обоих режимах: фигурные скобки в нем (например, пример JSON ответа) -
+    обычный текст.
+    """
+
+    def __init__(self, system: str | None, user: str | None, format_system: bool = False):
+        """
+        Args:
+            system (str | None): Системное сообщение
+            user (str | None): Шаблон пользовательского сообщения
+            format_system (bool): Подставлять переменные в системное сообщение
+        """
+        self.system = system
+        self.user = user
+        self.format_system = format_system
+
+    @staticmethod
+    def _static(template: str) -> tuple[str, list[tuple[str, str | None, str]]]:
+        """
+        Возвращает текст шаблона со ссылками [name] вместо плейсхолдеров и плейсхолдеры: имя поля (как в
+        шаблоне, например x, x.y или x[y]), преобразование (!r) и формат (:>10).
+        """
+        text = []
+        fields = []
+        for literal, name, spec, conversion in Formatter().parse(template):
+            text.append(literal)
+            if name is not None:
+                text.append(f"[{name}]")
+                fields.append((name, conversion, spec or ""))
+        return "".join(text), fields
+
+    @staticmethod
+    def _value(variables: dict[str, Any], name: str, conversion: str | None, spec: str) -> str:
+        """
+        Вычисляет значение плейсхолдера так же, как str.format: с обращением к атрибутам и элементам
+        ({x.y}, {x[y]}), преобразованием и форматом.
+        """
+        formatter = Formatter()
+        value, _ = formatter.get_field(name, (), variables)
+        value = formatter.convert_field(value, conversion)
+        return formatter.format_field(value, formatter.vformat(spec, (), variables))
+
+    @staticmethod
+    def _has_instructions(text: str, names: list[str]) -> bool:
+        for name in names:
+            text = text.replace(f"[{name}]", "")
+        return bool(text.strip())
+
+    def messages(self, variables: dict[str, Any], notes: list[str] = ()) -> list[dict[str, str]]:
+        """
+        Собирает сообщения запроса.
+
+        Args:
+            variables (dict[str, Any]): Значения плейсхолдеров шаблонов
+            notes (list[str]): Дополнительные указания, которые зависят от запроса. Без LLM_PREFIX_STABLE_PROMPTS
+             дописываются в конец пользовательского сообщения как есть.
+
+        Returns:
+            list[dict[str, str]]: Сообщения для модели.
+        """
+        if not setting.LLM_PREFIX_STABLE_PROMPTS:
+            messages = []
+            if self.system is not None:
+                system = self.system.format(**variables) if self.format_system else self.system
+                messages.append({"role": "system", "content": system})
+            if self.user is not None:
+                messages.append({"role": "user", "content": self.user.format(**variables) + "".join(notes)})
+            return messages
+        messages = []
+        used = {}
+        if self.system is not None and not self.format_system:
+            messages.append({"role": "system", "content": self.system})
+        for role, template in (("system", self.system if self.format_system else None), ("user", self.user)):
+            if template is None:
+                continue
+            text, fields = self._static(template)
+            for name, conversion, spec in fields:
+                used.setdefault(name, (conversion, spec))
+            if self._has_instructions(text, [name for name, _, _ in fields]):
+                messages.append({"role": role, "content": text})
+        lines = [f"[{name}]: {self._value(variables, name, conversion, spec)}"
+                 for name, (conversion, spec) in used.items()]
+        lines += [note.strip() for note in notes if note.strip()]
+        if lines:
+            messages.append({"role": "user", "content": "\n".join(lines)})
+        return messages
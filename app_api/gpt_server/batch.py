@@ -0,0 +1,291 @@
+import io
+import json
+import os
+import threading
+import uuid
+from typing import NamedTuple, Type
+
+from openai import OpenAI
+from openai.types import CompletionUsage
+from pydantic import BaseModel, ValidationError
+
+from ..core.config import setting
+from ..core.logging_config import logger
+from .ledger import llm_ledger
+from .openai_api import LLM, Response
+from .structured import repair_json, response_format
+from ..models.interaction import GPTModels
+from ..api.endpoints.gpt_models.schemas import GPTModelsSchema
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Статусы, после которых пакет больше не изменится и его результаты можно забирать
+FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchItem(NamedTuple):
+    """
+    Один запрос пакета генерации.
+
+    Attributes:
+        custom_id (str): Идентификатор запроса в пакете, по нему сопоставляется результат
+        prompt_name (str): Название промпта для журнала вызовов llm_calls
+        model (GPTModels | GPTModelsSchema): Модель GPT
+        base_model (Type[BaseModel]): Базовая модель для валидации ответа
+        messages (list[dict[str, str]]): Сообщения для модели
+        max_tokens (int): Максимальное количество токенов для генерации
+    """
+    custom_id: str
+    prompt_name: str
+    model: GPTModels | GPTModelsSchema
+    base_model: Type[BaseModel]
+    messages: list[dict[str, str]]
+    max_tokens: int = 4096
+
+    def line(self, temperature: float = 0.8) -> dict:
+        """
+        Возвращает строку входного файла Batch API.
+        """
+        return {
+            "custom_id": self.custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": self.model.release,
+                "response_format": response_format(
+                    release=self.model.release,
+                    base_model=self.base_model,
+                    strict=setting.LLM_STRICT_SCHEMA
+                ),
+                "messages": self.messages,
+                "max_tokens": self.max_tokens,
+                "temperature": temperature,
+            },
+        }
+
+
+def dump_lines(lines: list[dict]) -> bytes:
+    """
+    Сериализует строки пакета в JSONL.
+    """
+    return "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode()
+
+
+def load_lines(data: str) -> list[dict]:
+    """
+    Разбирает JSONL, пропуская пустые строки.
+    """
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+class OpenAIBatchClient:
+    """
+    Отправка пакетов в OpenAI Batch API: файл с запросами загружается с purpose="batch", результаты
+    приходят в течение completion_window по сниженной цене.
+    """
+
+    def __init__(self, completion_window: str = "24h"):
+        self.completion_window = completion_window
+        self.__client = OpenAI(api_key=setting.OPENAI_API_KEY, timeout=220, max_retries=4)
+
+    def submit(self, lines: list[dict]) -> str:
+        """
+        Загружает файл пакета и создает пакет.
+
+        Args:
+            lines (list[dict]): Строки входного файла
+
+        Returns:
+            str: ID пакета.
+        """
+        batch_file = self.__client.files.create(file=("batch.jsonl", io.BytesIO(dump_lines(lines))), purpose="batch")
+        batch = self.__client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        """
+        Возвращает статус пакета (validating, in_progress, finalizing, completed, failed, expired, cancelled).
+        """
+        return self.__client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> list[dict]:
+        """
+        Возвращает строки выходного файла и файла ошибок пакета. У истекшего пакета это результаты запросов,
+        выполненных до истечения.
+        """
+        batch = self.__client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines += load_lines(self.__client.files.content(file_id).text)
+        return lines
+
+
+class LocalBatchClient:
+    """
+    Файловая замена Batch API для разработки и тестов.
+
+    Пакет хранится в directory: {batch_id}.input.jsonl с запросами и {batch_id}.output.jsonl с результатами
+    в формате выходного файла Batch API. Запросы выполняются через chat completions (OPENAI_BASE_URL может
+    указывать на заглушку) в фоновом потоке, который запускается при отправке пакета, а после перезапуска API -
+    при проверке статуса. Пока выходного файла нет, статус пакета in_progress, поэтому проверка статуса не ждет
+    выполнения запросов. Выходной файл, подготовленный заранее, используется как есть.
+    """
+
+    # Пакеты, которые выполняются в этом процессе, общие для всех экземпляров клиента
+    _running: set[str] = set()
+    _lock = threading.Lock()
+
+    def __init__(self, directory: str = setting.LLM_BATCH_LOCAL_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __path(self, batch_id: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.{kind}.jsonl")
+
+    def submit(self, lines: list[dict]) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex}"
+        with open(self.__path(batch_id, "input"), "wb") as file:
+            file.write(dump_lines(lines))
+        self.__start(batch_id)
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        if not os.path.exists(self.__path(batch_id, "input")):
+            return "failed"
+        if os.path.exists(self.__path(batch_id, "output")):
+            return "completed"
+        self.__start(batch_id)
+        return "in_progress"
+
+    def __start(self, batch_id: str):
+        with self._lock:
+            if batch_id in self._running:
+                return
+            self._running.add(batch_id)
+        threading.Thread(target=self.__run, args=(batch_id,), name=f"local-batch-{batch_id}", daemon=True).start()
+
+    def results(self, batch_id: str) -> list[dict]:
+        if not os.path.exists(self.__path(batch_id, "output")):
+            return []
+        with open(self.__path(batch_id, "output"), encoding="utf-8") as file:
+            return load_lines(file.read())
+
+    def __run(self, batch_id: str):
+        try:
+            self.__execute(batch_id)
+        except Exception as error:
+            logger.error(f"Local batch {batch_id} failed: {error}")
+        finally:
+            with self._lock:
+                self._running.discard(batch_id)
+
+    def __execute(self, batch_id: str):
+        client = OpenAI(api_key=setting.OPENAI_API_KEY, timeout=220, max_retries=4)
+        with open(self.__path(batch_id, "input"), encoding="utf-8") as file:
+            lines = load_lines(file.read())
+        output = []
+        for line in lines:
+            result = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": line["custom_id"], "response": None,
+                      "error": None}
+            try:
+                completion = client.chat.completions.create(**line["body"])
+                result["response"] = {"status_code": 200, "request_id": completion.id, "body": completion.model_dump()}
+            except Exception as error:
+                result["error"] = {"code": type(error).__name__, "message": str(error)}
+            output.append(result)
+        # Выходной файл появляется целиком, чтобы status не вернул completed по частично записанному файлу
+        temporary_path = self.__path(batch_id, "output.tmp")
+        with open(temporary_path, "wb") as file:
+            file.write(dump_lines(output))
+        os.replace(temporary_path, self.__path(batch_id, "output"))
+
+
+def get_batch_client() -> OpenAIBatchClient | LocalBatchClient:
+    """
+    Возвращает клиент пакетов по настройке LLM_BATCH_BACKEND ("openai" или "local").
+    """
+    if setting.LLM_BATCH_BACKEND == "local":
+        return LocalBatchClient()
+    return OpenAIBatchClient()
+
+
+def parse_result(item: BatchItem, result: dict | None, latency_ms: float) -> Response | None:
+    """
+    Проверяет результат запроса пакета и записывает его в журнал llm_calls по цене пакета
+    (цена модели, умноженная на LLM_BATCH_PRICE_FACTOR).
+
+    Args:
+        item (BatchItem): Запрос пакета
+        result (dict | None): Строка выходного файла с тем же custom_id или None, если результата нет
+        latency_ms (float): Время от отправки пакета до получения результатов в миллисекундах
+
+    Returns:
+        Response | None: Ответ, прошедший валидацию base_model, или None, если запрос нужно выполнить заново.
+    """
+    response_data = (result or {}).get("response") or {}
+    if response_data.get("status_code") != 200:
+        logger.error(f"Batch request {item.custom_id} failed: {(result or {}).get('error')}")
+        return None
+    body = response_data["body"]
+    text = body["choices"][0]["message"]["content"] or ""
+    try:
+        content = json.loads(text)
+    except json.JSONDecodeError:
+        content = repair_json(text=text, base_model=item.base_model) or {}
+    response = Response(
+        content=content,
+        usage=CompletionUsage.model_validate(body["usage"]) if body.get("usage") else None,
+        input_price=item.model.input_price * setting.LLM_BATCH_PRICE_FACTOR,
+        output_price=item.model.output_price * setting.LLM_BATCH_PRICE_FACTOR
+    )
+    try:
+        item.base_model.model_validate(response.content)
+    except ValidationError:
+        logger.error(f"Batch request {item.custom_id} returned invalid response")
+        success = False
+    else:
+        success = True
+    llm_ledger.record(
+        prompt_name=item.prompt_name,
+        model=item.model.release,
+        latency_ms=latency_ms,
+        input_tokens=response.input_tokens,
+        output_tokens=response.output_tokens,
+        cost=response.spent_amount,
+        success=success
+    )
+    return response if success else None
+
+
+def collect_results(items: list[BatchItem], results: list[dict], latency_ms: float, gpt: LLM) -> dict[str, Response]:
+    """
+    Сопоставляет результаты пакета с запросами. Запросы без валидного результата выполняются синхронно
+    по обычной цене.
+
+    Args:
+        items (list[BatchItem]): Запросы пакета
+        results (list[dict]): Строки выходного файла и файла ошибок
+        latency_ms (float): Время от отправки пакета до получения результатов в миллисекундах
+        gpt (LLM): Объект LLM для повторного выполнения запросов
+
+    Returns:
+        dict[str, Response]: Ответы по custom_id.
+    """
+    by_id = {result["custom_id"]: result for result in results}
+    responses = {}
+    for item in items:
+        response = parse_result(item=item, result=by_id.get(item.custom_id), latency_ms=latency_ms)
+        if response is None:
+            response = gpt.complete(
+                model=item.model,
+                base_model=item.base_model,
+                messages=item.messages,
+                prompt_name=item.prompt_name,
+                max_tokens=item.max_tokens
+            )
+        responses[item.custom_id] = response
+    return responses
@@ -0,0 +1,138 @@
+import atexit
+import datetime
+import threading
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..core.config import setting
+from ..core.logging_config import logger
+from ..db.session import engine
+from ..models.interaction import LLMCalls
+from ..api.endpoints.llm_calls.crud import refresh_llm_rollups
+
+
+class LLMCallLedger:
+    """
+    Буфер записей журнала вызовов LLM (таблица llm_calls), который пишет в базу пачками в фоновом потоке.
+
+    Запись вызова только добавляет словарь в память и не обращается к базе, поэтому не замедляет запрос.
+    Фоновый поток сбрасывает буфер одним INSERT на пачку (драйвер объединяет строки в многострочный
+    VALUES) при накоплении batch_size записей или раз в flush_interval секунд, а раз в rollup_interval
+    секунд пересчитывает агрегированные таблицы за текущий и предыдущий день.
+    """
+
+    def __init__(
+            self,
+            batch_size: int = setting.LLM_LEDGER_BATCH_SIZE,
+            flush_interval: float = setting.LLM_LEDGER_FLUSH_INTERVAL,
+            max_buffer: int = setting.LLM_LEDGER_MAX_BUFFER,
+            rollup_interval: float = setting.LLM_ROLLUP_INTERVAL
+    ):
+        """
+        Args:
+            batch_size (int): Количество записей, при накоплении которого буфер сбрасывается досрочно
+            flush_interval (float): Максимальное время в секундах между сбросами буфера
+            max_buffer (int): Максимальный размер буфера, при превышении новые записи отбрасываются
+            rollup_interval (float): Интервал в секундах между пересчетами агрегированных таблиц
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.rollup_interval = rollup_interval
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__buffer: list[dict] = []
+        self.__thread: threading.Thread | None = None
+        self.__last_rollup = time.monotonic()
+
+    def record(
+            self,
+            prompt_name: str,
+            model: str,
+            latency_ms: float,
+            input_tokens: int = 0,
+            output_tokens: int = 0,
+            cost: float = 0,
+            retries: int = 0,
+            cache_hit: bool = False,
+            success: bool = True
+    ):
+        """
+        Добавляет запись о вызове LLM в буфер.
+
+        Args:
+            prompt_name (str): Название промпта (совпадает с prompts.name)
+            model (str): Релиз модели
+            latency_ms (float): Время выполнения вызова вместе с повторами в миллисекундах
+            input_tokens (int): Количество токенов запроса
+            output_tokens (int): Количество токенов ответа
+            cost (float): Стоимость вызова
+            retries (int): Количество неудачных попыток перед результатом
+            cache_hit (bool): Использовал ли провайдер кэш промпта
+            success (bool): Успешно ли завершился вызов
+        """
+        row = {
+            "created_at": datetime.datetime.utcnow(),
+            "prompt_name": prompt_name,
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost": cost,
+            "latency_ms": latency_ms,
+            "retries": retries,
+            "cache_hit": cache_hit,
+            "success": success,
+        }
+        with self.__lock:
+            if len(self.__buffer) >= self.max_buffer:
+                logger.warning(f"LLM ledger buffer is full, dropping call {prompt_name}")
+                return
+            self.__buffer.append(row)
+            size = len(self.__buffer)
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="llm-ledger", daemon=True)
+                self.__thread.start()
+        if size >= self.batch_size:
+            self.__wakeup.set()
+
+    def flush(self):
+        """
+        Записывает все накопленные записи в базу. При ошибке записи возвращаются в буфер.
+        """
+        with self.__lock:
+            rows, self.__buffer = self.__buffer, []
+        if not rows:
+            return
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(LLMCalls), rows)
+        except Exception as error:
+            logger.error(f"Failed to write {len(rows)} LLM calls: {error}")
+            with self.__lock:
+                self.__buffer = (rows + self.__buffer)[-self.max_buffer:]
+
+    def rollup(self):
+        """
+        Пересчитывает агрегированные таблицы за текущий и предыдущий день.
+        """
+        since = datetime.datetime.utcnow().date() - datetime.timedelta(days=1)
+        with Session(engine) as session:
+            refresh_llm_rollups(db=session, date_from=since)
+
+    def __run(self):
+        while True:
+            self.__wakeup.wait(timeout=self.flush_interval)
+            self.__wakeup.clear()
+            self.flush()
+            if time.monotonic() - self.__last_rollup >= self.rollup_interval:
+                self.__last_rollup = time.monotonic()
+                try:
+                    self.rollup()
+                except Exception as error:
+                    logger.error(f"Failed to refresh LLM rollups: {error}")
+
+
+llm_ledger = LLMCallLedger()
+atexit.register(llm_ledger.flush)
@@ -1,4 +1,7 @@
 import json
+import math
+import threading
+import time
 import openai
 import pydantic_core
 from . import validation
@@ -6,11 +9,45 @@ from openai import OpenAI
 from pydantic import BaseModel
 from ..core.config import setting
 from ..core.logging_config import logger
-from typing import Optional, Type, Literal
+from .ledger import llm_ledger
+from .streaming import IncrementalJSONParser, JSONStreamError, SchemaGuard
+from .tokens import prompt_context, token_counter
+from .assembly import PromptTemplate
+from .providers import provider_registry
+from .routing import RequestCancelled, Route, latency_tracker, llm_route_events, model_router
+from .structured import JSON_OBJECT_FORMAT, json_schema_unsupported, repair_json, response_format
+from ..core.tracing import tracer
+from ..core.metrics import registry
+from typing import Generator, Iterator, Optional, Type, Literal
 from ..models.interaction import GPTModels, PromoCode, CourseContentVolume
 from openai.types import CompletionUsage, ImagesResponse
 from ..api.endpoints.gpt_models.schemas import GPTModelsSchema
 
+# Стоимость одного изображения DALL-E 3 (1024x1024, standard)
+IMAGE_GENERATION_PRICE = 0.04
+
+llm_stream_aborts = registry.counter(
+    name="llm_stream_aborts_total",
+    documentation="Потоковые ответы LLM, прерванные до конца из-за расхождения со схемой ответа",
+    labelnames=("prompt_name",)
+)
+llm_json_repairs = registry.counter(
+    name="llm_json_repairs_total",
+    documentation="Ответы LLM, не прошедшие валидацию и исправленные локально без повторного запроса",
+    labelnames=("prompt_name",)
+)
+llm_prompt_tokens_estimate_ratio = registry.histogram(
+    name="llm_prompt_tokens_estimate_ratio",
+    documentation="Отношение фактических входных токенов (usage.prompt_tokens) к оценке до запроса",
+    labelnames=("prompt_name",),
+    buckets=(0.5, 0.8, 0.9, 0.95, 1, 1.05, 1.1, 1.25, 1.5, 2)
+)
+llm_failed_attempts = registry.counter(
+    name="llm_failed_attempts_total",
+    documentation="Неудачные попытки запросов к LLM, после которых запрос повторяется или завершается ошибкой",
+    labelnames=("prompt_name", "reason")
+)
+
 
 class Response:
     """
@@ -44,6 +81,9 @@ class Response:
         """
         Возвращает общую стоимость токенов, использованных для запроса и ответа.
 
+        Токены запроса, взятые провайдером из кэша промпта, оплачиваются по цене input_price
+        с коэффициентом LLM_CACHED_INPUT_PRICE_FACTOR.
+
         Returns:
             float: Общая стоимость токенов.
 
@@ -51,7 +91,9 @@ class Response:
             Exception: Если возникает ошибка при доступе к usage или при расчете стоимости.
         """
         try:
-            prompt_cost = self.__input_price * self.__usage.prompt_tokens
+            cached_tokens = self.cached_tokens
+            prompt_cost = self.__input_price * (self.__usage.prompt_tokens - cached_tokens)
+            prompt_cost += self.__input_price * setting.LLM_CACHED_INPUT_PRICE_FACTOR * cached_tokens
             completion_cost = self.__output_price * self.__usage.completion_tokens
         except Exception as error:
             logger.error(f"{error}")
@@ -92,6 +134,29 @@ class Response:
             logger.error(f"{error}")
             return 0
 
+    @property
+    def cached_tokens(self) -> int:
+        """
+        Возвращает количество токенов запроса, взятых провайдером из кэша промпта.
+
+        Returns:
+            int: Количество кэшированных токенов, 0 если провайдер их не сообщил.
+        """
+        details = getattr(self.__usage, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            return details.get("cached_tokens") or 0
+        return getattr(details, "cached_tokens", None) or 0
+
+    @property
+    def cache_hit(self) -> bool:
+        """
+        Проверяет, использовал ли провайдер кэш промпта для запроса.
+
+        Returns:
+            bool: True, если часть токенов запроса была взята из кэша.
+        """
+        return self.cached_tokens > 0
+
     @property
     def content(self):
         """
@@ -113,19 +178,35 @@ class Response:
         self.__content = value
 
 
-class LLM:
+class ResponseStream:
     """
-    Класс для взаимодействия с API OpenAI, поддерживающий генерацию текста и изображений.
+    Потоковый ответ GPT модели.
+
+    При итерации возвращает новые символы текстового поля ответа по мере генерации. После окончания итерации
+    в response доступен собранный ответ, прошедший валидацию.
 
     Attributes:
-        OPENAI_API_KEY (str): API ключ для доступа к OpenAI.
+        response (Response | None): Полный ответ модели, None до окончания итерации.
     """
 
-    def __init__(self):
+    def __init__(self, generator: Generator[str, None, Response]):
         """
-        Инициализирует объект LLM, загружая API ключ из настроек.
+        Args:
+            generator (Generator[str, None, Response]): Генератор частей ответа, возвращающий полный ответ.
         """
-        self.OPENAI_API_KEY = setting.OPENAI_API_KEY
+        self.__generator = generator
+        self.response: Response | None = None
+
+    def __iter__(self) -> Iterator[str]:
+        self.response = yield from self.__generator
+
+
+class LLM:
+    """
+    Класс для взаимодействия с API OpenAI и OpenAI-совместимыми API, поддерживающий генерацию текста и изображений.
+
+    API и ключ выбираются по записи модели (base_url, api_key_env), см. ProviderRegistry.
+    """
 
     def _text_generator(
             self,
@@ -134,11 +215,23 @@ class LLM:
             messages: list,
             max_tokens: int,
             temperature: float,
-            base_model: Type[BaseModel]
+            base_model: Type[BaseModel],
+            prompt_name: str = "unknown",
+            cancel: threading.Event | None = None
     ):
         """
         Генерирует текстовый ответ с использованием GPT модели.
 
+        При включенном LLM_STRICT_SCHEMA ответ запрашивается с response_format json_schema в strict режиме,
+        построенным по base_model, и модель не может вернуть JSON другой структуры. Если ответ все же не прошел
+        валидацию (обрезан по max_tokens, лишний текст вокруг JSON), он исправляется локально через repair_json
+        до того, как тратить повторный запрос.
+
+        При включенном LLM_STREAM_VALIDATION ответ запрашивается потоково и проверяется по схеме base_model по мере
+        получения. Текст до и после JSON (markdown блок, пояснения) пропускается. Как только ответ уже не может
+        пройти валидацию, генерация прерывается; полученный текст тоже исправляется через repair_json, и только
+        если это не удалось, _make_request повторяет запрос с JSONStreamError, не дожидаясь конца ответа.
+
         Args:
             client (OpenAI): Клиент для взаимодействия с API OpenAI.
             model (GPTModels | GPTModelsSchema): Модель GPT для генерации текста.
@@ -146,6 +239,9 @@ class LLM:
             max_tokens (int): Максимальное количество токенов для генерации.
             temperature (float): Температура для генерации текста.
             base_model (Type[BaseModel]): Базовая модель для валидации ответа.
+            prompt_name (str): Название промпта для метрик.
+            cancel (threading.Event | None): Событие отмены запроса дублирующим запросом, потоковый ответ
+             прерывается с RequestCancelled.
 
         Returns:
             Response: Объект сгенерированного ответа.
@@ -153,23 +249,130 @@ class LLM:
         Raises:
             Exception: Если возникает ошибка при валидации или генерации ответа.
         """
-        completion = client.chat.completions.create(
-            model=model.release,
-            response_format={"type": "json_object"},
-            messages=messages,
-            max_tokens=max_tokens,
-            temperature=temperature,
-        )
-        logger.info(f"Получен ответ от GPT: {completion.choices[0].message.content}")
-        content = self._validate_json(completion.choices[0].message.content)
-        response = Response(
+        started = time.perf_counter()
+        response_format = self._response_format(model=model, base_model=base_model)
+        try:
+            if setting.LLM_STREAM_VALIDATION:
+                parser = IncrementalJSONParser(guard=SchemaGuard(base_model), skip_surrounding_text=True)
+                usage = None
+                try:
+                    for _, chunk_usage in self._stream_completion(
+                            client=client,
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            parser=parser,
+                            response_format=response_format,
+                            cancel=cancel
+                    ):
+                        usage = chunk_usage or usage
+                    content = parser.close()
+                except JSONStreamError as error:
+                    logger.info(f"Получен ответ от GPT (прерван): {parser.text}")
+                    content = repair_json(text=parser.text, base_model=base_model)
+                    if content is None:
+                        raise
+                    logger.warning(f"Ответ GPT для {prompt_name} исправлен без повторного запроса: {error}")
+                    llm_json_repairs.inc(prompt_name=prompt_name)
+                text = parser.text
+                logger.info(f"Получен ответ от GPT: {text}")
+            else:
+                completion = client.chat.completions.create(
+                    model=model.release,
+                    response_format=response_format,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                )
+                text = completion.choices[0].message.content or ""
+                logger.info(f"Получен ответ от GPT: {text}")
+                content = self._validate_json(text)
+                usage = completion.usage
+        except openai.BadRequestError as error:
+            self._check_response_format_error(error=error, model=model, response_format=response_format)
+            raise
+        try:
+            base_model.model_validate(content)
+        except pydantic_core.ValidationError:
+            content = repair_json(text=text, base_model=base_model)
+            if content is None:
+                raise
+            logger.warning(f"Ответ GPT для {prompt_name} исправлен без повторного запроса")
+            llm_json_repairs.inc(prompt_name=prompt_name)
+        latency_tracker.observe(prompt_name=prompt_name, release=model.release, seconds=time.perf_counter() - started)
+        return Response(
             content=content,
-            usage=completion.usage,
+            usage=usage,
             input_price=model.input_price,
             output_price=model.output_price
         )
-        base_model.model_validate(response.content)
-        return response
+
+    @staticmethod
+    def _response_format(model: GPTModels | GPTModelsSchema, base_model: Type[BaseModel]) -> dict:
+        return response_format(release=model.release, base_model=base_model, strict=setting.LLM_STRICT_SCHEMA)
+
+    @staticmethod
+    def _check_response_format_error(
+            error: openai.BadRequestError,
+            model: GPTModels | GPTModelsSchema,
+            response_format: dict
+    ):
+        """
+        Запоминает модель, которая не принимает response_format json_schema, чтобы следующие попытки и запросы
+        к ней шли с json_object.
+        """
+        if response_format is not JSON_OBJECT_FORMAT and "response_format" in str(error):
+            logger.warning(f"Модель {model.release} не поддерживает json_schema, используем json_object")
+            json_schema_unsupported.add(model.release)
+
+    @staticmethod
+    def _stream_completion(
+            client: OpenAI,
+            model: GPTModels | GPTModelsSchema,
+            messages: list,
+            max_tokens: int,
+            temperature: float,
+            parser: IncrementalJSONParser,
+            response_format: dict = JSON_OBJECT_FORMAT,
+            cancel: threading.Event | None = None
+    ) -> Iterator[tuple[str, CompletionUsage | None]]:
+        """
+        Запрашивает ответ потоково и передает каждую часть в parser.
+
+        Ошибка разбора прерывает итерацию, соединение с API закрывается, и генерация ответа останавливается.
+
+        Args:
+            client (OpenAI): Клиент для взаимодействия с API OpenAI.
+            model (GPTModels | GPTModelsSchema): Модель GPT для генерации текста.
+            messages (list): Список сообщений для модели.
+            max_tokens (int): Максимальное количество токенов для генерации.
+            temperature (float): Температура для генерации текста.
+            parser (IncrementalJSONParser): Парсер ответа
+            response_format (dict): Формат ответа (json_object или json_schema)
+            cancel (threading.Event | None): Событие отмены, после которого генерация прерывается
+
+        Yields:
+            tuple[str, CompletionUsage | None]: Часть текста ответа и использование токенов (приходит в последней
+             части).
+        """
+        with client.chat.completions.create(
+                model=model.release,
+                response_format=response_format,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+        ) as chunks:
+            for chunk in chunks:
+                if cancel is not None and cancel.is_set():
+                    raise RequestCancelled(f"{model.release} request cancelled")
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parser.feed(delta)
+                if delta or chunk.usage is not None:
+                    yield delta or "", chunk.usage
 
     @staticmethod
     def _image_generator(
@@ -177,7 +380,8 @@ class LLM:
             prompt: str,
             model: GPTModels | GPTModelsSchema,
             size: Literal["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"] = "1024x1024",
-            quality: Literal["standard", "hd"] = "standard"
+            quality: Literal["standard", "hd"] = "standard",
+            response_format: Literal["url", "b64_json"] = "url"
     ) -> ImagesResponse:
         """
         Генерирует изображение с использованием GPT модели.
@@ -188,6 +392,7 @@ class LLM:
             model (GPTModels | GPTModelsSchema): Модель GPT для генерации изображения.
             size (Literal): Размер сгенерированного изображения.
             quality (Literal): Качество сгенерированного изображения.
+            response_format (Literal): Ссылка на изображение (url) или само изображение в base64 (b64_json).
 
         Returns:
             ImagesResponse: Объект сгенерированного изображения.
@@ -197,6 +402,7 @@ class LLM:
             prompt=prompt,
             size=size,
             quality=quality,
+            response_format=response_format,
             n=1,
         )
         return response
@@ -211,7 +417,10 @@ class LLM:
             model_type: Literal["text", "image", "audio"] = "text",
             prompt: str | None = None,
             size: Literal["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"] = "1024x1024",
-            quality: Literal["standard", "hd"] = "standard"
+            quality: Literal["standard", "hd"] = "standard",
+            response_format: Literal["url", "b64_json"] = "url",
+            prompt_name: str = "unknown",
+            attempts: int = 3
     ) -> Response | ImagesResponse:
         """
         Синхронно отправляет запрос к API OpenAI, используя заданную модель и параметры.
@@ -226,6 +435,9 @@ class LLM:
             prompt (str | None): Текстовое описание для генерации изображения.
             size (Literal): Размер сгенерированного изображения.
             quality (Literal): Качество сгенерированного изображения.
+            response_format (Literal): Формат ответа генерации изображения: url или b64_json.
+            prompt_name (str): Название промпта для журнала вызовов llm_calls.
+            attempts (int): Количество попыток запроса.
 
         Returns:
             Response | ImagesResponse: Объект сгенерированного ответа или изображения.
@@ -233,46 +445,341 @@ class LLM:
         Raises:
             Exception: Если запрос не может быть выполнен после нескольких попыток.
         """
-        client = OpenAI(timeout=220, max_retries=4)
-        client.api_key = self.OPENAI_API_KEY
         logger.info(f"Делаем запрос в GPT model: {model.release}")
         logger.info(f"Запрос: {messages}")
-        for retry in range(3):
-            try:
-                if model_type == "text":
-                    response = self._text_generator(
-                        client=client,
-                        model=model,
-                        messages=messages,
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                        base_model=base_model
+        with tracer.span(
+                name="llm.request",
+                attributes={"llm.prompt_name": prompt_name, "llm.model": model.release, "llm.type": model_type}
+        ) as span:
+            if model_type == "text":
+                return self._routed_text_request(
+                    span=span,
+                    route=model_router.route(prompt_name=prompt_name, model=model, attempts=attempts),
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    base_model=base_model,
+                    prompt_name=prompt_name
+                )
+            started = time.perf_counter()
+            for retry in range(attempts):
+                try:
+                    if model_type == "image":
+                        with provider_registry.backend(model).slot() as client:
+                            response = self._image_generator(
+                                client=client,
+                                model=model,
+                                prompt=prompt,
+                                size=size,
+                                quality=quality,
+                                response_format=response_format
+                            )
+                        span.set_attribute("llm.retries", retry)
+                        llm_ledger.record(
+                            prompt_name=prompt_name,
+                            model=model.release,
+                            latency_ms=(time.perf_counter() - started) * 1000,
+                            cost=IMAGE_GENERATION_PRICE,
+                            retries=retry
+                        )
+                        return response
+                except Exception as error:
+                    self._log_request_error(error=error, prompt_name=prompt_name)
+            span.set_attribute("llm.retries", attempts)
+            llm_ledger.record(
+                prompt_name=prompt_name,
+                model=model.release,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                retries=attempts,
+                success=False
+            )
+            raise Exception("Generate error!")
+
+    def _routed_text_request(
+            self,
+            span,
+            route: Route,
+            messages: list[dict[str, str]],
+            max_tokens: int,
+            temperature: float,
+            base_model: Type[BaseModel],
+            prompt_name: str
+    ) -> Response:
+        """
+        Выполняет текстовый запрос по маршруту: попытки к модели промпта, затем к резервным моделям.
+
+        Первая попытка дублируется запросом к route.hedge_model, если ответа нет дольше порога (см. ModelRouter).
+
+        Args:
+            span (Span): Span запроса
+            route (Route): Маршрут запроса
+            messages (list[dict[str, str]]): Список сообщений для модели.
+            max_tokens (int): Максимальное количество токенов для генерации.
+            temperature (float): Температура для генерации текста.
+            base_model (Type[BaseModel]): Базовая модель для валидации ответа.
+            prompt_name (str): Название промпта для журнала вызовов llm_calls.
+
+        Returns:
+            Response: Ответ модели.
+
+        Raises:
+            Exception: Если ни одна модель маршрута не ответила.
+        """
+        primary = route.chain[0]
+        estimated_tokens = token_counter.count_messages(primary.release, messages)
+        span.set_attribute("llm.estimated_input_tokens", estimated_tokens)
+
+        def request(model: GPTModels | GPTModelsSchema, cancel: threading.Event | None = None) -> Response:
+            with provider_registry.backend(model).slot() as client:
+                return self._text_generator(
+                    client=client,
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    base_model=base_model,
+                    prompt_name=prompt_name,
+                    cancel=cancel
+                )
+
+        def on_discarded(model: GPTModels | GPTModelsSchema, response: Response):
+            llm_ledger.record(
+                prompt_name=prompt_name,
+                model=model.release,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                input_tokens=response.input_tokens,
+                output_tokens=response.output_tokens,
+                cost=response.spent_amount,
+                cache_hit=response.cache_hit
+            )
+
+        started = time.perf_counter()
+        retry = 0
+        for model in route.chain:
+            if model is not primary:
+                logger.warning(f"Falling back from {primary.release} to {model.release} for {prompt_name}")
+                llm_route_events.inc(prompt_name=prompt_name, event="fallback")
+            for _ in range(route.attempts):
+                try:
+                    if retry == 0 and route.hedge_model is not None:
+                        response, model = model_router.hedged(
+                            prompt_name=prompt_name,
+                            route=route,
+                            request=request,
+                            on_discarded=on_discarded
+                        )
+                    else:
+                        response = request(model)
+                    span.set_attribute("llm.retries", retry)
+                    span.set_attribute("llm.routed_model", model.release)
+                    span.set_attribute("llm.input_tokens", response.input_tokens)
+                    span.set_attribute("llm.output_tokens", response.output_tokens)
+                    self._observe_estimate(
+                        estimated_tokens=estimated_tokens,
+                        response=response,
+                        prompt_name=prompt_name
                     )
-                    return response
-                elif model_type == "image":
-                    response = self._image_generator(
-                        client=client,
-                        model=model,
-                        prompt=prompt,
-                        size=size,
-                        quality=quality
+                    llm_ledger.record(
+                        prompt_name=prompt_name,
+                        model=model.release,
+                        latency_ms=(time.perf_counter() - started) * 1000,
+                        input_tokens=response.input_tokens,
+                        output_tokens=response.output_tokens,
+                        cost=response.spent_amount,
+                        retries=retry,
+                        cache_hit=response.cache_hit
                     )
                     return response
-            except openai.APIConnectionError as e:
-                logger.error("The server could not be reached")
-                logger.error(f"{e.__cause__}")
-            except openai.RateLimitError as e:
-                logger.error("A 429 status code was received; we should back off a bit.")
-            except openai.APIStatusError as e:
-                logger.error("Another non-200-range status code was received")
-                logger.error(f"{e.status_code}")
-                logger.error(f"{e.response}")
-            except pydantic_core.ValidationError:
-                logger.error("ValidationError - ")
-            except Exception as error:
-                logger.error(f"{error}")
+                except Exception as error:
+                    self._log_request_error(error=error, prompt_name=prompt_name)
+                retry += 1
+        span.set_attribute("llm.retries", retry)
+        llm_ledger.record(
+            prompt_name=prompt_name,
+            model=primary.release,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            retries=retry,
+            success=False
+        )
         raise Exception("Generate error!")
 
+    def _stream_request(
+            self,
+            model: GPTModels | GPTModelsSchema,
+            base_model: Type[BaseModel],
+            messages: list[dict[str, str]],
+            max_tokens=4096,
+            temperature=0.8,
+            prompt_name: str = "unknown",
+            field: str = "response"
+    ) -> ResponseStream:
+        """
+        Отправляет запрос к API OpenAI в потоковом режиме.
+
+        Ответ разбирается и проверяется по схеме base_model по мере получения, новые символы строкового поля field
+        отдаются сразу. Итоговая валидация base_model и учет токенов выполняются по собранному ответу. Повтор запроса возможен только до того, как
+        отдан первый символ, иначе пользователь увидел бы начало другого ответа.
+
+        Args:
+            model (GPTModels | GPTModelsSchema): Модель GPT для генерации.
+            base_model (Type[BaseModel]): Базовая модель для валидации ответа.
+            messages (list[dict[str, str]]): Список сообщений для модели.
+            max_tokens (int): Максимальное количество токенов для генерации.
+            temperature (float): Температура для генерации текста.
+            prompt_name (str): Название промпта для журнала вызовов llm_calls.
+            field (str): Строковое поле ответа, которое отдается по мере генерации.
+
+        Returns:
+            ResponseStream: Потоковый ответ, запрос выполняется при итерации.
+        """
+        return ResponseStream(self._stream_generator(
+            model=model,
+            base_model=base_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            prompt_name=prompt_name,
+            field=field
+        ))
+
+    def _stream_generator(
+            self,
+            model: GPTModels | GPTModelsSchema,
+            base_model: Type[BaseModel],
+            messages: list[dict[str, str]],
+            max_tokens: int,
+            temperature: float,
+            prompt_name: str,
+            field: str
+    ) -> Generator[str, None, Response]:
+        logger.info(f"Делаем потоковый запрос в GPT model: {model.release}")
+        logger.info(f"Запрос: {messages}")
+        with tracer.span(
+                name="llm.request",
+                attributes={"llm.prompt_name": prompt_name, "llm.model": model.release, "llm.type": "text",
+                            "llm.stream": True}
+        ) as span:
+            estimated_tokens = token_counter.count_messages(model.release, messages)
+            span.set_attribute("llm.estimated_input_tokens", estimated_tokens)
+            started = time.perf_counter()
+            emitted = False
+            # Повтор и переход на резервную модель возможны только до первого отданного символа, поэтому
+            # потоковый запрос не дублируется
+            route = model_router.route(prompt_name=prompt_name, model=model, attempts=3)
+            plan = [current for current in route.chain for _ in range(route.attempts)]
+            for retry, current in enumerate(plan):
+                if current is not model and plan[retry - 1] is not current:
+                    logger.warning(f"Falling back from {model.release} to {current.release} for {prompt_name}")
+                    llm_route_events.inc(prompt_name=prompt_name, event="fallback")
+                response_format = self._response_format(model=current, base_model=base_model)
+                try:
+                    parser = IncrementalJSONParser(guard=SchemaGuard(base_model), skip_surrounding_text=True)
+                    parts = []
+                    usage = None
+                    sent = 0
+                    with provider_registry.backend(current).slot() as client:
+                        for delta, chunk_usage in self._stream_completion(
+                                client=client,
+                                model=current,
+                                messages=messages,
+                                max_tokens=max_tokens,
+                                temperature=temperature,
+                                parser=parser,
+                                response_format=response_format
+                        ):
+                            parts.append(delta)
+                            usage = chunk_usage or usage
+                            value = parser.value.get(field) if isinstance(parser.value, dict) else None
+                            if isinstance(value, str) and len(value) > sent:
+                                emitted = True
+                                yield value[sent:]
+                                sent = len(value)
+                    logger.info(f"Получен ответ от GPT: {''.join(parts)}")
+                    response = Response(
+                        content=parser.close(),
+                        usage=usage,
+                        input_price=current.input_price,
+                        output_price=current.output_price
+                    )
+                    base_model.model_validate(response.content)
+                    span.set_attribute("llm.retries", retry)
+                    span.set_attribute("llm.routed_model", current.release)
+                    span.set_attribute("llm.input_tokens", response.input_tokens)
+                    span.set_attribute("llm.output_tokens", response.output_tokens)
+                    self._observe_estimate(
+                        estimated_tokens=estimated_tokens,
+                        response=response,
+                        prompt_name=prompt_name
+                    )
+                    llm_ledger.record(
+                        prompt_name=prompt_name,
+                        model=current.release,
+                        latency_ms=(time.perf_counter() - started) * 1000,
+                        input_tokens=response.input_tokens,
+                        output_tokens=response.output_tokens,
+                        cost=response.spent_amount,
+                        retries=retry,
+                        cache_hit=response.cache_hit
+                    )
+                    return response
+                except Exception as error:
+                    if isinstance(error, openai.BadRequestError):
+                        self._check_response_format_error(error=error, model=current, response_format=response_format)
+                    self._log_request_error(error=error, prompt_name=prompt_name)
+                if emitted:
+                    break
+            span.set_attribute("llm.retries", retry + 1)
+            llm_ledger.record(
+                prompt_name=prompt_name,
+                model=model.release,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                retries=retry + 1,
+                success=False
+            )
+            raise Exception("Generate error!")
+
+    @staticmethod
+    def _observe_estimate(estimated_tokens: int, response: Response, prompt_name: str):
+        """
+        Сравнивает оценку входных токенов до запроса с prompt_tokens из ответа API.
+        """
+        if response.input_tokens and estimated_tokens:
+            llm_prompt_tokens_estimate_ratio.observe(response.input_tokens / estimated_tokens, prompt_name=prompt_name)
+            logger.info(f"Input tokens for {prompt_name}: estimated {estimated_tokens}, actual {response.input_tokens}")
+
+    @staticmethod
+    def _log_request_error(error: Exception, prompt_name: str):
+        """
+        Записывает в лог ошибку попытки запроса к API OpenAI и учитывает ее в llm_failed_attempts_total.
+
+        Args:
+            error (Exception): Ошибка попытки запроса
+            prompt_name (str): Название промпта
+        """
+        if isinstance(error, openai.APIConnectionError):
+            logger.error("The server could not be reached")
+            logger.error(f"{error.__cause__}")
+            reason = "connection"
+        elif isinstance(error, openai.RateLimitError):
+            logger.error("A 429 status code was received; we should back off a bit.")
+            reason = "rate_limit"
+        elif isinstance(error, openai.APIStatusError):
+            logger.error("Another non-200-range status code was received")
+            logger.error(f"{error.status_code}")
+            logger.error(f"{error.response}")
+            reason = "status"
+        elif isinstance(error, pydantic_core.ValidationError):
+            logger.error("ValidationError - ")
+            reason = "validation"
+        elif isinstance(error, JSONStreamError):
+            logger.error(f"JSONStreamError - {error}")
+            llm_stream_aborts.inc(prompt_name=prompt_name)
+            reason = "stream_abort"
+        else:
+            logger.error(f"{error}")
+            reason = "other"
+        llm_failed_attempts.inc(prompt_name=prompt_name, reason=reason)
+
     @staticmethod
     def _validate_json(data: str) -> dict:
         """
@@ -293,6 +800,154 @@ class LLM:
         except json.JSONDecodeError:
             return {}
 
+    @staticmethod
+    def module_content_messages(
+            system_content: str,
+            user_content: str,
+            course_title: str,
+            sub_module_title: str,
+            content_title: str,
+            previews_sections: list,
+            summary: str | None,
+            is_first_time: bool,
+            language: str,
+            release: str | None = None
+    ) -> list[dict[str, str]]:
+        """
+        Собирает сообщения запроса обучающего материала (generate_module_content).
+
+        Если передан release, список изученных тем сокращается до последних LLM_PREVIEWS_SECTIONS_LIMIT тем,
+        которые помещаются в бюджет входных токенов промпта.
+
+        Args:
+            system_content (str): Инструкция системного сообщения
+            user_content (str): Инструкция пользовательского сообщения
+            course_title (str): Название курса
+            sub_module_title (str): Название подмодуля
+            content_title (str): Название темы
+            previews_sections (list): Названия тем, которые были изучены
+            summary (str | None): Самари ответов пользователя про тему
+            is_first_time (bool): Первый ли материал в курсе
+            language (str): Язык материала
+            release (str | None): Релиз модели для подсчета токенов
+
+        Returns:
+            list[dict[str, str]]: Сообщения для модели.
+        """
+        if release is not None and previews_sections:
+            messages = LLM.module_content_messages(
+                system_content=system_content,
+                user_content=user_content,
+                course_title=course_title,
+                sub_module_title=sub_module_title,
+                content_title=content_title,
+                previews_sections=[],
+                summary=summary,
+                is_first_time=is_first_time,
+                language=language
+            )
+            previews_sections = prompt_context.fit_sections(
+                release=release,
+                messages=messages,
+                sections=previews_sections,
+                budget=setting.LLM_INPUT_TOKEN_BUDGETS.get("generate_module_content", math.inf),
+                limit=setting.LLM_PREVIEWS_SECTIONS_LIMIT
+            )
+        notes = []
+        if previews_sections:
+            notes.append(" Учти, что до этого я изучил эти темы, что бы ты не повторялся: " + " ".join(previews_sections))
+        if summary is not None:
+            notes.append(
+                f"\nВот что тебе надо учитывать, когда ты будешь подготавливать контент: {summary}. "
+                "В материале не акцентируй внимание на том, что я рассказал о себе, просто имей ввиду "
+                "эту информацию, в первую очередь сконцентрируйся на материале."
+            )
+        if is_first_time:
+            notes.append(" Эта наша с тобой первая встреча в обучении, поэтому поприветствуй меня")
+        else:
+            notes.append(" Эта наша с тобой не первая часть обучения, поэтому не нужно приветствий.")
+        return PromptTemplate(system=system_content, user=user_content).messages(
+            variables={
+                "course_title": course_title,
+                "sub_module_title": sub_module_title,
+                "content_title": content_title,
+                "language": language
+            },
+            notes=notes
+        )
+
+    @staticmethod
+    def question_messages(content: str | dict, user_content: str, language: str) -> list[dict[str, str]]:
+        """
+        Собирает сообщения запроса вопроса по материалу (generate_open_question,
+        generate_multiple_choice_question).
+
+        Args:
+            content (str | dict): Информация, которая была пройдена
+            user_content (str): Инструкция пользовательского сообщения
+            language (str): Язык вопроса
+
+        Returns:
+            list[dict[str, str]]: Сообщения для модели.
+        """
+        return PromptTemplate(system=None, user=user_content).messages(
+            variables={"content": content, "language": language}
+        )
+
+    @staticmethod
+    def image_prompt_messages(
+            system_content: str,
+            user_content: str,
+            course_title: str,
+            sub_module_title: str,
+            content_title: str
+    ) -> list[dict[str, str]]:
+        """
+        Собирает сообщения запроса описания изображения (generate_prompt).
+
+        Args:
+            system_content (str): Инструкция системного сообщения
+            user_content (str): Инструкция пользовательского сообщения
+            course_title (str): Название курса
+            sub_module_title (str): Название подмодуля
+            content_title (str): Название темы
+
+        Returns:
+            list[dict[str, str]]: Сообщения для модели.
+        """
+        return PromptTemplate(system=system_content, user=user_content).messages(
+            variables={"course_title": course_title, "sub_module_title": sub_module_title, "content_title": content_title}
+        )
+
+    def complete(
+            self,
+            model: GPTModels | GPTModelsSchema,
+            base_model: Type[BaseModel],
+            messages: list[dict[str, str]],
+            prompt_name: str,
+            max_tokens: int = 4096
+    ) -> Response:
+        """
+        Синхронно выполняет готовый запрос, например запрос пакета, не получивший валидного ответа.
+
+        Args:
+            model (GPTModels | GPTModelsSchema): Модель GPT для генерации
+            base_model (Type[BaseModel]): Базовая модель для валидации ответа
+            messages (list[dict[str, str]]): Сообщения для модели
+            prompt_name (str): Название промпта для журнала вызовов llm_calls
+            max_tokens (int): Максимальное количество токенов для генерации
+
+        Returns:
+            Response: Ответ модели GPT в формате словаря JSON.
+        """
+        return self._make_request(
+            model=model,
+            base_model=base_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            prompt_name=prompt_name
+        )
+
     def generate_course_plan(
             self,
             model: GPTModels | GPTModelsSchema,
@@ -323,12 +978,17 @@ class LLM:
             volume = promo.course_content_volume
         else:
             volume = "Короткий"
-        user_content = user_content.format(course_title=course_title, summary=summary, volume=volume, language=language)
         if summary is None:
-            user_content = user_content[:user_content.find("\n")]
-        system = {"role": "system", "content": system_content}
-        user = {"role": "user", "content": user_content}
-        response = self._make_request(messages=[system, user], model=model, base_model=validation.PlanResponse)
+            user_content = user_content.split("\n")[0]
+        messages = PromptTemplate(system=system_content, user=user_content).messages(
+            variables={"course_title": course_title, "summary": summary, "volume": volume, "language": language}
+        )
+        response = self._make_request(
+            messages=messages,
+            model=model,
+            base_model=validation.PlanResponse,
+            prompt_name="generate_course_plan"
+        )
         response.content = response.content["plan"]
         return response
 
@@ -351,14 +1011,15 @@ class LLM:
         Returns:
             dict: Ответ модели GPT в формате словаря JSON.
         """
-        system_content = system_content.format(language=language)
-        system = {"role": "system", "content": system_content}
-        user = {"role": "user", "content": title}
+        messages = PromptTemplate(system=system_content, user="{title}", format_system=True).messages(
+            variables={"language": language, "title": title}
+        )
         response = self._make_request(
-            messages=[system, user],
+            messages=messages,
             max_tokens=256,
             model=model,
-            base_model=validation.AllowCourseResponse
+            base_model=validation.AllowCourseResponse,
+            prompt_name="allow_topic"
         )
         return response
 
@@ -393,27 +1054,24 @@ class LLM:
         Returns:
             - Response: Ответ модели GPT в формате словаря JSON.
         """
-        system = {"role": "system", "content": system_content}
-        user_content = user_content.format(
+        messages = self.module_content_messages(
+            system_content=system_content,
+            user_content=user_content,
             course_title=course_title,
             sub_module_title=sub_module_title,
             content_title=content_title,
-            language=language
+            previews_sections=previews_sections,
+            summary=summary,
+            is_first_time=is_first_time,
+            language=language,
+            release=model.release
+        )
+        response = self._make_request(
+            messages=messages,
+            model=model,
+            base_model=validation.ContentResponse,
+            prompt_name="generate_module_content"
         )
-        if previews_sections:
-            user_content += " Учти, что до этого я изучил эти темы, что бы ты не повторялся:"
-            for section_name in previews_sections:
-                user_content += f" {section_name}"
-        if summary is not None:
-            user_content += f"\nВот что тебе надо учитывать, когда ты будешь подготавливать контент: {summary}. "
-            user_content += "В материале не акцентируй внимание на том, что я рассказал о себе, просто имей ввиду "
-            user_content += "эту информацию, в первую очередь сконцентрируйся на материале."
-        if is_first_time:
-            user_content += f" Эта наша с тобой первая встреча в обучении, поэтому поприветствуй меня"
-        else:
-            user_content += f" Эта наша с тобой не первая часть обучения, поэтому не нужно приветствий."
-        user = {"role": "user", "content": user_content}
-        response = self._make_request(messages=[system, user], model=model, base_model=validation.ContentResponse)
         return response
 
     def generate_open_question(
@@ -435,9 +1093,12 @@ class LLM:
         Returns:
             Response: Ответ модели GPT в формате словаря JSON.
         """
-        user_content = user_content.format(content=content, language=language)
-        user = {"role": "user", "content": user_content}
-        response = self._make_request(model=model, messages=[user], base_model=validation.OpenQuestionResponse)
+        response = self._make_request(
+            model=model,
+            messages=self.question_messages(content=content, user_content=user_content, language=language),
+            base_model=validation.OpenQuestionResponse,
+            prompt_name="generate_open_question"
+        )
         return response
 
     def generate_multiple_choice_question(
@@ -459,12 +1120,50 @@ class LLM:
         Returns:
             Response: Ответ модели GPT в формате словаря JSON.
         """
-        user_content = user_content.format(content=content, language=language)
-        user = {"role": "user", "content": user_content}
         response = self._make_request(
             model=model,
-            messages=[user],
-            base_model=validation.MultipleChoiceQuestionResponse
+            messages=self.question_messages(content=content, user_content=user_content, language=language),
+            base_model=validation.MultipleChoiceQuestionResponse,
+            prompt_name="generate_multiple_choice_question"
+        )
+        return response
+
+    def generate_sub_module_questions(
+            self,
+            contents: list[dict],
+            system_content: str | None,
+            user_content: str,
+            language: str,
+            model: GPTModels | GPTModelsSchema
+    ) -> Response:
+        """
+        Отправляет модели GPT все материалы подмодуля одним запросом, чтобы получить вопрос с вариантами ответа
+        к каждому материалу и один открытый вопрос по подмодулю.
+
+        Материалы передаются один раз вместо отдельного запроса на каждый вопрос. Запрос выполняется одной
+        попыткой: при ошибке валидации дешевле сгенерировать вопросы по отдельности, чем повторять весь запрос.
+
+        Args:
+            contents (list[dict]): Материалы подмодуля по порядку вопросов
+            system_content (str | None): Инструкция системного сообщения
+            user_content (str): Инструкция пользовательского сообщения, подставляются contents, count и language
+            language (str): Язык вопросов
+            model (GPTModels | GPTModelsSchema): Объект модели, содержащий название модели, стоимость
+
+        Returns:
+            Response: Ответ модели GPT: {"multiple_choice": [...], "open_question": {...}}, в multiple_choice
+             ровно len(contents) вопросов.
+        """
+        numbered = "\n\n".join(f"Материал {number}: {content}" for number, content in enumerate(contents, start=1))
+        messages = PromptTemplate(system=system_content or None, user=user_content).messages(
+            variables={"count": len(contents), "language": language, "contents": numbered}
+        )
+        response = self._make_request(
+            model=model,
+            messages=messages,
+            base_model=validation.sub_module_questions_response(len(contents)),
+            prompt_name="generate_sub_module_questions",
+            attempts=1
         )
         return response
 
@@ -475,8 +1174,9 @@ class LLM:
             user_content: str,
             system_content: str,
             language: str,
-            model: GPTModels | GPTModelsSchema
-    ) -> Response:
+            model: GPTModels | GPTModelsSchema,
+            stream: bool = False
+    ) -> Response | ResponseStream:
         """
         Отправляет вопрос, который был задан пользователю и ответ пользователя, для проверки.
 
@@ -487,14 +1187,27 @@ class LLM:
             answer (str): Ответ, который дал пользователь.
             language (str): Язык на котором нужно дать комментарий
             model (GPTModels | GPTModelsSchema): Объект модели, содержащий название модели, стоимость
+            stream (bool): Вернуть потоковый ответ, комментарий отдается по мере генерации
 
         Returns:
-            - Response: Ответ модели GPT в формате словаря JSON.
+            - Response | ResponseStream: Ответ модели GPT в формате словаря JSON или потоковый ответ.
         """
-        user_content = user_content.format(question=question, answer=answer, language=language)
-        user = {"role": "user", "content": user_content}
-        system = {"role": "system", "content": system_content}
-        response = self._make_request(model=model, messages=[system, user], base_model=validation.AnswersResponse)
+        messages = PromptTemplate(system=system_content, user=user_content).messages(
+            variables={"question": question, "answer": answer, "language": language}
+        )
+        if stream:
+            return self._stream_request(
+                model=model,
+                messages=messages,
+                base_model=validation.AnswersResponse,
+                prompt_name="generate_answer"
+            )
+        response = self._make_request(
+            model=model,
+            messages=messages,
+            base_model=validation.AnswersResponse,
+            prompt_name="generate_answer"
+        )
         return response
 
     def generate_questions_for_survey(
@@ -516,13 +1229,15 @@ class LLM:
         Returns:
             - Response: Ответ модели GPT в формате словаря JSON.
         """
-        user_content = user_content.format(course_title=course_title, language=language)
-        user = {"role": "user", "content": user_content}
+        messages = PromptTemplate(system=None, user=user_content).messages(
+            variables={"course_title": course_title, "language": language}
+        )
         response = self._make_request(
             model=model,
             max_tokens=1024,
-            messages=[user],
-            base_model=validation.SurveyResponse
+            messages=messages,
+            base_model=validation.SurveyResponse,
+            prompt_name="generate_questions_for_survey"
         )
         return response
 
@@ -546,14 +1261,15 @@ class LLM:
              Response: Ответ модели GPT в формате словаря JSON.
         """
         question_answer = "\n".join(f"{question} - {answer}" for question, answer in personal_question.items())
-        user_content = user_content.format(question_answer=question_answer)
-        user = {"role": "user", "content": user_content}
-        system = {"role": "system", "content": system_content}
+        messages = PromptTemplate(system=system_content, user=user_content).messages(
+            variables={"question_answer": question_answer}
+        )
         response = self._make_request(
             model=model,
             max_tokens=1024,
-            messages=[system, user],
-            base_model=validation.SummarizeModel
+            messages=messages,
+            base_model=validation.SummarizeModel,
+            prompt_name="summarize_answers"
         )
         return response
 
@@ -580,18 +1296,19 @@ class LLM:
         Returns:
              Response: Ответ модели GPT в формате словаря JSON.
         """
-        user_content = user_content.format(
+        messages = self.image_prompt_messages(
+            system_content=system_content,
+            user_content=user_content,
             course_title=course_title,
             sub_module_title=sub_module_title,
             content_title=content_title
         )
-        user = {"role": "user", "content": user_content}
-        system = {"role": "system", "content": system_content}
         response = self._make_request(
             model=model,
             max_tokens=1024,
-            messages=[system, user],
-            base_model=validation.PromptResponse
+            messages=messages,
+            base_model=validation.PromptResponse,
+            prompt_name="generate_prompt"
         )
         return response
 
@@ -600,9 +1317,26 @@ class LLM:
             prompt,
             model: GPTModels | GPTModelsSchema,
             size: Literal["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"] = "1024x1024",
-            quality: Literal["standard", "hd"] = "standard"
-    ):
-        response = self._make_request(prompt=prompt, model_type="image", size=size, quality=quality, model=model)
+            quality: Literal["standard", "hd"] = "standard",
+            response_format: Literal["url", "b64_json"] = "url"
+    ) -> str:
+        """
+        Генерирует изображение.
+
+        Returns:
+            str: Ссылка на изображение или изображение в base64, в зависимости от response_format.
+        """
+        response = self._make_request(
+            prompt=prompt,
+            model_type="image",
+            size=size,
+            quality=quality,
+            response_format=response_format,
+            model=model,
+            prompt_name="generate_image"
+        )
+        if response_format == "b64_json":
+            return response.data[0].b64_json
         return response.data[0].url
 
     def generate_content_answers(
@@ -612,19 +1346,31 @@ class LLM:
             content: str,
             language: str,
             history: list,
-            model: GPTModels | GPTModelsSchema
+            model: GPTModels | GPTModelsSchema,
+            stream: bool = False
     ):
-        system = {"role": "system", "content": system_content}
-        user = {"role": "user", "content": user_content.format(content=content, language=language)}
-
-        messages = [system, user]
+        messages = PromptTemplate(system=system_content, user=user_content).messages(
+            variables={"content": content, "language": language}
+        )
+        budget = setting.LLM_INPUT_TOKEN_BUDGETS.get("generate_content_answers")
+        if budget is not None:
+            history = prompt_context.fit_history(release=model.release, messages=messages, history=history, budget=budget)
         for dialogue in history:
             messages.append(dialogue)
+        if stream:
+            return self._stream_request(
+                model=model,
+                max_tokens=1024,
+                messages=messages,
+                base_model=validation.ContentAnswerResponse,
+                prompt_name="generate_content_answers"
+            )
         response = self._make_request(
             model=model,
             max_tokens=1024,
             messages=messages,
-            base_model=validation.ContentAnswerResponse
+            base_model=validation.ContentAnswerResponse,
+            prompt_name="generate_content_answers"
         )
         return response
 
@@ -636,8 +1382,8 @@ class LLM:
             answer: str,
             language: str,
             feedback: str,
-            model: GPTModels | GPTModelsSchema
-
+            model: GPTModels | GPTModelsSchema,
+            stream: bool = False
     ):
 
         system = {"role": "system", "content": system_content}
@@ -646,10 +1392,19 @@ class LLM:
         feedback = {"role": "assistant", "content": feedback}
         help_content = {"role": "user", "content": user_content.format(language=language)}
         messages = [system, question, answer, feedback, help_content]
+        if stream:
+            return self._stream_request(
+                model=model,
+                max_tokens=2048,
+                messages=messages,
+                base_model=validation.HelpResponse,
+                prompt_name="corrector"
+            )
         response = self._make_request(
             model=model,
             max_tokens=2048,
             messages=messages,
-            base_model=validation.HelpResponse
+            base_model=validation.HelpResponse,
+            prompt_name="corrector"
         )
         return response
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from openai import OpenAI
+
+from ..core.config import setting
+from ..core.logging_config import logger
+from ..core.metrics import registry
+from ..models.interaction import GPTModels
+from ..api.endpoints.gpt_models.schemas import GPTModelsSchema
+
+# Ключ для OpenAI-совместимых серверов без авторизации (vLLM, llama.cpp): SDK не принимает пустой ключ
+NO_AUTH_API_KEY = "EMPTY"
+
+llm_backend_wait_seconds = registry.histogram(
+    name="llm_backend_wait_seconds",
+    documentation="Время ожидания свободного слота запроса к API модели (max_concurrency)",
+    labelnames=("backend",)
+)
+
+
+class Backend:
+    """
+    OpenAI-совместимый API, к которому отправляются запросы моделей: клиент и ограничение одновременных запросов.
+
+    Attributes:
+        name (str): Адрес API для логов и метрик
+        client (OpenAI): Клиент API
+    """
+
+    def __init__(self, base_url: str | None, api_key: str, max_concurrency: int):
+        """
+        Args:
+            base_url (str | None): Адрес API, None - API OpenAI (или OPENAI_BASE_URL)
+            api_key (str): Ключ API
+            max_concurrency (int): Максимум одновременных запросов
+        """
+        self.name = base_url or "openai"
+        self.client = OpenAI(base_url=base_url, api_key=api_key, timeout=220, max_retries=4)
+        self.__slots = threading.BoundedSemaphore(max_concurrency)
+
+    @contextmanager
+    def slot(self) -> Iterator[OpenAI]:
+        """
+        Занимает слот запроса на время блока, ожидая освобождения, если все слоты заняты.
+
+        Yields:
+            OpenAI: Клиент API.
+        """
+        started = time.perf_counter()
+        self.__slots.acquire()
+        llm_backend_wait_seconds.observe(time.perf_counter() - started, backend=self.name)
+        try:
+            yield self.client
+        finally:
+            self.__slots.release()
+
+
+class ProviderRegistry:
+    """
+    Backend для каждой модели по полям base_url, api_key_env и max_concurrency записи gpt_models.
+
+    Модели с одинаковыми адресом, ключом и max_concurrency используют один Backend и общий лимит одновременных
+    запросов. Без base_url запросы идут в API OpenAI с ключом OPENAI_API_KEY.
+
+    Изменение base_url, api_key_env или max_concurrency модели (PATCH /models) вступает в силу со следующего
+    запроса модели в каждом процессе API: модель получает Backend по новому ключу, а Backend, который больше не
+    использует ни одна модель, удаляется (запросы, уже занявшие его слот, завершаются).
+    """
+
+    def __init__(self, default_max_concurrency: int = setting.LLM_MAX_CONCURRENCY):
+        """
+        Args:
+            default_max_concurrency (int): Лимит одновременных запросов, если у модели он не задан
+        """
+        self.default_max_concurrency = default_max_concurrency
+        self.__lock = threading.Lock()
+        self.__backends: dict[tuple[str | None, str | None, int], Backend] = {}
+        self.__model_keys: dict[str, tuple[str | None, str | None, int]] = {}
+
+    def backend(self, model: GPTModels | GPTModelsSchema) -> Backend:
+        """
+        Возвращает Backend модели.
+
+        Args:
+            model (GPTModels | GPTModelsSchema): Модель GPT
+
+        Returns:
+            Backend: API, в который отправляются запросы модели.
+        """
+        base_url = getattr(model, "base_url", None)
+        api_key_env = getattr(model, "api_key_env", None)
+        max_concurrency = getattr(model, "max_concurrency", None) or self.default_max_concurrency
+        key = (base_url, api_key_env, max_concurrency)
+        with self.__lock:
+            if self.__model_keys.get(model.release) != key:
+                self.__model_keys[model.release] = key
+                self.__evict()
+            backend = self.__backends.get(key)
+            if backend is None:
+                if api_key_env:
+                    api_key = os.environ.get(api_key_env)
+                    if api_key is None:
+                        logger.warning(f"Environment variable {api_key_env} for {model.release} is not set")
+                        api_key = NO_AUTH_API_KEY
+                else:
+                    api_key = setting.OPENAI_API_KEY if base_url is None else NO_AUTH_API_KEY
+                backend = Backend(base_url=base_url, api_key=api_key, max_concurrency=max_concurrency)
+                self.__backends[key] = backend
+        return backend
+
+    def __evict(self):
+        """
+        Удаляет Backend, которые не использует ни одна модель.
+        """
+        used = set(self.__model_keys.values())
+        for key in list(self.__backends):
+            if key not in used:
+                logger.info(f"Backend {self.__backends[key].name} with limit {key[2]} is no longer used")
+                del self.__backends[key]
+
+
+provider_registry = ProviderRegistry()
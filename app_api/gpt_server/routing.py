@@ -0,0 +1,267 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, NamedTuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import setting
+from ..core.logging_config import logger
+from ..core.metrics import registry
+from ..db.session import engine
+from ..models.interaction import GPTModels
+from ..api.endpoints.gpt_models.schemas import GPTModelsSchema
+
+llm_route_events = registry.counter(
+    name="llm_route_events_total",
+    documentation="События маршрутизации запросов LLM: дублирующий запрос, победа дублирующего запроса, "
+                  "переход на резервную модель",
+    labelnames=("prompt_name", "event")
+)
+
+
+class RequestCancelled(Exception):
+    """
+    Запрос прерван, так как ответ уже получен другим запросом.
+    """
+
+
+class LatencyTracker:
+    """
+    Скользящее окно задержек успешных запросов для каждой пары промпт - модель.
+    """
+
+    def __init__(self, window: int = setting.LLM_LATENCY_WINDOW, min_samples: int = setting.LLM_LATENCY_MIN_SAMPLES):
+        """
+        Args:
+            window (int): Количество последних задержек, по которым считается перцентиль
+            min_samples (int): Минимальное количество задержек, начиная с которого перцентиль считается
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.__lock = threading.Lock()
+        self.__samples: dict[tuple[str, str], deque] = {}
+
+    def observe(self, prompt_name: str, release: str, seconds: float):
+        with self.__lock:
+            samples = self.__samples.setdefault((prompt_name, release), deque(maxlen=self.window))
+            samples.append(seconds)
+
+    def percentile(self, prompt_name: str, release: str, q: float) -> float | None:
+        """
+        Возвращает перцентиль задержки в секундах.
+
+        Args:
+            prompt_name (str): Название промпта
+            release (str): Релиз модели
+            q (float): Перцентиль от 0 до 1
+
+        Returns:
+            float | None: Задержка или None, если задержек меньше min_samples.
+        """
+        with self.__lock:
+            samples = sorted(self.__samples.get((prompt_name, release), ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(q * len(samples)) - 1)]
+
+
+class Route(NamedTuple):
+    """
+    Маршрут запроса промпта.
+
+    Attributes:
+        chain (list): Модель промпта и резервные модели в порядке перехода
+        attempts (int): Количество попыток на каждую модель
+        hedge_model (GPTModels | GPTModelsSchema | None): Модель дублирующего запроса, None - без дублирования
+        hedge_after (float): Порог в секундах до дублирующего запроса, пока нет статистики задержек
+    """
+    chain: list[GPTModels | GPTModelsSchema]
+    attempts: int
+    hedge_model: GPTModels | GPTModelsSchema | None
+    hedge_after: float
+
+
+class ModelRouter:
+    """
+    Маршрутизация запросов по политикам LLM_ROUTES.
+
+    Если модель промпта не ответила за все попытки, запрос переходит к резервным моделям. Для промптов с hedge
+    первая попытка дублируется запросом к hedge_model, если ответа нет дольше перцентиля LLM_HEDGE_PERCENTILE
+    задержек модели промпта (или hedge_after_ms, пока статистики мало). Побеждает первый валидный ответ,
+    второй запрос прерывается.
+    """
+
+    def __init__(
+            self,
+            tracker: LatencyTracker,
+            workers: int = setting.LLM_HEDGE_WORKERS,
+            models_ttl: float = setting.LLM_ROUTE_MODELS_TTL
+    ):
+        """
+        Args:
+            tracker (LatencyTracker): Статистика задержек запросов
+            workers (int): Количество потоков для дублирующих запросов
+            models_ttl (float): Время в секундах, на которое запоминаются модели из gpt_models
+        """
+        self.tracker = tracker
+        self.models_ttl = models_ttl
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-hedge")
+        self.__lock = threading.Lock()
+        self.__models: dict[str, tuple[float, GPTModelsSchema | None]] = {}
+
+    def _resolve(self, name: str) -> GPTModelsSchema | None:
+        """
+        Возвращает модель из gpt_models по названию, модели запоминаются на models_ttl секунд.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            cached = self.__models.get(name)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        try:
+            with Session(engine) as session:
+                row = session.query(GPTModels).filter(GPTModels.name == name).first()
+                model = GPTModelsSchema.model_validate(row) if row is not None else None
+        except Exception as error:
+            logger.warning(f"Failed to load route model {name}: {error}")
+            model = None
+        if model is None:
+            logger.warning(f"Route model {name} not found, skipping it")
+        with self.__lock:
+            self.__models[name] = (now + self.models_ttl, model)
+        return model
+
+    def route(self, prompt_name: str, model: GPTModels | GPTModelsSchema, attempts: int) -> Route:
+        """
+        Строит маршрут запроса промпта.
+
+        Args:
+            prompt_name (str): Название промпта
+            model (GPTModels | GPTModelsSchema): Модель промпта
+            attempts (int): Количество попыток, заданное методом LLM
+
+        Returns:
+            Route: Маршрут запроса. Без политики в LLM_ROUTES - только модель промпта без дублирования.
+        """
+        policy = setting.LLM_ROUTES.get(prompt_name)
+        if policy is None:
+            return Route(chain=[model], attempts=attempts, hedge_model=None, hedge_after=math.inf)
+        chain = [model]
+        for name in policy.fallbacks:
+            fallback = self._resolve(name)
+            if fallback is not None and all(fallback.release != item.release for item in chain):
+                chain.append(fallback)
+        hedge_model = self._resolve(policy.hedge_model) if policy.hedge else None
+        if hedge_model is not None and hedge_model.release == model.release:
+            logger.warning(f"Hedge model for {prompt_name} is the prompt model, hedging disabled")
+            hedge_model = None
+        return Route(
+            chain=chain,
+            attempts=min(attempts, policy.attempts) if policy.attempts else attempts,
+            hedge_model=hedge_model,
+            hedge_after=policy.hedge_after_ms / 1000
+        )
+
+    def hedge_delay(self, prompt_name: str, route: Route) -> float:
+        """
+        Возвращает время в секундах, после которого отправляется дублирующий запрос.
+        """
+        delay = self.tracker.percentile(prompt_name, route.chain[0].release, setting.LLM_HEDGE_PERCENTILE)
+        return route.hedge_after if delay is None else delay
+
+    def hedged(
+            self,
+            prompt_name: str,
+            route: Route,
+            request: Callable[[GPTModels | GPTModelsSchema, threading.Event], Any],
+            on_discarded: Callable[[GPTModels | GPTModelsSchema, Any], None]
+    ) -> tuple[Any, GPTModels | GPTModelsSchema]:
+        """
+        Выполняет запрос к модели промпта в отдельном потоке и дублирует его запросом к hedge_model в пуле
+        потоков, если ответа нет дольше hedge_delay.
+
+        Вызывающий поток ждет первый успешный ответ из двух запросов и сразу возвращает его. В пул попадают только
+        дублирующие запросы, поэтому количество одновременных запросов с маршрутом не ограничено размером пула.
+        У проигравшего запроса выставляется событие отмены (потоковый запрос прерывается на следующей части
+        ответа, дублирующий запрос, еще не начатый в пуле, не выполняется), а его ответ, если он все же пришел,
+        передается в on_discarded, чтобы учесть расходы. Если победил дублирующий запрос, время до победы
+        записывается в статистику задержек как нижняя оценка задержки модели промпта.
+
+        Args:
+            prompt_name (str): Название промпта
+            route (Route): Маршрут запроса с hedge_model
+            request (Callable): Выполняет запрос к модели, должен прерываться с RequestCancelled по событию отмены
+            on_discarded (Callable): Вызывается с моделью и ответом запроса, который закончился после победителя
+
+        Returns:
+            tuple[Any, GPTModels | GPTModelsSchema]: Ответ и модель, которая его дала.
+
+        Raises:
+            Exception: Ошибка запроса к модели промпта, если оба запроса завершились ошибкой.
+        """
+        primary_model = route.chain[0]
+        primary_cancel = threading.Event()
+        hedge_cancel = threading.Event()
+        started = time.perf_counter()
+        primary = self._spawn(request, primary_model, primary_cancel)
+        done, _ = wait([primary], timeout=self.hedge_delay(prompt_name=prompt_name, route=route))
+        if done:
+            return primary.result(), primary_model
+
+        llm_route_events.inc(prompt_name=prompt_name, event="hedge_fired")
+        logger.info(f"Hedging {prompt_name}: {primary_model.release} is slow, requesting {route.hedge_model.release}")
+        hedge = self.__executor.submit(request, route.hedge_model, hedge_cancel)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.exception() is None), None)
+            if winner is None:
+                continue
+            if winner is primary:
+                hedge_cancel.set()
+                hedge.cancel()
+                hedge.add_done_callback(self._discarded_callback(model=route.hedge_model, on_discarded=on_discarded))
+                return primary.result(), primary_model
+            primary_cancel.set()
+            primary.add_done_callback(self._discarded_callback(model=primary_model, on_discarded=on_discarded))
+            # Цензурированное наблюдение: модель промпта не ответила как минимум за это время
+            self.tracker.observe(prompt_name, primary_model.release, time.perf_counter() - started)
+            llm_route_events.inc(prompt_name=prompt_name, event="hedge_won")
+            return hedge.result(), route.hedge_model
+        raise primary.exception()
+
+    @staticmethod
+    def _spawn(function: Callable[..., Any], *args) -> Future:
+        """
+        Выполняет function в отдельном потоке и возвращает Future с ее результатом.
+        """
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(function(*args))
+            except BaseException as error:
+                future.set_exception(error)
+
+        threading.Thread(target=run, name="llm-request", daemon=True).start()
+        return future
+
+    @staticmethod
+    def _discarded_callback(
+            model: GPTModels | GPTModelsSchema,
+            on_discarded: Callable[[GPTModels | GPTModelsSchema, Any], None]
+    ) -> Callable[[Future], None]:
+        def callback(future: Future):
+            if not future.cancelled() and future.exception() is None:
+                on_discarded(model, future.result())
+
+        return callback
+
+
+latency_tracker = LatencyTracker()
+model_router = ModelRouter(tracker=latency_tracker)
@@ -0,0 +1,413 @@
+import json
+from typing import Any, Type
+
+from pydantic import BaseModel
+
+WHITESPACE = " \t\n\r"
+LITERAL_CHARS = set("0123456789+-.eEtrufalsn")
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JSONStreamError(ValueError):
+    """
+    Ошибка разбора JSON, полученного частями.
+    """
+
+
+class SchemaGuard:
+    """
+    Проверяет структуру JSON по JSON Schema pydantic модели по мере разбора.
+
+    Проверка не строже валидации pydantic: ошибка вызывается только тогда, когда ответ уже не сможет пройти
+    model_validate. Это значение другого вида (объект или массив вместо строки, строка вместо объекта и т.п.)
+    по известному ключу или в элементе массива и объект, закрытый без обязательных полей. Неизвестные ключи
+    пропускаются без проверки, так как pydantic их игнорирует. Скалярные значения проверяются мягко: pydantic
+    в lax режиме приводит, например, строку "7" к int.
+    """
+
+    # Какие виды JSON значений могут пройти валидацию для типа JSON Schema
+    ACCEPTED_KINDS = {
+        "object": {"object"},
+        "array": {"array"},
+        "string": {"string"},
+        "integer": {"number", "string", "boolean"},
+        "number": {"number", "string", "boolean"},
+        "boolean": {"boolean", "number", "string"},
+        "null": {"null"},
+    }
+
+    def __init__(self, base_model: Type[BaseModel]):
+        """
+        Args:
+            base_model (Type[BaseModel]): Модель, которой должен соответствовать ответ
+        """
+        schema = base_model.model_json_schema()
+        self.__defs = schema.get("$defs", {})
+        self.__root = schema
+
+    def __alternatives(self, schema: dict | None) -> list[dict]:
+        """
+        Возвращает варианты схемы с раскрытыми $ref и anyOf. Пустой список означает любое значение.
+        """
+        if not schema:
+            return []
+        if "$ref" in schema:
+            return self.__alternatives(self.__defs[schema["$ref"].rsplit("/", 1)[-1]])
+        variants = schema.get("anyOf") or schema.get("oneOf")
+        if variants:
+            result = []
+            for variant in variants:
+                alternatives = self.__alternatives(variant)
+                if not alternatives:
+                    return []
+                result.extend(alternatives)
+            return result
+        return [schema]
+
+    def __schemas_at(self, path: list) -> list[dict] | None:
+        """
+        Возвращает варианты схемы значения по пути от корня.
+
+        Returns:
+            list[dict] | None: Варианты схемы, пустой список для любого значения или None, если путь идет через
+             неизвестный ключ и значение не проверяется.
+        """
+        schemas = self.__alternatives(self.__root)
+        for step in path:
+            if not schemas:
+                return []
+            children = []
+            for schema in schemas:
+                if isinstance(step, str) and schema.get("type") == "object":
+                    properties = schema.get("properties", {})
+                    if step in properties:
+                        children.append(properties[step])
+                    elif isinstance(schema.get("additionalProperties"), dict):
+                        children.append(schema["additionalProperties"])
+                    elif "properties" not in schema:
+                        children.append({})
+                elif isinstance(step, int) and schema.get("type") == "array":
+                    children.append(schema.get("items", {}))
+            if not children:
+                return None
+            alternatives = []
+            for child in children:
+                child_alternatives = self.__alternatives(child)
+                if not child_alternatives:
+                    return []
+                alternatives.extend(child_alternatives)
+            schemas = alternatives
+        return schemas
+
+    def check_value(self, path: list, kind: str):
+        """
+        Проверяет вид начавшегося значения.
+
+        Args:
+            path (list): Путь к значению: ключи объектов и индексы массивов
+            kind (str): Вид значения: object, array, string, number, boolean или null
+
+        Raises:
+            JSONStreamError: Если значение такого вида не может пройти валидацию.
+        """
+        schemas = self.__schemas_at(path)
+        if not schemas:
+            return
+        for schema in schemas:
+            expected = schema.get("type")
+            if expected is None or kind in self.ACCEPTED_KINDS.get(expected, {kind}):
+                return
+        expected = ", ".join(sorted({str(schema.get("type")) for schema in schemas}))
+        raise JSONStreamError(f"Unexpected {kind} at {path_to_text(path)}, expected {expected}")
+
+    def check_object(self, path: list, value: dict):
+        """
+        Проверяет, что в закрытом объекте есть все обязательные поля хотя бы одного варианта схемы.
+
+        Args:
+            path (list): Путь к объекту
+            value (dict): Разобранный объект
+
+        Raises:
+            JSONStreamError: Если обязательных полей не хватает.
+        """
+        schemas = self.__schemas_at(path)
+        if not schemas:
+            return
+        missing = None
+        for schema in schemas:
+            if schema.get("type") != "object":
+                continue
+            absent = [key for key in schema.get("required", []) if key not in value]
+            if not absent:
+                return
+            missing = absent
+        if missing:
+            raise JSONStreamError(f"Missing required {', '.join(missing)} at {path_to_text(path)}")
+
+
+def path_to_text(path: list) -> str:
+    """
+    Возвращает путь к значению в виде $.response.sections[0].
+    """
+    return "$" + "".join(f"[{step}]" if isinstance(step, int) else f".{step}" for step in path)
+
+
+class IncrementalJSONParser:
+    """
+    Разбирает JSON по мере поступления частей ответа модели.
+
+    После каждого вызова feed в value доступен уже разобранный объект: незакрытые объекты и массивы содержат
+    полученные элементы, недописанная строка - полученные символы. Числа и литералы появляются после того,
+    как они полностью получены. Синтаксическая ошибка или расхождение со схемой guard вызывает JSONStreamError
+    сразу, не дожидаясь конца ответа.
+    """
+
+    def __init__(
+            self,
+            guard: SchemaGuard | None = None,
+            skip_surrounding_text: bool = False
+    ):
+        """
+        Args:
+            guard (SchemaGuard | None): Проверка структуры по схеме модели ответа
+            skip_surrounding_text (bool): Пропускать текст до первого объекта или массива и после конца JSON
+             (markdown блок, пояснения модели) вместо JSONStreamError
+        """
+        self.__guard = guard
+        self.__skip_surrounding_text = skip_surrounding_text
+        self.__chunks: list[str] = []
+        # Кадр стека: [контейнер, ожидаемый токен, текущий ключ объекта]
+        self.__stack: list[list] = []
+        self.__root: Any = None
+        self.done = False
+        self.__string: list[str] | None = None
+        self.__string_is_key = False
+        self.__string_target: tuple[Any, Any] | None = None
+        self.__escape: str | None = None
+        self.__literal: list[str] | None = None
+
+    @property
+    def value(self) -> Any:
+        """
+        Возвращает разобранную на текущий момент часть JSON.
+
+        Returns:
+            Any: Частично заполненный объект или None, если значение еще не началось.
+        """
+        return self.__root
+
+    @property
+    def text(self) -> str:
+        """
+        Возвращает весь полученный текст, включая часть, на которой разбор остановился с ошибкой.
+        """
+        return "".join(self.__chunks)
+
+    def feed(self, chunk: str):
+        """
+        Добавляет очередную часть текста ответа.
+
+        Args:
+            chunk (str): Часть ответа модели
+
+        Raises:
+            JSONStreamError: Если текст не может быть продолжен до корректного JSON.
+        """
+        self.__chunks.append(chunk)
+        for char in chunk:
+            self.__feed_char(char)
+        self.__sync_string()
+
+    def close(self) -> Any:
+        """
+        Завершает разбор после получения всего ответа.
+
+        Returns:
+            Any: Полностью разобранное значение.
+
+        Raises:
+            JSONStreamError: Если JSON не закончен.
+        """
+        if self.__literal is not None:
+            self.__finish_literal()
+        if not self.done:
+            raise JSONStreamError("Unexpected end of JSON")
+        return self.__root
+
+    def __feed_char(self, char: str):
+        if self.__string is not None:
+            self.__feed_string(char)
+            return
+        if self.__literal is not None:
+            if char in LITERAL_CHARS:
+                self.__literal.append(char)
+                return
+            self.__finish_literal()
+        if char in WHITESPACE:
+            return
+        if self.__skip_surrounding_text and (self.done or (not self.__stack and char not in "{[")):
+            return
+        if self.done:
+            raise JSONStreamError(f"Unexpected {char!r} after the end of JSON")
+        expect = self.__stack[-1][1] if self.__stack else "value"
+        if expect in ("value", "value_or_end"):
+            if char == "]" and expect == "value_or_end":
+                self.__pop()
+            elif char == "{":
+                self.__check_value("object")
+                self.__push({}, "key_or_end")
+            elif char == "[":
+                self.__check_value("array")
+                self.__push([], "value_or_end")
+            elif char == '"':
+                self.__check_value("string")
+                self.__start_string(is_key=False)
+            elif char in LITERAL_CHARS:
+                self.__literal = [char]
+            else:
+                raise JSONStreamError(f"Unexpected {char!r}, expected a value")
+        elif expect in ("key", "key_or_end"):
+            if char == '"':
+                self.__start_string(is_key=True)
+            elif char == "}" and expect == "key_or_end":
+                self.__pop()
+            else:
+                raise JSONStreamError(f"Unexpected {char!r}, expected an object key")
+        elif expect == "colon":
+            if char != ":":
+                raise JSONStreamError(f"Unexpected {char!r}, expected ':'")
+            self.__stack[-1][1] = "value"
+        elif expect == "comma_or_end":
+            container = self.__stack[-1][0]
+            if char == ",":
+                self.__stack[-1][1] = "key" if isinstance(container, dict) else "value"
+            elif char == ("}" if isinstance(container, dict) else "]"):
+                self.__pop()
+            else:
+                raise JSONStreamError(f"Unexpected {char!r}, expected ',' or the end of a container")
+
+    def __feed_string(self, char: str):
+        if self.__escape is not None:
+            if not self.__escape:
+                if char == "u":
+                    self.__escape = "u"
+                    return
+                if char not in ESCAPES:
+                    raise JSONStreamError(f"Invalid escape \\{char}")
+                self.__string.append(ESCAPES[char])
+                self.__escape = None
+                return
+            self.__escape += char
+            if len(self.__escape) < 5:
+                return
+            try:
+                code = int(self.__escape[1:], 16)
+            except ValueError:
+                raise JSONStreamError(f"Invalid escape \\{self.__escape}")
+            previous = self.__string[-1] if self.__string else ""
+            if 0xDC00 <= code <= 0xDFFF and previous and 0xD800 <= ord(previous) <= 0xDBFF:
+                self.__string[-1] = chr(0x10000 + ((ord(previous) - 0xD800) << 10) + (code - 0xDC00))
+            else:
+                self.__string.append(chr(code))
+            self.__escape = None
+        elif char == "\\":
+            self.__escape = ""
+        elif char == '"':
+            text = "".join(self.__string)
+            self.__string = None
+            if self.__string_is_key:
+                self.__stack[-1][2] = text
+                self.__stack[-1][1] = "colon"
+            else:
+                container, key = self.__string_target
+                self.__string_target = None
+                if container is None:
+                    self.__root = text
+                else:
+                    container[key] = text
+                self.__after_value()
+        elif char < " ":
+            raise JSONStreamError("Control character in string")
+        else:
+            self.__string.append(char)
+
+    def __start_string(self, is_key: bool):
+        self.__string = []
+        self.__string_is_key = is_key
+        if not is_key:
+            self.__string_target = self.__attach("")
+
+    def __sync_string(self):
+        if self.__string is None or self.__string_is_key:
+            return
+        container, key = self.__string_target
+        if container is None:
+            self.__root = "".join(self.__string)
+        else:
+            container[key] = "".join(self.__string)
+
+    def __finish_literal(self):
+        text = "".join(self.__literal)
+        self.__literal = None
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            raise JSONStreamError(f"Invalid literal {text!r}")
+        if value is None:
+            self.__check_value("null")
+        else:
+            self.__check_value("boolean" if isinstance(value, bool) else "number")
+        self.__attach(value)
+        self.__after_value()
+
+    def __attach(self, value: Any) -> tuple[Any, Any]:
+        """
+        Записывает значение в текущий контейнер и возвращает место, куда оно записано.
+        """
+        if not self.__stack:
+            self.__root = value
+            return None, None
+        container, _, key = self.__stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+            return container, key
+        container.append(value)
+        return container, len(container) - 1
+
+    def __push(self, container: dict | list, expect: str):
+        self.__attach(container)
+        self.__stack.append([container, expect, None])
+
+    def __pop(self):
+        container = self.__stack.pop()[0]
+        path = self.__path()
+        if self.__stack and isinstance(self.__stack[-1][0], list):
+            # Контейнер уже добавлен в родительский массив
+            path[-1] -= 1
+        if self.__guard is not None and isinstance(container, dict):
+            self.__guard.check_object(path, container)
+        self.__after_value()
+
+    def __path(self) -> list:
+        """
+        Возвращает путь к значению, которое сейчас начинается в текущем контейнере.
+
+        Во внешних массивах текущий элемент уже добавлен, в текущем массиве - еще нет.
+        """
+        last = len(self.__stack) - 1
+        return [
+            key if isinstance(container, dict) else len(container) - (depth != last)
+            for depth, (container, _, key) in enumerate(self.__stack)
+        ]
+
+    def __check_value(self, kind: str):
+        if self.__guard is not None:
+            self.__guard.check_value(self.__path(), kind)
+
+    def __after_value(self):
+        if self.__stack:
+            self.__stack[-1][1] = "comma_or_end"
+        else:
+            self.done = True
+
@@ -0,0 +1,158 @@
+import json
+import re
+from functools import lru_cache
+from typing import Type
+
+from pydantic import BaseModel
+
+JSON_OBJECT_FORMAT = {"type": "json_object"}
+# Ключевые слова JSON Schema, которые strict режим не принимает или которые только тратят токены запроса.
+# Ограничения из них (длины списков и т.п.) по-прежнему проверяет pydantic.
+DROPPED_KEYWORDS = frozenset({
+    "title", "default", "examples", "minItems", "maxItems", "minLength", "maxLength", "pattern", "format",
+    "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum", "multipleOf", "uniqueItems"
+})
+NAME_PATTERN = re.compile(r"[^a-zA-Z0-9_-]")
+
+# Релизы моделей, которые ответили 400 на response_format json_schema
+json_schema_unsupported: set[str] = set()
+
+
+class UnsupportedSchema(ValueError):
+    """
+    Схему нельзя выразить в strict режиме, например словарь с произвольными ключами.
+    """
+
+
+def _strict(node):
+    if isinstance(node, list):
+        return [_strict(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    node = {key: _strict(value) if key != "properties" else value
+            for key, value in node.items() if key not in DROPPED_KEYWORDS}
+    if node.get("type") == "object":
+        properties = node.get("properties")
+        if not properties or node.get("additionalProperties", False) is not False:
+            raise UnsupportedSchema("object without fixed properties")
+        required = set(node.get("required", ()))
+        node["properties"] = {
+            name: _strict(value) if name in required else {"anyOf": [_strict(value), {"type": "null"}]}
+            for name, value in properties.items()
+        }
+        node["required"] = list(properties)
+        node["additionalProperties"] = False
+    return node
+
+
+@lru_cache(maxsize=128)
+def strict_response_format(base_model: Type[BaseModel]) -> dict | None:
+    """
+    Строит response_format json_schema в strict режиме по схеме pydantic модели.
+
+    Все поля объектов становятся обязательными (необязательные поля - nullable), запрещаются лишние поля,
+    неподдерживаемые ключевые слова удаляются.
+
+    Args:
+        base_model (Type[BaseModel]): Модель ответа из validation.py
+
+    Returns:
+        dict | None: response_format или None, если схему нельзя выразить в strict режиме.
+    """
+    try:
+        schema = _strict(base_model.model_json_schema())
+    except UnsupportedSchema:
+        return None
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": NAME_PATTERN.sub("_", base_model.__name__), "strict": True, "schema": schema},
+    }
+
+
+def response_format(release: str, base_model: Type[BaseModel], strict: bool = True) -> dict:
+    """
+    Возвращает response_format для запроса: strict json_schema, если его поддерживают модель и схема,
+    иначе json_object.
+
+    Args:
+        release (str): Релиз модели
+        base_model (Type[BaseModel]): Модель ответа
+        strict (bool): Использовать ли json_schema (настройка LLM_STRICT_SCHEMA)
+
+    Returns:
+        dict: Значение параметра response_format.
+    """
+    if not strict or release in json_schema_unsupported:
+        return JSON_OBJECT_FORMAT
+    return strict_response_format(base_model) or JSON_OBJECT_FORMAT
+
+
+def _cut_points(text: str) -> list[tuple[int, list[str]]]:
+    """
+    Возвращает позиции, на которых можно обрезать начатый JSON, и открытые в этих позициях скобки.
+
+    Позиция допустима после закрытого вложенного объекта или массива и перед запятой: в обоих случаях
+    все предыдущие элементы контейнера получены целиком.
+    """
+    stack = []
+    points = []
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                break
+            points.append((index + 1, list(stack)))
+        elif char == ",":
+            points.append((index, list(stack)))
+    return points
+
+
+def repair_json(text: str, base_model: Type[BaseModel]) -> dict | None:
+    """
+    Пытается исправить ответ модели локально, не повторяя запрос.
+
+    Исправляются текст до и после JSON объекта (пояснения, markdown блок) и обрезанный ответ (ответ уперся
+    в max_tokens): незаконченные последние элементы отбрасываются, открытые массивы и объекты закрываются.
+    Возвращается самый длинный вариант, который проходит валидацию base_model.
+
+    Args:
+        text (str): Текст ответа модели
+        base_model (Type[BaseModel]): Модель ответа
+
+    Returns:
+        dict | None: Исправленный объект или None, если исправить не удалось.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text)
+    except json.JSONDecodeError:
+        candidates = (text[:end].rstrip().rstrip(",") + "".join(reversed(stack))
+                      for end, stack in reversed(_cut_points(text)))
+    else:
+        candidates = (json.dumps(value),)
+    for candidate in candidates:
+        try:
+            value = json.loads(candidate)
+            base_model.model_validate(value)
+        except ValueError:
+            continue
+        return value
+    return None
@@ -0,0 +1,170 @@
+import math
+from functools import lru_cache
+
+from ..core.logging_config import logger
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Служебные токены chat формата: на каждое сообщение и на начало ответа ассистента
+TOKENS_PER_MESSAGE = 3
+REPLY_TOKENS = 3
+# Если кодировку получить нельзя (нет tiktoken или файлов кодировки), токены оцениваются по длине текста.
+# Для текста на русском один токен в среднем около трех символов.
+CHARS_PER_TOKEN = 3
+# Бюджет на краткое содержание отброшенной части диалога и длина одного вопроса в нем
+SUMMARY_TOKENS = 200
+SUMMARY_QUESTION_CHARS = 120
+
+
+@lru_cache(maxsize=32)
+def get_encoding(release: str):
+    """
+    Возвращает кодировку tiktoken для релиза модели, кэшируется на каждую модель.
+
+    Args:
+        release (str): Релиз модели
+
+    Returns:
+        tiktoken.Encoding | None: Кодировка или None, если tiktoken недоступен.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(release)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base" if release.startswith(("gpt-4o", "o1")) else "cl100k_base")
+    except Exception as error:
+        logger.warning(f"Failed to load tiktoken encoding for {release}, estimating tokens by length: {error}")
+        return None
+
+
+class TokenCounter:
+    """
+    Подсчет токенов сообщений для модели.
+    """
+
+    @staticmethod
+    def count(release: str, text: str) -> int:
+        """
+        Возвращает количество токенов текста.
+        """
+        encoding = get_encoding(release)
+        if encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, release: str, messages: list[dict[str, str]]) -> int:
+        """
+        Возвращает оценку количества токенов запроса из сообщений chat формата.
+
+        Args:
+            release (str): Релиз модели
+            messages (list[dict[str, str]]): Сообщения запроса
+
+        Returns:
+            int: Оценка prompt_tokens.
+        """
+        tokens = sum(TOKENS_PER_MESSAGE + self.count(release, str(message.get("content") or "")) for message in messages)
+        return tokens + REPLY_TOKENS
+
+
+class PromptContext:
+    """
+    Удерживает запрос в пределах бюджета входных токенов промпта (LLM_INPUT_TOKEN_BUDGETS).
+
+    Старые реплики диалога заменяются кратким содержанием из вопросов пользователя, список изученных тем
+    сокращается до последних тем.
+    """
+
+    def __init__(self, counter: TokenCounter):
+        self.counter = counter
+
+    def fit_history(
+            self,
+            release: str,
+            messages: list[dict[str, str]],
+            history: list[dict[str, str]],
+            budget: int
+    ) -> list[dict[str, str]]:
+        """
+        Оставляет последние реплики истории, которые помещаются в бюджет вместе с messages.
+
+        Последняя реплика (текущий вопрос) остается всегда. Вместо отброшенных реплик добавляется одно
+        сообщение с их кратким содержанием: начала вопросов пользователя, от новых к старым, пока помещаются
+        в SUMMARY_TOKENS.
+
+        Args:
+            release (str): Релиз модели
+            messages (list[dict[str, str]]): Сообщения, которые отправляются всегда (инструкции, материал)
+            history (list[dict[str, str]]): История диалога, последняя реплика - текущий вопрос
+            budget (int): Бюджет входных токенов
+
+        Returns:
+            list[dict[str, str]]: История, которую нужно отправить.
+        """
+        available = budget - self.counter.count_messages(release, messages)
+        kept = []
+        for turn in reversed(history):
+            cost = TOKENS_PER_MESSAGE + self.counter.count(release, str(turn.get("content") or ""))
+            if kept and cost > available - SUMMARY_TOKENS:
+                break
+            kept.insert(0, turn)
+            available -= cost
+        dropped = history[:len(history) - len(kept)]
+        if not dropped:
+            return kept
+        questions = []
+        summary_budget = SUMMARY_TOKENS
+        for turn in reversed(dropped):
+            if turn.get("role") != "user":
+                continue
+            question = str(turn.get("content") or "")[:SUMMARY_QUESTION_CHARS]
+            summary_budget -= self.counter.count(release, question) + 2
+            if summary_budget < 0:
+                break
+            questions.insert(0, question)
+        logger.info(f"Dialogue history trimmed: {len(dropped)} of {len(history)} turns dropped")
+        if not questions:
+            return kept
+        summary = {"role": "system", "content": "Ранее пользователь спрашивал: " + "; ".join(questions)}
+        return [summary] + kept
+
+    def fit_sections(
+            self,
+            release: str,
+            messages: list[dict[str, str]],
+            sections: list[str],
+            budget: int,
+            limit: int
+    ) -> list[str]:
+        """
+        Оставляет последние изученные темы: не больше limit и в пределах бюджета вместе с messages.
+
+        Args:
+            release (str): Релиз модели
+            messages (list[dict[str, str]]): Сообщения запроса без списка тем
+            sections (list[str]): Названия изученных тем по порядку
+            budget (int): Бюджет входных токенов
+            limit (int): Максимальное количество тем
+
+        Returns:
+            list[str]: Названия тем, которые нужно отправить, в исходном порядке.
+        """
+        available = budget - self.counter.count_messages(release, messages)
+        kept = []
+        for section in reversed(sections[-limit:] if limit > 0 else []):
+            available -= self.counter.count(release, f" {section}")
+            if available < 0:
+                break
+            kept.insert(0, section)
+        if len(kept) < len(sections):
+            logger.info(f"Previous sections trimmed: {len(sections) - len(kept)} of {len(sections)} dropped")
+        return kept
+
+
+token_counter = TokenCounter()
+prompt_context = PromptContext(counter=token_counter)
@@ -1,6 +1,7 @@
-from typing import Optional
+from functools import lru_cache
+from typing import Annotated, Optional, Type
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 
 
 class ContentModel(BaseModel):
@@ -33,6 +34,27 @@ class MultipleChoiceQuestionResponse(BaseModel):
     answers: list[AnswersMultipleChoice]
 
 
+class SubModuleQuestionsResponse(BaseModel):
+    multiple_choice: list[MultipleChoiceQuestionResponse]
+    open_question: OpenQuestionResponse
+
+
+@lru_cache(maxsize=32)
+def sub_module_questions_response(count: int) -> Type[SubModuleQuestionsResponse]:
+    """
+    Возвращает схему ответа, в которой ровно count вопросов с вариантами ответа: по одному на каждый материал.
+
+    Схема создается один раз на количество вопросов, поэтому strict_response_format, который кэшируется по
+    классу модели, не строит response_format заново для каждого подмодуля.
+    """
+    return create_model(
+        "SubModuleQuestionsResponse",
+        __base__=SubModuleQuestionsResponse,
+        multiple_choice=(Annotated[list[MultipleChoiceQuestionResponse], Field(min_length=count, max_length=count)],
+                         ...)
+    )
+
+
 class AllowCourseResponse(BaseModel):
     allow: bool = Field(title="Флаг доступности темы к обучению", examples=[True])
     description: str = Field(title="Описание, почему доступна или не доступна данная", examples=["Потому что"])
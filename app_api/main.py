@@ -1,8 +1,11 @@
 import uvicorn
-from fastapi import FastAPI
 from app_api.db.base import Base
+from fastapi import FastAPI, Request
 from app_api.db.session import engine
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app_api.core.metrics import registry
+from app_api.core.tracing import tracer, TRACEPARENT_HEADER
 from app_api.core.logging_config import logger
 from app_api.api.endpoints.promo.router import promo
 from app_api.api.endpoints.users.router import users
@@ -13,6 +16,8 @@ from app_api.api.endpoints.gpt_models.router import models
 from sqlalchemy_utils import database_exists, create_database
 from app_api.api.endpoints.translation.router import translations
 from app_api.api.endpoints.user_courses.router import user_courses
+from app_api.api.endpoints.llm_calls.router import llm_calls
+from app_api.api.endpoints.batches.router import generation_batches
 
 app = FastAPI(
     title="Skill Helper API",
@@ -27,6 +32,53 @@ app.include_router(promo)
 app.include_router(translations)
 app.include_router(others)
 app.include_router(user_courses, prefix="/users")
+app.include_router(llm_calls)
+app.include_router(generation_batches)
+
+
+class TracingMiddleware:
+    """
+    Оборачивает обработку запроса в спан, продолжая трассировку клиента из заголовка traceparent.
+
+    Спан завершается после отправки всего тела ответа, поэтому потоковые ответы (SSE) попадают в него целиком,
+    а спаны запросов к модели во время потоковой передачи остаются его дочерними спанами.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        with tracer.span(
+                name=f"{request.method} {request.url.path}",
+                attributes={"http.method": request.method, "http.target": request.url.path},
+                traceparent=request.headers.get(TRACEPARENT_HEADER)
+        ) as span:
+            async def send_with_traceparent(message: Message):
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    span.set_attribute("http.status_code", status_code)
+                    if status_code >= 500:
+                        span.set_error(f"HTTP {status_code}")
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (TRACEPARENT_HEADER.encode(), span.traceparent.encode())
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_traceparent)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{request.method} {route.path}"
+                    span.set_attribute("http.route", route.path)
+
+
+app.add_middleware(TracingMiddleware)
 
 
 @app.get(path="/")
@@ -34,6 +86,11 @@ def main():
     return JSONResponse(content={"SKILL HELPER API": "1.0.0"})
 
 
+@app.get(path="/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return PlainTextResponse(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get(path="/database/create")
 def database():
     if not database_exists(engine.url):
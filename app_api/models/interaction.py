@@ -2,7 +2,10 @@ import enum
 import datetime
 from ..db.base import Base
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, ForeignKey, BigInteger, DateTime, Enum, String, Float, Text, UniqueConstraint
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import (Column, Integer, ForeignKey, BigInteger, DateTime, Enum, String, Float, Text, UniqueConstraint,
+                        Boolean, Date, Index)
 
 
 class MessagesType(enum.Enum):
@@ -30,6 +33,22 @@ class GPTModels(Base):
     output_price = Column(Float, nullable=False)
     description = Column(String(255), nullable=True)
     prompt = relationship("Prompts", back_populates="gpt_model")
+    backend = relationship("GPTModelBackends", back_populates="gpt_model", uselist=False, lazy="joined",
+                           cascade="all, delete-orphan")
+    base_url = association_proxy("backend", "base_url", creator=lambda value: GPTModelBackends(base_url=value))
+    api_key_env = association_proxy("backend", "api_key_env", creator=lambda value: GPTModelBackends(api_key_env=value))
+    max_concurrency = association_proxy(
+        "backend", "max_concurrency", creator=lambda value: GPTModelBackends(max_concurrency=value)
+    )
+
+
+class GPTModelBackends(Base):
+    __tablename__ = "gpt_model_backends"
+    gpt_model_id = Column(Integer, ForeignKey("gpt_models.id", ondelete="CASCADE"), primary_key=True)
+    base_url = Column(String(255), nullable=True)
+    api_key_env = Column(String(255), nullable=True)
+    max_concurrency = Column(Integer, nullable=True)
+    gpt_model = relationship("GPTModels", back_populates="backend")
 
 
 class Prompts(Base):
@@ -75,3 +94,71 @@ class UserPromoCode(Base):
     __table_args__ = (UniqueConstraint('user_id', 'promo_code_id', name='_user_promo_uc'),)
     promo = relationship("PromoCode", back_populates="promo_code")
     promo_user = relationship("Users", back_populates="user_promo")
+
+
+class LLMCalls(Base):
+    __tablename__ = "llm_calls"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    prompt_name = Column(String(255), nullable=False)
+    model = Column(String(255), nullable=False)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0)
+    latency_ms = Column(Float, nullable=False)
+    retries = Column(Integer, nullable=False, default=0)
+    cache_hit = Column(Boolean, nullable=False, default=False)
+    success = Column(Boolean, nullable=False, default=True)
+
+    __table_args__ = (Index("ix_llm_calls_created_at", "created_at"),)
+
+
+class LLMCallsDaily(Base):
+    __tablename__ = "llm_calls_daily"
+
+    day = Column(Date, primary_key=True)
+    prompt_name = Column(String(255), primary_key=True)
+    model = Column(String(255), primary_key=True)
+    calls = Column(Integer, nullable=False)
+    errors = Column(Integer, nullable=False)
+    retries = Column(Integer, nullable=False)
+    cache_hits = Column(Integer, nullable=False)
+    input_tokens = Column(BigInteger, nullable=False)
+    output_tokens = Column(BigInteger, nullable=False)
+    cost = Column(Float, nullable=False)
+
+
+class LLMLatencyDaily(Base):
+    __tablename__ = "llm_latency_daily"
+
+    day = Column(Date, primary_key=True)
+    model = Column(String(255), primary_key=True)
+    calls = Column(Integer, nullable=False)
+    p50_ms = Column(Float, nullable=False)
+    p95_ms = Column(Float, nullable=False)
+    max_ms = Column(Float, nullable=False)
+
+
+class GenerationBatchStage(enum.Enum):
+    content = "content"
+    questions = "questions"
+    done = "done"
+
+
+class GenerationBatches(Base):
+    __tablename__ = "generation_batches"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    batch_id = Column(String(255), nullable=False)
+    stage = Column(Enum(GenerationBatchStage), nullable=False, default=GenerationBatchStage.content)
+    status = Column(String(50), nullable=False, default="validating")
+    course_ids = Column(JSONB, nullable=False)
+    language = Column(String(255), nullable=False)
+    requests = Column(Integer, nullable=False, default=0)
+    input_token = Column(Integer, nullable=False, default=0)
+    output_token = Column(Integer, nullable=False, default=0)
+    spent_amount = Column(Float, nullable=False, default=0)
+    submitted_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    last_updated_at = Column(DateTime, onupdate=datetime.datetime.utcnow)
@@ -0,0 +1,39 @@
+import pytest
+
+from app_api.core.config import setting
+from app_api.gpt_server.assembly import PromptTemplate
+
+SYSTEM = 'Ответь в формате JSON: {"response": "..."}'
+
+
+@pytest.fixture(params=[False, True], ids=["formatted", "prefix_stable"])
+def prefix_stable(request, monkeypatch):
+    monkeypatch.setattr(setting, "LLM_PREFIX_STABLE_PROMPTS", request.param)
+    return request.param
+
+
+def test_system_prompt_is_sent_verbatim(prefix_stable):
+    messages = PromptTemplate(system=SYSTEM, user="Тема: {title}").messages(variables={"title": "Python"})
+
+    assert messages[0] == {"role": "system", "content": SYSTEM}
+    values = "\n".join(message["content"] for message in messages[1:])
+    assert "Python" in values
+
+
+def test_format_system_substitutes_variables(prefix_stable):
+    template = PromptTemplate(system="Язык ответа: {language}", user="{title}", format_system=True)
+
+    messages = template.messages(variables={"language": "ru", "title": "Python"})
+
+    text = "\n".join(message["content"] for message in messages)
+    assert "ru" in text and "Python" in text
+    assert "{language}" not in text
+
+
+def test_field_names_resolve_like_format(prefix_stable):
+    template = PromptTemplate(system=None, user="{course[title]} {count:>3}")
+
+    messages = template.messages(variables={"course": {"title": "Python"}, "count": 7})
+
+    text = "\n".join(message["content"] for message in messages)
+    assert "Python" in text and "  7" in text
@@ -0,0 +1,34 @@
+import json
+from unittest.mock import MagicMock
+
+import app_api.main  # noqa: F401
+from app_api.api.endpoints.courses.crud import invalidate_module_content, invalidate_question
+from app_api.models.education import ContentType, ModuleContents, Questions
+
+
+def published_keys(redis: MagicMock) -> list[str]:
+    return [json.loads(call.args[1])["key"] for call in redis.publish.call_args_list]
+
+
+def test_module_content_invalidation_uses_bot_key():
+    redis = MagicMock()
+
+    invalidate_module_content(
+        redis=redis,
+        content=ModuleContents(sub_module_id=7, order_number=2, content_type=ContentType.text)
+    )
+
+    redis.delete.assert_called_once_with(
+        f"module_content:order_number:2:sub_module_id:content_type:{ContentType.text}:7"
+    )
+    assert published_keys(redis) == ["module_content:sub_module_id:7:order_number:2:content_type:text"]
+
+
+def test_question_invalidation_uses_bot_key():
+    redis = MagicMock()
+
+    invalidate_question(redis=redis, question=Questions(sub_module_id=7, order_number=2))
+
+    deleted = [call.args[0] for call in redis.delete.call_args_list]
+    assert deleted == ["question:order_number:2:sub_module_id:7", "get_question:order_number:2:sub_module_id:7"]
+    assert published_keys(redis) == ["question:sub_module_id:7:order_number:2"]
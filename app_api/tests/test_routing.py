@@ -0,0 +1,53 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app_api.main  # noqa: F401
+from app_api.gpt_server.routing import LatencyTracker, ModelRouter, Route
+
+PRIMARY = SimpleNamespace(release="primary")
+HEDGE = SimpleNamespace(release="hedge")
+ROUTE = Route(chain=[PRIMARY], attempts=1, hedge_model=HEDGE, hedge_after=0.05)
+
+
+def test_hedge_wins_without_waiting_for_primary():
+    primary_release = threading.Event()
+    discarded = []
+
+    def request(model, cancel: threading.Event):
+        if model is PRIMARY:
+            # Запрос без потоковой передачи не видит событие отмены до конца ответа
+            primary_release.wait(5)
+            return "primary answer"
+        return "hedge answer"
+
+    started = time.perf_counter()
+    response, model = ModelRouter(tracker=LatencyTracker()).hedged(
+        prompt_name="test",
+        route=ROUTE,
+        request=request,
+        on_discarded=lambda model, response: discarded.append((model, response))
+    )
+
+    assert (response, model) == ("hedge answer", HEDGE)
+    assert time.perf_counter() - started < 1
+    primary_release.set()
+    for _ in range(100):
+        if discarded:
+            break
+        time.sleep(0.01)
+    assert discarded == [(PRIMARY, "primary answer")]
+
+
+def test_primary_error_is_raised_when_both_fail():
+    def request(model, cancel: threading.Event):
+        if model is PRIMARY:
+            time.sleep(0.1)
+        raise ValueError(model.release)
+
+    with pytest.raises(ValueError, match="primary"):
+        ModelRouter(tracker=LatencyTracker()).hedged(
+            prompt_name="test", route=ROUTE, request=request, on_discarded=lambda model, response: None
+        )
@@ -0,0 +1,73 @@
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+import app_api.main  # noqa: F401
+from app_api.core.config import setting
+from app_api.gpt_server.openai_api import LLM
+from app_api.gpt_server.streaming import IncrementalJSONParser, JSONStreamError
+
+
+class Answer(BaseModel):
+    response: str
+    score: int
+
+
+def parse(*chunks: str, **kwargs):
+    parser = IncrementalJSONParser(**kwargs)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+def test_surrounding_text_is_skipped():
+    chunks = ('Ответ:\n```json\n{"response": "да", ', '"score": 3}\n```\nНадеюсь, это поможет.')
+
+    assert parse(*chunks, skip_surrounding_text=True) == {"response": "да", "score": 3}
+    with pytest.raises(JSONStreamError):
+        parse(*chunks)
+
+
+def test_text_keeps_failing_chunk():
+    parser = IncrementalJSONParser()
+    parser.feed('{"response": "да"')
+
+    with pytest.raises(JSONStreamError):
+        parser.feed(' "score"')
+    assert parser.text == '{"response": "да" "score"'
+
+
+def stub_client(*deltas: str):
+    chunks = [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))], usage=None)
+        for delta in deltas
+    ]
+    create = lambda **kwargs: contextlib.nullcontext(iter(chunks))
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def generate(client):
+    model = SimpleNamespace(release="stub", input_price=0.0, output_price=0.0)
+    return LLM()._text_generator(
+        client=client, model=model, messages=[], max_tokens=100, temperature=0, base_model=Answer
+    )
+
+
+@pytest.fixture
+def stream_validation(monkeypatch):
+    monkeypatch.setattr(setting, "LLM_STREAM_VALIDATION", True)
+    monkeypatch.setattr(setting, "LLM_STRICT_SCHEMA", False)
+
+
+def test_stream_returns_fenced_answer(stream_validation):
+    response = generate(stub_client('```json\n{"response": "да",', ' "score": 3}\n```', "\nГотово."))
+
+    assert response.content == {"response": "да", "score": 3}
+
+
+def test_stream_error_is_repaired_locally(stream_validation):
+    response = generate(stub_client('{"response": "да", "score": 3,', ' "note": "a" "b"}'))
+
+    assert response.content == {"response": "да", "score": 3}
@@ -0,0 +1,32 @@
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app_api.core.tracing import TRACEPARENT_HEADER, current_span, tracer
+from app_api.main import TracingMiddleware
+
+
+def test_span_covers_streamed_body(monkeypatch):
+    events = []
+    monkeypatch.setattr(tracer, "end", lambda span: events.append(("end", span)))
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/stream/{item_id}")
+    def stream(item_id: int):
+        def body():
+            for part in ("a", "b"):
+                events.append(("chunk", current_span()))
+                yield part
+
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    response = TestClient(app).get("/stream/1")
+
+    assert response.text == "ab"
+    assert [event for event, _ in events] == ["chunk", "chunk", "end"]
+    span = events[-1][1]
+    assert events[0][1] is span
+    assert span.name == "GET /stream/{item_id}"
+    assert span.attributes["http.status_code"] == 200
+    assert response.headers[TRACEPARENT_HEADER] == span.traceparent
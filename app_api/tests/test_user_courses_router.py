@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app_api.main import app
+from app_api.db.session import get_db
+from app_api.db.redis_connection import get_redis
+from app_api.api.endpoints.user_courses import router
+
+ANSWER = {"question": "Что такое <b>класс</b>?", "answer": "Объект", "language": "ru"}
+
+
+class StubLLM:
+    """
+    LLM, который возвращает заранее заданный ответ без запроса к модели.
+    """
+    response = "<p>Класс</p> - это <b>шаблон объекта"
+
+    def generate_answer(self, **kwargs):
+        return self.__reply(response=self.response, score=3)
+
+    def generate_correct(self, **kwargs):
+        return self.__reply(response=self.response)
+
+    @staticmethod
+    def __reply(**content):
+        return SimpleNamespace(content=content, input_tokens=1, output_tokens=1, spent_amount=0)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(router, "LLM", StubLLM)
+    monkeypatch.setattr(router, "get_prompt", lambda **kwargs: SimpleNamespace(system="", user="", gpt_model_id=1))
+    monkeypatch.setattr(router, "get_model_by_id", lambda **kwargs: SimpleNamespace())
+    monkeypatch.setattr(router, "add_user_course_usage", lambda **kwargs: None)
+    app.dependency_overrides[get_db] = lambda: MagicMock()
+    app.dependency_overrides[get_redis] = lambda: MagicMock()
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_help_returns_telegram_html(client):
+    response = client.post("/users/courses/1/answers/help", json={**ANSWER, "feedback": "Шаблон"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "response": StubLLM.response,
+        "telegram_html": "Класс - это <b>шаблон объекта</b>",
+    }
+
+
+def test_check_returns_model_response(client):
+    response = client.post("/users/courses/1/answers/check", json=ANSWER)
+
+    assert response.status_code == 200
+    assert response.json() == {"response": StubLLM.response, "score": 3}
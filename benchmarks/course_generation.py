@@ -0,0 +1,191 @@
+"""
+Бенчмарк генерации курса без обращения к OpenAI: пропускная способность и время до первого урока.
+
+Поднимает заглушки OpenAI и SeaweedFS (benchmarks.fake_services), записывает в базу промпты с метками
+заглушки и для каждого объема плана (very_short/short/medium) создает курсы через API в процессе:
+POST /courses (план), POST /users/{telegram_id}/courses, POST /courses/{id}/material/{language}.
+
+Выводит:
+- courses/hour - количество сгенерированных материалов курсов в час при заданной параллельности;
+- time-to-first-lesson p50/p95 - время от запроса материала до сохранения первого подмодуля;
+- material p50/p95 - полное время генерации материала;
+- количество SQL запросов, команд Redis и запросов к LLM на один курс.
+
+Запуск из корня репозитория (Postgres и Redis - см. benchmarks/environment.py):
+    docker compose -f benchmarks/docker-compose-benchmark.yml up -d
+    python -m benchmarks.course_generation --courses 5 --concurrency 2 --latency-ms 800 --image-latency-ms 3000
+"""
+import argparse
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.environment import configure, seed
+from benchmarks.fake_services import LatencyModel, PLAN_SIZES
+from benchmarks.report import percentile, print_table
+
+
+class OperationCounter:
+    """
+    Считает SQL запросы по типу через события SQLAlchemy и команды Redis по INFO commandstats.
+    """
+
+    def __init__(self, engine, redis):
+        from sqlalchemy import event
+        from app_api.db.instrumentation import query_operation
+
+        self.redis = redis
+        self.sql = Counter()
+        self.__lock = threading.Lock()
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            with self.__lock:
+                self.sql[query_operation(statement)] += 1
+
+        event.listen(engine, "before_cursor_execute", count)
+
+    def redis_commands(self) -> Counter:
+        stats = self.redis.info("commandstats")
+        return Counter({name.removeprefix("cmdstat_"): value["calls"] for name, value in stats.items()})
+
+    def snapshot(self) -> tuple[Counter, Counter]:
+        with self.__lock:
+            sql = Counter(self.sql)
+        return sql, self.redis_commands()
+
+
+class SubModuleTimer:
+    """
+    Запоминает время сохранения каждого подмодуля курса, оборачивая update_content_data_and_questions.
+    """
+
+    def __init__(self):
+        from app_api.api.endpoints.courses import crud
+
+        self.finished: dict[str, list[tuple[int, float]]] = {}
+        self.__lock = threading.Lock()
+        original = crud.update_content_data_and_questions
+
+        def timed(*args, **kwargs):
+            result = original(*args, **kwargs)
+            with self.__lock:
+                self.finished.setdefault(kwargs["course_title"], []).append(
+                    (kwargs["sub_module"].id, time.perf_counter())
+                )
+            return result
+
+        crud.update_content_data_and_questions = timed
+
+    def first_lesson_at(self, course_title: str) -> float | None:
+        with self.__lock:
+            finished = self.finished.get(course_title)
+        return min(finished)[1] if finished else None
+
+
+def per_course_counts(counts: Counter, courses: int) -> dict[str, float]:
+    return {key: round(value / courses, 1) for key, value in counts.items()}
+
+
+def generate_course(client, timer: SubModuleTimer, volume: str, telegram_id: int, language: str) -> dict:
+    title = f"bench volume={volume} {uuid.uuid4().hex[:8]}"
+    client.post(f"/users/{telegram_id}", json={"chat_id": telegram_id, "username": "bench"})
+    started = time.perf_counter()
+    response = client.post("/courses", json={"title": title, "language": language})
+    response.raise_for_status()
+    course_id = response.json()["course_id"]
+    plan_time = time.perf_counter() - started
+    response = client.post(
+        f"/users/{telegram_id}/courses", json={"course_id": course_id, "current_stage": "not_generated"}
+    )
+    response.raise_for_status()
+    started = time.perf_counter()
+    response = client.post(f"/courses/{course_id}/material/{language}")
+    finished = time.perf_counter()
+    first_lesson = timer.first_lesson_at(title)
+    return {
+        "ok": response.status_code == 200,
+        "plan": plan_time,
+        "material": finished - started,
+        "first_lesson": (first_lesson - started) if first_lesson else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volumes", default="very_short,short,medium", help="Объемы плана через запятую")
+    parser.add_argument("--courses", type=int, default=5, help="Количество курсов для каждого объема")
+    parser.add_argument("--concurrency", type=int, default=2, help="Количество одновременно генерируемых курсов")
+    parser.add_argument("--language", default="Русский")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Медиана задержки ответа LLM")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Разброс задержки (sigma логнормального)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов LLM с ошибкой 500")
+    parser.add_argument("--image-latency-ms", type=float, default=3000, help="Медиана задержки генерации картинки")
+    args = parser.parse_args()
+
+    services = configure(LatencyModel(
+        median_ms=args.latency_ms,
+        sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        image_median_ms=args.image_latency_ms
+    ))
+    seed()
+    from fastapi.testclient import TestClient
+    from app_api.main import app
+    from app_api.db.session import engine
+    from app_api.db.redis_connection import get_redis_connection
+
+    client = TestClient(app, raise_server_exceptions=False)
+    counter = OperationCounter(engine=engine, redis=get_redis_connection())
+    timer = SubModuleTimer()
+    telegram_ids = iter(range(int(time.time()) * 1000, int(time.time()) * 1000 + 10 ** 6))
+
+    rows = []
+    for volume in args.volumes.split(","):
+        modules, sub_modules, topics = PLAN_SIZES[volume]
+        sql_before, redis_before = counter.snapshot()
+        llm_before = Counter(services.openai_requests)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(
+                lambda _: generate_course(client, timer, volume, next(telegram_ids), args.language),
+                range(args.courses)
+            ))
+        wall = time.perf_counter() - started
+        sql_after, redis_after = counter.snapshot()
+        ok = [result for result in results if result["ok"]]
+        first_lessons = [result["first_lesson"] for result in ok if result["first_lesson"] is not None]
+        materials = [result["material"] for result in ok]
+        per_course = max(len(results), 1)
+        sql = sql_after - sql_before
+        redis_commands = redis_after - redis_before
+        llm = Counter(services.openai_requests) - llm_before
+        rows.append([
+            volume,
+            f"{modules}x{sub_modules}x{topics}",
+            f"{len(ok)}/{len(results)}",
+            len(ok) / wall * 3600,
+            percentile(first_lessons, 50),
+            percentile(first_lessons, 95),
+            percentile(materials, 50),
+            percentile(materials, 95),
+            sum(sql.values()) / per_course,
+            sum(redis_commands.values()) / per_course,
+            sum(llm.values()) / per_course,
+        ])
+        print(f"\n{volume}: SQL per course {per_course_counts(sql, per_course)}")
+        print(f"{volume}: Redis per course {per_course_counts(Counter(dict(redis_commands.most_common(8))), per_course)}")
+        print(f"{volume}: LLM per course {per_course_counts(llm, per_course)}")
+
+    print()
+    print_table(
+        headers=["volume", "plan", "ok", "courses/h", "ttfl p50 s", "ttfl p95 s", "material p50 s",
+                 "material p95 s", "sql/course", "redis/course", "llm/course"],
+        rows=rows
+    )
+    services.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""
+Локальные заглушки внешних сервисов для бенчмарков: OpenAI-совместимый API и SeaweedFS.
+
+Заглушка OpenAI определяет, какой ответ вернуть, по метке [bench:<имя промпта>] в тексте сообщений.
+Метки проставляются в промпты, которые бенчмарк записывает в базу (см. benchmarks.environment), поэтому
+каждый ответ проходит валидацию соответствующей моделью из app_api/gpt_server/validation.py.
+Задержка ответа берется из логнормального распределения, часть запросов завершается ошибкой.
+
+Запуск отдельно (например, для API в контейнере):
+    python -m benchmarks.fake_services --openai-port 18080 --seaweedfs-port 18081 --latency-ms 800
+"""
+import argparse
+import base64
+import json
+import math
+import random
+import re
+import secrets
+import struct
+import threading
+import time
+import zlib
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MARKER_PATTERN = re.compile(r"\[bench:([a-z_]+)\]")
+VOLUME_PATTERN = re.compile(r"volume=(very_short|short|medium)")
+# Количество вопросов: подставлено в шаблон или передано в данных запроса при LLM_PREFIX_STABLE_PROMPTS
+QUESTIONS_COUNT_PATTERN = re.compile(r"(?:\[bench:generate_sub_module_questions\] |\[count\]: )(\d+)")
+# Количество символов ответа в одной части потокового ответа
+STREAM_CHUNK_SIZE = 16
+
+# Размер плана для каждого объема курса: модули, подмодули в модуле, темы в подмодуле
+PLAN_SIZES = {
+    "very_short": (2, 2, 2),
+    "short": (3, 3, 3),
+    "medium": (5, 3, 4),
+}
+
+
+def make_png(width: int = 256, height: int = 256) -> bytes:
+    """
+    Создает PNG изображение с градиентом без сторонних библиотек.
+
+    Args:
+        width (int): Ширина изображения
+        height (int): Высота изображения
+
+    Returns:
+        bytes: Содержимое PNG файла.
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    rows = b"".join(
+        b"\x00" + bytes(value for x in range(width) for value in (x % 256, y % 256, (x + y) % 256))
+        for y in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+def lesson(title: str, sections: int = 4) -> dict:
+    paragraph = " ".join(["<b>Важно:</b> пример текста урока с <code>кодом</code> и пояснениями."] * 12)
+    return {
+        "response": {
+            "title": title,
+            "introduction": paragraph,
+            "sections": [{"title": f"Раздел {number}", "content": paragraph} for number in range(1, sections + 1)],
+            "conclusion": paragraph,
+        }
+    }
+
+
+def plan(volume: str) -> dict:
+    modules, sub_modules, topics = PLAN_SIZES[volume]
+    return {
+        "plan": {
+            f"Модуль {module}": [
+                {f"Подмодуль {module}.{sub_module}": [
+                    f"Тема {module}.{sub_module}.{topic}" for topic in range(1, topics + 1)
+                ]}
+                for sub_module in range(1, sub_modules + 1)
+            ]
+            for module in range(1, modules + 1)
+        }
+    }
+
+
+def canned_response(prompt_name: str, text: str) -> dict:
+    """
+    Возвращает ответ, который проходит валидацию моделью, соответствующей промпту.
+
+    Args:
+        prompt_name (str): Имя промпта из метки
+        text (str): Текст всех сообщений запроса
+
+    Returns:
+        dict: JSON ответа модели.
+    """
+    if prompt_name == "generate_course_plan":
+        match = VOLUME_PATTERN.search(text)
+        return plan(match.group(1) if match else "short")
+    if prompt_name == "allow_topic":
+        return {"allow": True, "description": "Тема подходит для обучения"}
+    if prompt_name == "generate_module_content":
+        return lesson(title="Урок")
+    if prompt_name == "generate_prompt":
+        return {"prompt": "A minimalistic illustration of the lesson topic"}
+    if prompt_name == "generate_multiple_choice_question":
+        return {
+            "question": "Какой вариант верный?",
+            "answers": [{"option": f"Вариант {number}", "is_correct": number == 1} for number in range(1, 5)],
+        }
+    if prompt_name == "generate_open_question":
+        return {"question": "Объясните своими словами основную идею урока."}
+    if prompt_name == "generate_sub_module_questions":
+        match = QUESTIONS_COUNT_PATTERN.search(text)
+        count = int(match.group(1)) if match else 1
+        return {
+            "multiple_choice": [canned_response("generate_multiple_choice_question", text) for _ in range(count)],
+            "open_question": canned_response("generate_open_question", text),
+        }
+    if prompt_name == "generate_answer":
+        return {"response": "Ответ в целом верный, но можно добавить пример.", "score": random.randint(5, 10)}
+    if prompt_name == "corrector":
+        return {"response": "Обратите внимание на определение из второго раздела."}
+    if prompt_name == "generate_content_answers":
+        return {"response": "Это объясняется во втором разделе урока.", "is_validate": True}
+    if prompt_name == "generate_questions_for_survey":
+        return {"questions": ["Какой у вас опыт?", "Для чего вам эта тема?", "Сколько времени готовы уделять?"]}
+    if prompt_name == "summarize_answers":
+        return {"summary": "Начинающий, учится для работы", "is_validate": True}
+    return {}
+
+
+class LatencyModel:
+    """
+    Параметры задержки и ошибок заглушки.
+    """
+
+    def __init__(
+            self,
+            median_ms: float,
+            sigma: float,
+            error_rate: float,
+            image_median_ms: float,
+            token_ms: float = 0
+    ):
+        """
+        Args:
+            median_ms (float): Медиана задержки текстового ответа в миллисекундах (до первой части при потоковом
+             ответе)
+            sigma (float): Параметр sigma логнормального распределения (разброс)
+            error_rate (float): Доля запросов, завершающихся ошибкой 500
+            image_median_ms (float): Медиана задержки генерации изображения в миллисекундах
+            token_ms (float): Медиана паузы между частями потокового ответа в миллисекундах
+        """
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.image_median_ms = image_median_ms
+        self.token_ms = token_ms
+
+    def sleep(self, median_ms: float):
+        if median_ms > 0:
+            time.sleep(median_ms * math.exp(random.gauss(0, self.sigma)) / 1000)
+
+    def failed(self) -> bool:
+        return random.random() < self.error_rate
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency: LatencyModel
+    image: bytes
+    requests_count: dict[str, int]
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/files/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(self.image)))
+            self.end_headers()
+            self.wfile.write(self.image)
+            return
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            self._chat_completion(body)
+        elif self.path.endswith("/images/generations"):
+            self._image_generation(body)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _count(self, name: str):
+        with self.lock:
+            self.requests_count[name] = self.requests_count.get(name, 0) + 1
+
+    def _chat_completion(self, body: dict):
+        text = "\n".join(str(message.get("content")) for message in body.get("messages", []))
+        match = MARKER_PATTERN.search(text)
+        prompt_name = match.group(1) if match else "unknown"
+        self._count(prompt_name)
+        self.latency.sleep(self.latency.median_ms)
+        if self.latency.failed():
+            self._send_json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+            return
+        content = json.dumps(canned_response(prompt_name=prompt_name, text=text), ensure_ascii=False)
+        prompt_tokens = len(text) // 4
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if body.get("stream"):
+            self._stream_completion(body, content, usage)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-{secrets.token_hex(8)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "bench"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _stream_completion(self, body: dict, content: str, usage: dict):
+        """
+        Отдает ответ частями по STREAM_CHUNK_SIZE символов в формате потокового API (SSE).
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        base = {
+            "id": f"chatcmpl-{secrets.token_hex(8)}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "bench"),
+        }
+        pieces = [content[start:start + STREAM_CHUNK_SIZE] for start in range(0, len(content), STREAM_CHUNK_SIZE)]
+        try:
+            for index, piece in enumerate(pieces):
+                choice = {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+                if index == len(pieces) - 1:
+                    choice["finish_reason"] = "stop"
+                self._send_event({**base, "choices": [choice]})
+                self.latency.sleep(self.latency.token_ms)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._send_event({**base, "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент прервал генерацию, например, при расхождении ответа со схемой
+            pass
+
+    def _send_event(self, payload: dict):
+        self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode())
+        self.wfile.flush()
+
+    def _image_generation(self, body: dict):
+        self._count("generate_image")
+        self.latency.sleep(self.latency.image_median_ms)
+        if self.latency.failed():
+            self._send_json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+            return
+        if body.get("response_format") == "b64_json":
+            image = {"b64_json": base64.b64encode(self.image).decode()}
+        else:
+            image = {"url": f"http://{self.headers.get('Host')}/files/{secrets.token_hex(8)}.png"}
+        self._send_json(200, {
+            "created": int(time.time()),
+            "data": [{**image, "revised_prompt": body.get("prompt")}],
+        })
+
+
+class FakeSeaweedFSHandler(BaseHTTPRequestHandler):
+    files: dict[str, bytes]
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/dir/assign"):
+            fid = f"1,{secrets.token_hex(6)}"
+            host = self.headers.get("Host")
+            self._send(200, json.dumps({"fid": fid, "url": host, "publicUrl": host, "count": 1}).encode())
+            return
+        with self.lock:
+            content = self.files.get(self.path.lstrip("/"))
+        if content is None:
+            self._send(404, b"{}")
+        else:
+            self._send(200, content, content_type="application/octet-stream")
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                self.rfile.readline()
+                return b"".join(body)
+            body.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_POST(self):
+        content = self._read_body()
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/"):
+            message = BytesParser(policy=default_policy).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + content
+            )
+            parts = list(message.iter_parts())
+            content = parts[0].get_payload(decode=True) if parts else b""
+        with self.lock:
+            self.files[self.path.lstrip("/")] = content
+        self._send(201, json.dumps({"name": "uploaded_file", "size": len(content)}).encode())
+
+    def do_DELETE(self):
+        with self.lock:
+            self.files.pop(self.path.lstrip("/"), None)
+        self._send(202, b"{}")
+
+
+class FakeServices:
+    """
+    Запускает заглушки OpenAI и SeaweedFS в фоновых потоках.
+    """
+
+    def __init__(
+            self,
+            openai_port: int = 0,
+            seaweedfs_port: int = 0,
+            latency: LatencyModel | None = None,
+            host: str = "127.0.0.1"
+    ):
+        """
+        Args:
+            openai_port (int): Порт заглушки OpenAI (0 - свободный порт)
+            seaweedfs_port (int): Порт заглушки SeaweedFS (0 - свободный порт)
+            latency (LatencyModel | None): Параметры задержки и ошибок
+            host (str): Адрес, на котором слушают заглушки
+        """
+        latency = latency or LatencyModel(median_ms=0, sigma=0, error_rate=0, image_median_ms=0)
+        self.openai_requests: dict[str, int] = {}
+        self.stored_files: dict[str, bytes] = {}
+        openai_handler = type("OpenAIHandler", (FakeOpenAIHandler,), {
+            "latency": latency, "image": make_png(), "requests_count": self.openai_requests
+        })
+        seaweedfs_handler = type("SeaweedFSHandler", (FakeSeaweedFSHandler,), {"files": self.stored_files})
+        self.openai = ThreadingHTTPServer((host, openai_port), openai_handler)
+        self.seaweedfs = ThreadingHTTPServer((host, seaweedfs_port), seaweedfs_handler)
+        self.openai.daemon_threads = True
+        self.seaweedfs.daemon_threads = True
+
+    @property
+    def openai_url(self) -> str:
+        return f"http://{self.openai.server_address[0]}:{self.openai.server_address[1]}/v1"
+
+    @property
+    def seaweedfs_url(self) -> str:
+        return f"http://{self.seaweedfs.server_address[0]}:{self.seaweedfs.server_address[1]}"
+
+    def start(self) -> "FakeServices":
+        for server in (self.openai, self.seaweedfs):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in (self.openai, self.seaweedfs):
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--openai-port", type=int, default=18080)
+    parser.add_argument("--seaweedfs-port", type=int, default=18081)
+    parser.add_argument("--latency-ms", type=float, default=800, help="Медиана задержки ответа LLM")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Разброс задержки (sigma логнормального)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой 500")
+    parser.add_argument("--image-latency-ms", type=float, default=3000, help="Медиана задержки генерации картинки")
+    parser.add_argument("--token-latency-ms", type=float, default=20, help="Пауза между частями потокового ответа")
+    args = parser.parse_args()
+    latency = LatencyModel(
+        median_ms=args.latency_ms,
+        sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        image_median_ms=args.image_latency_ms,
+        token_ms=args.token_latency_ms
+    )
+    services = FakeServices(
+        openai_port=args.openai_port, seaweedfs_port=args.seaweedfs_port, latency=latency, host=args.host
+    ).start()
+    print(f"OPENAI_BASE_URL={services.openai_url}")
+    print(f"SEAWEEDFS_MASTER_URL={services.seaweedfs_url} SEAWEEDFS_VOLUME_URL={services.seaweedfs_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Микро-бенчмарк подготовки урока к отправке в Telegram.
+
+Сравнивает три варианта:
+- old: очистка каждого блока через BeautifulSoup при каждом показе урока (как было в боте);
+- streaming: очистка потоковым html.parser-очистителем при каждом показе (рендеринг старых уроков при чтении в API);
+- precomputed: чтение готовых сообщений, подготовленных при генерации (content_data["telegram_html"]).
+
+Запуск из корня репозитория:
+    python -m benchmarks.html_rendering
+    python -m benchmarks.html_rendering --lessons export.json --number 200
+
+Файл --lessons содержит JSON список content_data текстовых уроков, например выгрузку из module_contents.
+"""
+import argparse
+import json
+import os
+import timeit
+
+from bs4 import BeautifulSoup, NavigableString
+
+from app_api.api.telegram_html import render_lesson_messages, pack_html_blocks
+
+DEFAULT_LESSONS = os.path.join(os.path.dirname(__file__), "data", "lessons.json")
+
+
+def bs4_clean_and_escape_html(html):
+    allowed_tags = ["code", "b", "i", "u", "s", "pre"]
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup.find_all(True):
+        if tag.name not in allowed_tags:
+            tag.unwrap()
+    for content in soup.descendants:
+        if isinstance(content, NavigableString):
+            content.replace_with(content.replace("<", "&lt;").replace(">", "&gt;"))
+    return str(soup)
+
+
+def bs4_render_lesson(content_data: dict) -> list[str]:
+    blocks = [bs4_clean_and_escape_html(content_data.get("title", ""))]
+    blocks.append(bs4_clean_and_escape_html(content_data.get("introduction", "")))
+    for section in content_data.get("sections", []):
+        body = ""
+        if section.get("title"):
+            body += f"{bs4_clean_and_escape_html(section['title'])}\n\n"
+        if section.get("content"):
+            body += f"{bs4_clean_and_escape_html(section['content'])}\n"
+        blocks.append(body)
+    blocks.append(bs4_clean_and_escape_html(content_data.get("conclusion", "")))
+    return pack_html_blocks(blocks=[block.strip() for block in blocks if block.strip()])
+
+
+def streaming_render_lesson(content_data: dict) -> list[str]:
+    return render_lesson_messages(content_data=content_data)["titled_messages"]
+
+
+def precomputed_render_lesson(stored: str) -> list[str]:
+    # Бот получает урок из API в виде JSON, поэтому в замер входит разбор уже подготовленного content_data
+    return json.loads(stored)["telegram_html"]["titled_messages"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lessons", default=DEFAULT_LESSONS, help="JSON список content_data уроков")
+    parser.add_argument("--number", type=int, default=100, help="Количество показов каждого урока")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество повторов замера")
+    args = parser.parse_args()
+
+    with open(args.lessons, encoding="utf-8") as file:
+        lessons = json.load(file)
+    stored = [
+        json.dumps({**lesson, "telegram_html": render_lesson_messages(content_data=lesson)}, ensure_ascii=False)
+        for lesson in lessons
+    ]
+    payload_size = sum(len(json.dumps(lesson, ensure_ascii=False)) for lesson in lessons)
+    print(f"lessons: {len(lessons)}, payload: {payload_size} chars, renders per lesson: {args.number}")
+
+    variants = {
+        "old (BeautifulSoup)": lambda: [bs4_render_lesson(lesson) for lesson in lessons],
+        "streaming (html.parser)": lambda: [streaming_render_lesson(lesson) for lesson in lessons],
+        "precomputed": lambda: [precomputed_render_lesson(lesson) for lesson in stored],
+    }
+    baseline = None
+    for name, variant in variants.items():
+        best = min(timeit.repeat(variant, number=args.number, repeat=args.repeat))
+        per_render = best / args.number / len(lessons) * 1000
+        baseline = baseline or per_render
+        print(f"{name:<25} {per_render:8.3f} ms/render  x{baseline / per_render:.1f}")
+
+
+if __name__ == "__main__":
+    main()
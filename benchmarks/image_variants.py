@@ -0,0 +1,109 @@
+"""
+Бенчмарк вариантов изображений уроков: сколько байт приходится на урок и сколько занимает отправка изображения
+ботом до и после перекодирования (app_api/db/image_variants.py).
+
+Сравнивает:
+- original: исходный PNG генерации изображения, как хранился раньше;
+- display: вариант, который бот отправляет теперь (content_data["fid"]).
+
+Для каждого изображения замеряется перекодирование, затем оба файла загружаются в заглушку SeaweedFS и
+скачиваются так же, как это делает бот (get_image). Отправка в Telegram моделируется временем передачи файла
+по каналу --uplink-mbps с задержкой --rtt-ms, так как Bot API в бенчмарке недоступен: send = скачивание +
+rtt + размер / пропускная способность.
+
+Без --images используются синтетические изображения 1024x1024 с шумом, по размеру PNG близкие к ответам
+генерации изображений (около 1 МБ). Реальные изображения дают более точную оценку.
+
+Запуск из корня репозитория:
+    python -m benchmarks.image_variants
+    python -m benchmarks.image_variants --images lesson1.png lesson2.png --uplink-mbps 20
+"""
+import argparse
+import random
+import time
+from io import BytesIO
+
+import requests
+from PIL import Image, ImageFilter
+
+from benchmarks.environment import configure
+from benchmarks.fake_services import LatencyModel
+from benchmarks.report import percentile, print_table
+
+
+def synthetic_png(seed: int, side: int = 1024) -> bytes:
+    """
+    Создает PNG с градиентами и шумом, который сжимается примерно как изображение генерации.
+    """
+    rng = random.Random(seed)
+    red = Image.linear_gradient("L").resize((side, side)).rotate(rng.randint(0, 359))
+    green = Image.radial_gradient("L").resize((side, side))
+    blue = Image.effect_noise((side, side), rng.randint(30, 60)).filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    Image.merge("RGB", (red, green, blue)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def send_ms(url: str, size: int, uplink_mbps: float, rtt_ms: float) -> float:
+    started = time.perf_counter()
+    response = requests.get(url)
+    response.raise_for_status()
+    fetch_ms = (time.perf_counter() - started) * 1000
+    return fetch_ms + rtt_ms + size * 8 / (uplink_mbps * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", nargs="*", default=[], help="PNG файлы изображений уроков")
+    parser.add_argument("--count", type=int, default=10, help="Количество синтетических изображений без --images")
+    parser.add_argument("--sends", type=int, default=5, help="Количество отправок каждого изображения")
+    parser.add_argument("--uplink-mbps", type=float, default=20, help="Пропускная способность канала до Telegram")
+    parser.add_argument("--rtt-ms", type=float, default=60, help="Задержка запроса к Bot API")
+    args = parser.parse_args()
+
+    services = configure(LatencyModel(median_ms=0, sigma=0, error_rate=0, image_median_ms=0))
+    from app_api.core.config import setting
+    from app_api.db.image_variants import transcode_image
+    from app_api.db.storage import upload_file
+
+    if args.images:
+        originals = []
+        for path in args.images:
+            with open(path, "rb") as file:
+                originals.append(file.read())
+    else:
+        originals = [synthetic_png(seed=seed) for seed in range(args.count)]
+    print(f"images: {len(originals)}, display: {setting.IMAGE_DISPLAY_FORMAT} q{setting.IMAGE_DISPLAY_QUALITY} "
+          f"<= {setting.IMAGE_DISPLAY_MAX_SIDE}px, thumbnail: {setting.IMAGE_THUMBNAIL_FORMAT} "
+          f"{setting.IMAGE_THUMBNAIL_SIDE}px, uplink: {args.uplink_mbps} Mbit/s, rtt: {args.rtt_ms} ms")
+
+    transcode = []
+    sizes = {"original": [], "display": [], "thumbnail": []}
+    sends = {"original": [], "display": []}
+    for original in originals:
+        started = time.perf_counter()
+        variants = {variant.name: variant for variant in transcode_image(content=original, keep_original=True)}
+        transcode.append((time.perf_counter() - started) * 1000)
+        for name in sizes:
+            sizes[name].append(len(variants[name].content))
+        for name in sends:
+            fid = upload_file(variants[name].content)
+            size = len(variants[name].content)
+            sends[name] += [send_ms(url=f"{services.seaweedfs_url}/{fid}", size=size, uplink_mbps=args.uplink_mbps,
+                                    rtt_ms=args.rtt_ms) for _ in range(args.sends)]
+
+    baseline = sum(sizes["original"]) / len(originals)
+    rows = []
+    for name in sends:
+        per_lesson = sum(sizes[name]) / len(originals)
+        rows.append([name, per_lesson / 1024, baseline / per_lesson, percentile(sends[name], 50),
+                     percentile(sends[name], 95)])
+    print_table(headers=["sent variant", "KB/lesson", "x smaller", "send p50 ms", "send p95 ms"], rows=rows)
+    stored = sum(sum(values) for values in sizes.values()) / len(originals)
+    print(f"stored per lesson (original + display + thumbnail): {stored / 1024:.1f} KB, "
+          f"thumbnail: {sum(sizes['thumbnail']) / len(originals) / 1024:.1f} KB")
+    print(f"transcode p50 {percentile(transcode, 50):.1f} ms, p95 {percentile(transcode, 95):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Нагрузочный тест горячего пути обучения: N одновременных учеников проходят сгенерированные курсы.
+
+Каждый ученик повторяет действия бота: GET /users/courses/{id}/next-stage, PATCH /users/courses/{id},
+GET /courses/sub-modules/{id}/content (текст и изображение) или GET /courses/sub-modules/{id}/questions,
+проверка открытого ответа через POST /users/courses/{id}/answers/check (отвечает заглушка OpenAI) и
+сохранение ответа через POST /users/{telegram_id}/courses/answers/save. Пройдя курс, ученик начинает
+следующий из подготовленных.
+
+Выводит по каждому эндпоинту количество запросов, ошибки, запросы в секунду и p50/p95/p99, а также долю
+попаданий в кэш Redis по метрике cache_requests_total из /metrics API.
+
+По умолчанию API запускается отдельным процессом uvicorn на заглушках (benchmarks.environment), чтобы
+нагрузка генератора не делила процессор с API. Для оценки контейнера с ограничением CPU запустите API в нем
+(например, docker run --cpus 1.25) с переменными окружения заглушек и передайте --api-url; база данных
+контейнера должна совпадать с BENCH_DATABASE_URL, чтобы записать промпты заглушки.
+
+Запуск из корня репозитория:
+    docker compose -f benchmarks/docker-compose-benchmark.yml up -d
+    python -m benchmarks.learner_load --learners 50 --duration 60 --courses 3
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.environment import configure, seed
+from benchmarks.fake_services import LatencyModel
+from benchmarks.report import percentile, print_table
+
+CACHE_SAMPLE_PATTERN = re.compile(r'^cache_requests_total\{result="(hit|miss)"} ([0-9.e+]+)$', re.MULTILINE)
+
+
+class EndpointStats:
+    """
+    Собирает длительности запросов и ошибки по шаблону пути эндпоинта.
+    """
+
+    def __init__(self):
+        self.durations: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str,
+                      expected: tuple[int, ...] = (200,), **kwargs) -> httpx.Response | None:
+        """
+        Выполняет запрос и записывает его длительность под именем эндпоинта.
+
+        Args:
+            client (httpx.AsyncClient): HTTP клиент
+            name (str): Имя эндпоинта в отчете
+            method (str): HTTP метод
+            url (str): Путь запроса
+            expected (tuple[int, ...]): Коды ответа, которые не считаются ошибкой
+            **kwargs: Параметры httpx.AsyncClient.request
+
+        Returns:
+            httpx.Response | None: Ответ или None при сетевой ошибке.
+        """
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.durations[name].append(time.perf_counter() - started)
+        if response.status_code not in expected:
+            self.errors[name] += 1
+        return response
+
+
+async def cache_counters(client: httpx.AsyncClient) -> dict[str, float]:
+    """
+    Читает счетчики попаданий и промахов кэша из /metrics API.
+
+    Returns:
+        dict[str, float]: Значения cache_requests_total по меткам hit и miss.
+    """
+    response = await client.get("/metrics")
+    counters = {"hit": 0.0, "miss": 0.0}
+    for result, value in CACHE_SAMPLE_PATTERN.findall(response.text):
+        counters[result] = float(value)
+    return counters
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/metrics")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"API {client.base_url} is not ready after {timeout}s")
+
+
+async def prepare_courses(client: httpx.AsyncClient, count: int, volume: str, language: str) -> list[int]:
+    """
+    Генерирует курсы через API на заглушке OpenAI, по ним затем проходят ученики.
+
+    Returns:
+        list[int]: ID сгенерированных курсов.
+    """
+    telegram_id = random.randint(10 ** 9, 2 * 10 ** 9)
+    await client.post(f"/users/{telegram_id}", json={"chat_id": telegram_id, "username": "bench-author"})
+    course_ids = []
+    for _ in range(count):
+        response = await client.post(
+            "/courses", json={"title": f"bench volume={volume} {uuid.uuid4().hex[:8]}", "language": language}
+        )
+        response.raise_for_status()
+        course_id = response.json()["course_id"]
+        response = await client.post(
+            f"/users/{telegram_id}/courses", json={"course_id": course_id, "current_stage": "not_generated"}
+        )
+        response.raise_for_status()
+        response = await client.post(f"/courses/{course_id}/material/{language}", timeout=600)
+        response.raise_for_status()
+        course_ids.append(course_id)
+    return course_ids
+
+
+async def learner(client: httpx.AsyncClient, stats: EndpointStats, course_ids: list[int], telegram_id: int,
+                  language: str, think_time: float, deadline: float):
+    """
+    Проходит курсы до истечения времени теста так же, как это делает бот.
+
+    Args:
+        client (httpx.AsyncClient): HTTP клиент
+        stats (EndpointStats): Сборщик статистики
+        course_ids (list[int]): ID сгенерированных курсов
+        telegram_id (int): Telegram ID ученика
+        language (str): Язык ответов
+        think_time (float): Средняя пауза между действиями ученика, сек.
+        deadline (float): Момент окончания теста по time.monotonic()
+    """
+
+    async def think():
+        if think_time:
+            await asyncio.sleep(random.expovariate(1 / think_time))
+
+    await stats.request(client, "POST /users/{telegram_id}", "POST", f"/users/{telegram_id}",
+                        expected=(200, 409), json={"chat_id": telegram_id, "username": "bench-learner"})
+    while time.monotonic() < deadline:
+        response = await stats.request(
+            client, "POST /users/{telegram_id}/courses", "POST", f"/users/{telegram_id}/courses",
+            json={"course_id": random.choice(course_ids), "current_stage": "education"}
+        )
+        if response is None or response.status_code != 200:
+            return
+        user_course = response.json()
+        user_course_id = user_course["id"]
+        stage = "education"
+        position = {
+            "current_module_id": user_course["current_module_id"],
+            "current_sub_module_id": user_course["current_sub_module_id"],
+            "current_order_number": user_course["current_order_number"],
+        }
+        while time.monotonic() < deadline:
+            sub_module_id = position["current_sub_module_id"]
+            order_number = position["current_order_number"]
+            if stage == "education":
+                for content_type, expected in (("text", (200,)), ("image", (200, 404))):
+                    await stats.request(
+                        client, "GET /courses/sub-modules/{id}/content", "GET",
+                        f"/courses/sub-modules/{sub_module_id}/content", expected=expected,
+                        params={"content_type": content_type, "order_number": order_number}
+                    )
+            else:
+                response = await stats.request(
+                    client, "GET /courses/sub-modules/{id}/questions", "GET",
+                    f"/courses/sub-modules/{sub_module_id}/questions", params={"order_number": order_number}
+                )
+                if response is None or response.status_code != 200:
+                    break
+                question = response.json()
+                await think()
+                answer = {"question_id": question["id"], "answer": None, "score": None, "feedback": None}
+                if question["question_type"] == "open":
+                    answer["answer"] = "Основная идея урока в том, что данные нужно проверять."
+                    response = await stats.request(
+                        client, "POST /users/courses/{id}/answers/check", "POST",
+                        f"/users/courses/{user_course_id}/answers/check",
+                        json={"question": question["content"], "answer": answer["answer"], "language": language}
+                    )
+                    if response is not None and response.status_code == 200:
+                        answer["score"] = response.json().get("score")
+                        answer["feedback"] = response.json().get("response")
+                else:
+                    answer["answer"] = random.choice(question["options"] or ["-"])
+                    answer["score"] = random.choice((0, 10))
+                await stats.request(
+                    client, "POST /users/{telegram_id}/courses/answers/save", "POST",
+                    f"/users/{telegram_id}/courses/answers/save", json=answer
+                )
+            await think()
+            response = await stats.request(
+                client, "GET /users/courses/{id}/next-stage", "GET", f"/users/courses/{user_course_id}/next-stage"
+            )
+            if response is None or response.status_code != 200:
+                break
+            next_stage = response.json()
+            stage = next_stage["stage"]
+            patch = {"current_stage": stage, **(next_stage.get("data") or {})}
+            await stats.request(
+                client, "PATCH /users/courses/{id}", "PATCH", f"/users/courses/{user_course_id}", json=patch
+            )
+            if stage == "completed":
+                break
+            position = next_stage["data"]
+
+
+def start_api(port: int) -> subprocess.Popen:
+    """
+    Запускает API отдельным процессом uvicorn с текущими переменными окружения (заглушки из configure).
+    """
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app_api.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=dict(os.environ, PYTHONPATH=os.getcwd())
+    )
+
+
+async def run(args, api_url: str) -> tuple[EndpointStats, float, dict[str, float]]:
+    limits = httpx.Limits(max_connections=args.learners, max_keepalive_connections=args.learners)
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=120) as client:
+        await wait_ready(client)
+        course_ids = await prepare_courses(client, args.courses, args.volume, args.language)
+        stats = EndpointStats()
+        cache_before = await cache_counters(client)
+        first_id = int(time.time()) * 1000
+        started = time.monotonic()
+        deadline = started + args.duration
+        learners = []
+        for number in range(args.learners):
+            learners.append(asyncio.create_task(learner(
+                client, stats, course_ids, first_id + number, args.language, args.think_time, deadline
+            )))
+            if args.ramp_up:
+                await asyncio.sleep(args.ramp_up / args.learners)
+        await asyncio.gather(*learners)
+        wall = time.monotonic() - started
+        cache_after = await cache_counters(client)
+    return stats, wall, {key: cache_after[key] - cache_before[key] for key in cache_after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--learners", type=int, default=50, help="Количество одновременных учеников")
+    parser.add_argument("--duration", type=float, default=60, help="Длительность теста, сек.")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Время подключения всех учеников, сек.")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Средняя пауза ученика между действиями")
+    parser.add_argument("--courses", type=int, default=3, help="Количество курсов для прохождения")
+    parser.add_argument("--volume", default="very_short", help="Объем плана сгенерированных курсов")
+    parser.add_argument("--language", default="Русский")
+    parser.add_argument("--api-url", default=None, help="Адрес запущенного API, иначе API запускается локально")
+    parser.add_argument("--api-port", type=int, default=18000, help="Порт локально запускаемого API")
+    parser.add_argument("--openai-port", type=int, default=0, help="Порт заглушки OpenAI (0 - свободный порт)")
+    parser.add_argument("--seaweedfs-port", type=int, default=0, help="Порт заглушки SeaweedFS (0 - свободный порт)")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Медиана задержки ответа LLM")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Разброс задержки (sigma логнормального)")
+    parser.add_argument("--seed", type=int, default=0, help="Начальное значение генератора случайных чисел")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    services = configure(
+        LatencyModel(median_ms=args.latency_ms, sigma=args.latency_sigma, error_rate=0, image_median_ms=0),
+        openai_port=args.openai_port,
+        seaweedfs_port=args.seaweedfs_port,
+    )
+    seed()
+    api = None
+    api_url = args.api_url
+    if api_url is None:
+        api = start_api(args.api_port)
+        api_url = f"http://127.0.0.1:{args.api_port}"
+    try:
+        stats, wall, cache = asyncio.run(run(args, api_url))
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait()
+        services.stop()
+
+    rows = []
+    for name in sorted(stats.durations):
+        durations = [value * 1000 for value in stats.durations[name]]
+        rows.append([
+            name,
+            len(durations),
+            stats.errors[name],
+            len(durations) / wall,
+            percentile(durations, 50),
+            percentile(durations, 95),
+            percentile(durations, 99),
+        ])
+    total = sum(len(values) for values in stats.durations.values())
+    print()
+    print_table(headers=["endpoint", "requests", "errors", "rps", "p50 ms", "p95 ms", "p99 ms"], rows=rows)
+    lookups = cache["hit"] + cache["miss"]
+    print(f"\nlearners={args.learners} wall={wall:.1f}s total rps={total / wall:.1f}")
+    print(f"cache hit ratio={cache['hit'] / lookups:.3f} ({int(cache['hit'])}/{int(lookups)})" if lookups
+          else "cache hit ratio=n/a (no cache lookups)")
+
+
+if __name__ == "__main__":
+    main()
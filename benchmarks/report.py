@@ -0,0 +1,38 @@
+"""
+Общие функции подсчета и вывода результатов бенчмарков.
+"""
+import math
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Возвращает перцентиль по методу ближайшего ранга.
+
+    Args:
+        values (list[float]): Значения
+        q (float): Перцентиль от 0 до 100
+
+    Returns:
+        float: Значение перцентиля или nan для пустого списка.
+    """
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def print_table(headers: list[str], rows: list[list]):
+    """
+    Печатает таблицу с выравниванием по ширине колонок.
+
+    Args:
+        headers (list[str]): Заголовки колонок
+        rows (list[list]): Строки таблицы
+    """
+    cells = [headers] + [[f"{value:.1f}" if isinstance(value, float) else str(value) for value in row] for row in rows]
+    widths = [max(len(row[index]) for row in cells) for index in range(len(headers))]
+    for number, row in enumerate(cells):
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+        if number == 0:
+            print("  ".join("-" * width for width in widths))
@@ -0,0 +1,89 @@
+"""
+Построение временной шкалы по спанам, выгруженным API и ботом (TRACE_EXPORT_PATH).
+
+Печатает дерево спанов выбранной трассировки с длительностями и сохраняет трассировку в формате
+Chrome Trace Event, который открывается в chrome://tracing или https://ui.perfetto.dev как flamegraph.
+
+Запуск из корня репозитория:
+    python -m benchmarks.trace_timeline spans.jsonl
+    python -m benchmarks.trace_timeline spans.jsonl bot_spans.jsonl --trace <trace_id> --output trace.json
+
+Без --trace выбирается самая длинная трассировка.
+"""
+import argparse
+import json
+from collections import defaultdict
+
+
+def load_spans(paths: list[str]) -> list[dict]:
+    spans = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            spans.extend(json.loads(line) for line in file if line.strip())
+    return spans
+
+
+def trace_duration(spans: list[dict]) -> int:
+    return max(span["endTimeUnixNano"] for span in spans) - min(span["startTimeUnixNano"] for span in spans)
+
+
+def print_tree(spans: list[dict]):
+    children = defaultdict(list)
+    span_ids = {span["spanId"] for span in spans}
+    for span in spans:
+        parent = span.get("parentSpanId")
+        children[parent if parent in span_ids else None].append(span)
+    start = min(span["startTimeUnixNano"] for span in spans)
+
+    def walk(parent_id: str | None, depth: int):
+        for span in sorted(children[parent_id], key=lambda item: item["startTimeUnixNano"]):
+            offset = (span["startTimeUnixNano"] - start) / 1e6
+            duration = (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6
+            status = "" if span["status"]["code"] == "OK" else f"  [{span['status'].get('message', 'ERROR')}]"
+            print(f"{offset:10.1f} ms {duration:10.1f} ms  {'  ' * depth}{span['name']} ({span['service']}){status}")
+            walk(span["spanId"], depth + 1)
+
+    walk(None, 0)
+
+
+def to_chrome_trace(spans: list[dict]) -> dict:
+    events = []
+    for span in spans:
+        events.append({
+            "name": span["name"],
+            "cat": span["service"],
+            "ph": "X",
+            "ts": span["startTimeUnixNano"] / 1000,
+            "dur": (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1000,
+            "pid": span["service"],
+            "tid": span.get("thread", "main"),
+            "args": span.get("attributes", {}),
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Файлы со спанами в формате JSON Lines")
+    parser.add_argument("--trace", help="ID трассировки (traceId)")
+    parser.add_argument("--output", help="Файл для сохранения трассировки в формате Chrome Trace Event")
+    args = parser.parse_args()
+
+    traces = defaultdict(list)
+    for span in load_spans(args.paths):
+        traces[span["traceId"]].append(span)
+    if not traces:
+        print("no spans")
+        return
+    trace_id = args.trace or max(traces, key=lambda key: trace_duration(traces[key]))
+    spans = traces[trace_id]
+    print(f"trace {trace_id}: {len(spans)} spans, {trace_duration(spans) / 1e6:.1f} ms")
+    print_tree(spans)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(to_chrome_trace(spans), file, ensure_ascii=False)
+        print(f"saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
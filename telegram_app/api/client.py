@@ -18,6 +18,7 @@ from schemas.create_education_schemas import (
 )
 from schemas.education_schemas import (
     UserCoursesNextStageSchema,
+    UserCoursesAdvanceSchema,
     QuestionsSchema,
     QuestionAnswersSchema,
     ContentAnswerSchema,
@@ -27,7 +28,10 @@ from schemas.education_schemas import (
 from schemas.user_schemas import UsersSchema, TranslationSchema, UserBalance
 from core.config import setting
 from api.redis_connection import RedisClient
-from typing import Literal
+from api.image_cache import ImageCache
+from api.read_cache import ReadThroughCache
+from api.tracing import tracer, TRACEPARENT_HEADER
+from typing import Callable, Literal
 import typing
 
 if typing.TYPE_CHECKING:
@@ -43,6 +47,13 @@ class StorageAPI:
         self.url = setting.API_URL
         self.redis_storage = RedisClient()
         self.file_storage_url = setting.SEAWEEDFS_VOLUME_URL
+        self.image_cache = ImageCache()
+        self.read_cache = ReadThroughCache()
+        self.redis_storage.subscribe(
+            channel=setting.CACHE_INVALIDATION_CHANNEL,
+            handler=self.read_cache.handle_event,
+            on_connect=self.read_cache.clear,
+        )
         self.logger = logging.getLogger(__name__)
         # self.redis_storage.clear()
 
@@ -64,13 +75,21 @@ class StorageAPI:
         """
         try:
             self.logger.info(f"SEND TO: {self.url}/{path}, method: {method}")
-            response = requests.request(
-                method=method,
-                url=f"{self.url}/{path}",
-                timeout=timeout,
-                *args,
-                **kwargs,
-            )
+            with tracer.span(
+                name=f"api {method} {path}",
+                attributes={"http.method": method, "http.target": path},
+            ) as span:
+                headers = dict(kwargs.pop("headers", None) or {})
+                headers[TRACEPARENT_HEADER] = span.traceparent
+                response = requests.request(
+                    method=method,
+                    url=f"{self.url}/{path}",
+                    timeout=timeout,
+                    headers=headers,
+                    *args,
+                    **kwargs,
+                )
+                span.set_attribute("http.status_code", response.status_code)
             self.logger.info(
                 f"STATUS CODE FROM: {self.url}/{path} - {response.status_code}"
             )
@@ -78,6 +97,45 @@ class StorageAPI:
         except Exception as error:
             self.logger.error(f"ERROR IN {self.url}/{path} - {error}")
 
+    def __stream_request(
+        self, path: str, on_delta: Callable[[str], None], timeout: int = 60, **kwargs
+    ) -> dict | None:
+        """
+        Отправляет POST-запрос к потоковому эндпоинту API и читает события Server-Sent Events.
+
+        Args:
+            path (str): Путь в API для отправки запроса.
+            on_delta (Callable[[str], None]): Вызывается с уже полученным текстом после каждого события delta.
+            timeout (int): Время ожидания очередной части ответа (по умолчанию 60 секунд).
+            **kwargs: Дополнительные именованные аргументы для requests.request.
+
+        Returns:
+            dict | None: Данные события done (проверенный ответ модели) или None, если генерация не удалась.
+        """
+        response = self.__make_request(
+            method="POST", path=path, timeout=timeout, stream=True, **kwargs
+        )
+        if response is None or response.status_code != 200:
+            return None
+        response.encoding = "utf-8"
+        text = ""
+        event = None
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line.removeprefix("event:").strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line.removeprefix("data:"))
+                    if event == "delta":
+                        text += data["text"]
+                        on_delta(text)
+                    elif event == "done":
+                        return data
+                    elif event == "error":
+                        self.logger.error(f"ERROR IN {self.url}/{path} - {data.get('detail')}")
+                        return None
+        return None
+
     def get_translation(
         self, message_key: str, language_code: str
     ) -> TranslationSchema | None:
@@ -120,17 +178,17 @@ class StorageAPI:
         Returns:
             UsersSchema | None: Экземпляр UsersSchema с данными пользователя, если запрос был успешным, иначе None.
         """
-        hash_user = self.redis_storage.get(UsersSchema, f"user:{user_telegram.id}")
-        if hash_user:
-            return hash_user
-        response = self.__make_request(path=f"users/{user_telegram.id}", method="GET")
-        if response.status_code == 200:
-            json_data = response.json()
-            user = UsersSchema.model_validate(json_data)
-            self.redis_storage.set(f"user:{user_telegram.id}", json_data, 86400)
-            return user
-        if response.status_code == 404:
-            return None
+
+        def fetch() -> UsersSchema | None:
+            response = self.__make_request(path=f"users/{user_telegram.id}", method="GET")
+            if response.status_code == 200:
+                return UsersSchema.model_validate(response.json())
+
+        return self.read_cache.get_or_fetch(
+            key=f"user:telegram_id:{user_telegram.id}",
+            fetch=fetch,
+            ttl=setting.READ_CACHE_MUTABLE_TTL,
+        )
 
     def get_active_user_course(
         self, user_telegram: TelegramUser
@@ -451,12 +509,19 @@ class StorageAPI:
         Returns:
             UserCoursesSchema: Экземпляр UserCoursesSchema с информацией о курсе.
         """
-        response = self.__make_request(
-            path=f"users/courses/{user_course_id}", method="GET"
+
+        def fetch() -> UserCoursesSchema | None:
+            response = self.__make_request(
+                path=f"users/courses/{user_course_id}", method="GET"
+            )
+            if response.status_code == 200:
+                return UserCoursesSchema.model_validate(response.json())
+
+        return self.read_cache.get_or_fetch(
+            key=f"user_course:id:{user_course_id}",
+            fetch=fetch,
+            ttl=setting.READ_CACHE_MUTABLE_TTL,
         )
-        if response.status_code == 200:
-            user_course_info = UserCoursesSchema.model_validate(response.json())
-            return user_course_info
 
     def get_modul_content(
         self, sub_module_id, order_number, content_type
@@ -472,19 +537,28 @@ class StorageAPI:
         Returns:
             ModuleContentsSchema: Экземпляр ModuleContentsSchema с данными контента.
         """
-        params = {"order_number": order_number, "content_type": content_type}
-        response = self.__make_request(
-            path=f"courses/sub-modules/{sub_module_id}/content",
-            method="GET",
-            params=params,
+
+        def fetch() -> ModuleContentsSchema | None:
+            params = {"order_number": order_number, "content_type": content_type}
+            response = self.__make_request(
+                path=f"courses/sub-modules/{sub_module_id}/content",
+                method="GET",
+                params=params,
+            )
+            if response.status_code == 200:
+                return ModuleContentsSchema.model_validate(response.json())
+
+        # Контент не меняется после генерации, кроме file_id изображения, об этом API присылает событие
+        return self.read_cache.get_or_fetch(
+            key=f"module_content:sub_module_id:{sub_module_id}:order_number:{order_number}"
+            f":content_type:{content_type}",
+            fetch=fetch,
+            ttl=setting.READ_CACHE_IMMUTABLE_TTL,
         )
-        if response.status_code == 200:
-            module_content = ModuleContentsSchema.model_validate(response.json())
-            return module_content
 
     def get_image(self, fid: str):
         """
-        Получает изображение по его идентификатору из хранилища файлов.
+        Получает изображение по его идентификатору из локального кэша, а при его отсутствии из хранилища файлов.
 
         Args:
             fid (str): Идентификатор файла изображения.
@@ -492,13 +566,54 @@ class StorageAPI:
         Returns:
             bytes | None: Содержимое файла в байтах, если загрузка успешна, иначе None.
         """
+        image = self.image_cache.get(fid=fid)
+        if image is not None:
+            return image
         response = requests.get(f"{self.file_storage_url}/{fid}")
         if response.status_code == 200:
             logger.info("File downloaded successfully")
+            self.image_cache.put(fid=fid, content=response.content)
             return response.content
         else:
             logger.error("Failed to download file")
 
+    def get_telegram_file_id(self, image_content: ModuleContentsSchema) -> str | None:
+        """
+        Получает file_id, под которым изображение уже загружено в Telegram.
+
+        Args:
+            image_content (ModuleContentsSchema): Контент с изображением.
+
+        Returns:
+            str | None: file_id изображения, если оно уже загружалось, иначе None.
+        """
+        telegram_file_id = image_content.content_data.get("telegram_file_id")
+        if telegram_file_id:
+            return telegram_file_id
+        cached = self.redis_storage.get_value(
+            cache_key=f"telegram_file_id:fid:{image_content.content_data['fid']}"
+        )
+        return cached
+
+    def set_telegram_file_id(self, image_content: ModuleContentsSchema, telegram_file_id: str):
+        """
+        Запоминает file_id загруженного в Telegram изображения в кэше и сохраняет его в контенте курса.
+
+        Args:
+            image_content (ModuleContentsSchema): Контент с изображением.
+            telegram_file_id (str): file_id изображения в Telegram.
+        """
+        self.redis_storage.set_value(
+            cache_key=f"telegram_file_id:fid:{image_content.content_data['fid']}",
+            value=telegram_file_id,
+        )
+        image_content.content_data["telegram_file_id"] = telegram_file_id
+        self.__make_request(
+            path=f"courses/contents/{image_content.id}/telegram-file",
+            method="PATCH",
+            json={"telegram_file_id": telegram_file_id},
+        )
+
     def patch_user_course_info(self, user_course_id: str, **kwargs):
         """
         Обновляет информацию о курсе пользователя по его идентификатору.
@@ -514,6 +629,7 @@ class StorageAPI:
         response = self.__make_request(
             path=f"users/courses/{user_course_id}", method="PATCH", json=kwargs
         )
+        self.read_cache.invalidate(tag=f"user_course:id:{user_course_id}")
         if response.status_code == 200:
             user_course_info = UserCoursesSchema.model_validate(response.json())
             return user_course_info
@@ -529,12 +645,42 @@ class StorageAPI:
             UserCoursesNextStageSchema | None: Экземпляр UserCoursesNextStageSchema с данными о следующей
              стадии обучения, если запрос был успешным, иначе None.
         """
+
+        def fetch() -> UserCoursesNextStageSchema | None:
+            response = self.__make_request(
+                path=f"users/courses/{user_course_id}/next-stage", method="GET"
+            )
+            if response.status_code == 200:
+                return UserCoursesNextStageSchema.model_validate(response.json())
+
+        # Следующая стадия зависит только от состояния курса пользователя
+        return self.read_cache.get_or_fetch(
+            key=f"next_stage:user_course:id:{user_course_id}",
+            fetch=fetch,
+            ttl=setting.READ_CACHE_MUTABLE_TTL,
+            tag=f"user_course:id:{user_course_id}",
+        )
+
+    def advance_user_course(
+        self, user_course_id: str | int
+    ) -> UserCoursesAdvanceSchema | None:
+        """
+        Переводит курс пользователя на следующую стадию одним запросом и получает материал или вопрос этой стадии.
+
+        Args:
+            user_course_id (str | int): Идентификатор курса пользователя.
+
+        Returns:
+            UserCoursesAdvanceSchema | None: Обновленный курс и материал или вопрос новой стадии, None если курс
+             не активен.
+        """
         response = self.__make_request(
-            path=f"users/courses/{user_course_id}/next-stage", method="GET"
+            path=f"users/courses/{user_course_id}/advance", method="POST"
         )
+        self.read_cache.invalidate(tag=f"user_course:id:{user_course_id}")
         if response.status_code == 200:
-            next_stage = UserCoursesNextStageSchema.model_validate(response.json())
-            return next_stage
+            advance = UserCoursesAdvanceSchema.model_validate(response.json())
+            return advance
 
     def get_question_content(
         self, sub_module_id: int, order_number: int
@@ -549,15 +695,22 @@ class StorageAPI:
         Returns:
             QuestionsSchema | None: Экземпляр QuestionsSchema с данными вопроса, если запрос был успешным, иначе None.
         """
-        params = {"order_number": order_number}
-        response = self.__make_request(
-            path=f"courses/sub-modules/{sub_module_id}/questions",
-            params=params,
-            method="GET",
+
+        def fetch() -> QuestionsSchema | None:
+            params = {"order_number": order_number}
+            response = self.__make_request(
+                path=f"courses/sub-modules/{sub_module_id}/questions",
+                params=params,
+                method="GET",
+            )
+            if response.status_code == 200:
+                return QuestionsSchema.model_validate(response.json())
+
+        return self.read_cache.get_or_fetch(
+            key=f"question:sub_module_id:{sub_module_id}:order_number:{order_number}",
+            fetch=fetch,
+            ttl=setting.READ_CACHE_IMMUTABLE_TTL,
         )
-        if response.status_code == 200:
-            questions = QuestionsSchema.model_validate(response.json())
-            return questions
 
     def save_answer(
         self,
@@ -593,7 +746,12 @@ class StorageAPI:
         )
 
     def check_answer(
-        self, question: str, answer: str, language: str, user_course_id: str
+        self,
+        question: str,
+        answer: str,
+        language: str,
+        user_course_id: str,
+        on_delta: Callable[[str], None] | None = None,
     ) -> QuestionAnswersSchema:
         """
         Проверяет ответ пользователя на вопрос.
@@ -603,12 +761,23 @@ class StorageAPI:
             answer (str): Ответ пользователя.
             language (str): Язык на котором нужно вернуть ответ.
             user_course_id (str): Идентификатор курса пользователя.
+            on_delta (Callable[[str], None] | None): Если передан, комментарий запрашивается потоково, и функция
+             вызывается с уже полученным текстом.
 
         Returns:
             QuestionAnswersSchema | None: Экземпляр QuestionAnswersSchema с результатами проверки, если запрос
              был успешным, иначе None.
         """
         json_data = {"question": question, "answer": answer, "language": language}
+        if on_delta is not None and setting.STREAM_LLM_RESPONSES:
+            data = self.__stream_request(
+                path=f"users/courses/{user_course_id}/answers/check/stream",
+                on_delta=on_delta,
+                json=json_data,
+            )
+            if data is not None:
+                return QuestionAnswersSchema.model_validate(data)
+            return None
         response = self.__make_request(
             path=f"users/courses/{user_course_id}/answers/check",
             json=json_data,
@@ -618,7 +787,12 @@ class StorageAPI:
             return QuestionAnswersSchema.model_validate(response.json())
 
     def get_answer(
-        self, content: dict, history: list, language: str, user_course_id: str
+        self,
+        content: dict,
+        history: list,
+        language: str,
+        user_course_id: str,
+        on_delta: Callable[[str], None] | None = None,
     ):
         """
         Получает ответ на основе предоставленного контента и истории.
@@ -628,6 +802,8 @@ class StorageAPI:
             history (list): История предыдущих вопросов и ответов.
             language (str): Язык на котором нужно вернуть ответ.
             user_course_id (str): Идентификатор курса пользователя.
+            on_delta (Callable[[str], None] | None): Если передан, ответ запрашивается потоково, и функция
+             вызывается с уже полученным текстом.
 
         Returns:
             ContentAnswerSchema | None: Экземпляр ContentAnswerSchema с данными ответа, если запрос был успешным,
@@ -639,6 +815,13 @@ class StorageAPI:
             "language": language,
             "user_course_id": int(user_course_id),
         }
+        if on_delta is not None and setting.STREAM_LLM_RESPONSES:
+            data = self.__stream_request(
+                path="other/get-answer/stream", on_delta=on_delta, json=json_data
+            )
+            if data is not None:
+                return ContentAnswerSchema.model_validate(data)
+            return None
         response = self.__make_request(
             path=f"other/get-answer",
             json=json_data,
@@ -663,6 +846,7 @@ class StorageAPI:
             path=f"users/courses/{user_course_id}/{status}",
             method="POST",
         )
+        self.read_cache.invalidate(tag=f"user_course:id:{user_course_id}")
         if response.status_code == 200:
             user_course = UserCoursesSchema.model_validate(response.json())
             return user_course
@@ -674,6 +858,7 @@ class StorageAPI:
         answer: str,
         feedback: str,
         language: str,
+        on_delta: Callable[[str], None] | None = None,
     ) -> HelpSchema:
         """
         Получает комментаий на неправильный ответ.
@@ -684,6 +869,8 @@ class StorageAPI:
             answer: (str): Ответ пользователя
             feedback: (str): Комментарий/ответ бота
             language: (str): Язык на котором нужно дать ответ
+            on_delta (Callable[[str], None] | None): Если передан, комментарий запрашивается потоково, и функция
+             вызывается с уже полученным текстом.
         """
         json_data = {
             "question": question,
@@ -691,6 +878,15 @@ class StorageAPI:
             "feedback": feedback,
             "language": language,
         }
+        if on_delta is not None and setting.STREAM_LLM_RESPONSES:
+            data = self.__stream_request(
+                path=f"users/courses/{user_course_id}/answers/help/stream",
+                on_delta=on_delta,
+                json=json_data,
+            )
+            if data is not None:
+                return HelpSchema.model_validate(data)
+            return None
         response = self.__make_request(
             path=f"users/courses/{user_course_id}/answers/help",
             method="POST",
@@ -0,0 +1,100 @@
+import os
+import threading
+
+from core.config import setting
+from core.logging_config import logger
+
+
+class ImageCache:
+    """
+    Ограниченный по размеру кэш изображений на диске с вытеснением давно не использованных файлов (LRU).
+
+    Порядок использования определяется по времени модификации файла, которое обновляется при каждом чтении,
+    поэтому кэш переживает перезапуск бота.
+    """
+
+    def __init__(
+        self,
+        directory: str = setting.IMAGE_CACHE_DIR,
+        max_bytes: int = setting.IMAGE_CACHE_MAX_BYTES,
+    ):
+        """
+        Args:
+            directory (str): Каталог, в котором хранятся файлы кэша
+            max_bytes (int): Максимальный суммарный размер файлов кэша в байтах
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.__lock = threading.Lock()
+        self.__size: int | None = None
+
+    def __path(self, fid: str) -> str:
+        return os.path.join(self.directory, fid.replace("/", "_").replace(",", "_"))
+
+    def __entries(self) -> list[os.DirEntry]:
+        try:
+            return [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def get(self, fid: str) -> bytes | None:
+        """
+        Получает изображение из кэша и отмечает его как недавно использованное.
+
+        Args:
+            fid (str): Идентификатор файла в хранилище
+
+        Returns:
+            bytes | None: Содержимое файла, если он есть в кэше, иначе None.
+        """
+        path = self.__path(fid)
+        try:
+            with open(path, "rb") as file:
+                content = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        logger.info(f"Found image {fid} in local cache")
+        return content
+
+    def put(self, fid: str, content: bytes):
+        """
+        Сохраняет изображение в кэш и вытесняет самые старые файлы, если превышен лимит размера.
+
+        Args:
+            fid (str): Идентификатор файла в хранилище
+            content (bytes): Содержимое файла
+        """
+        if len(content) > self.max_bytes:
+            return
+        path = self.__path(fid)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with self.__lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(temporary_path, "wb") as file:
+                    file.write(content)
+                os.replace(temporary_path, path)
+            except OSError as error:
+                logger.error(f"Failed to cache image {fid}: {error}")
+                return
+            if self.__size is None:
+                self.__size = sum(entry.stat().st_size for entry in self.__entries())
+            else:
+                self.__size += len(content)
+            if self.__size > self.max_bytes:
+                self.__evict()
+
+    def __evict(self):
+        entries = sorted(self.__entries(), key=lambda entry: entry.stat().st_mtime)
+        self.__size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.__size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self.__size -= size
+            logger.info(f"Evicted {entry.name} from local image cache")
@@ -0,0 +1,336 @@
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+import telebot
+from core.config import setting
+from core.logging_config import logger
+
+
+class TokenBucket:
+    """
+    Ведро токенов для ограничения частоты запросов с возможностью коротких всплесков.
+
+    Attributes:
+        rate (float): Скорость пополнения токенов в секунду.
+        capacity (float): Максимальное количество токенов (размер всплеска).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        Возвращает время в секундах, через которое будет доступен следующий токен.
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        """
+        Забирает один токен из ведра.
+        """
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundJob:
+    """
+    Отложенный вызов метода Telegram API.
+
+    Attributes:
+        method (Callable): Метод бота, например bot.send_message
+        kwargs (dict): Именованные аргументы вызова
+        chat_id (int): Идентификатор чата, в который идет запрос
+        coalesce_key (Hashable | None): Ключ, по которому одинаковые запросы в очереди заменяют друг друга
+        background (bool): Фоновый запрос (удаление, оформление старых сообщений), см. OutboundQueue.submit
+        future (Future): Результат вызова
+        attempts (int): Количество выполненных попыток
+    """
+
+    def __init__(
+        self,
+        method: Callable,
+        kwargs: dict,
+        chat_id: int,
+        coalesce_key: Hashable | None,
+        background: bool = False,
+    ):
+        self.method = method
+        self.kwargs = kwargs
+        self.chat_id = chat_id
+        self.coalesce_key = coalesce_key
+        self.background = background
+        self.future = Future()
+        self.attempts = 0
+
+
+class OutboundQueue:
+    """
+    Центральная очередь исходящих запросов к Telegram API.
+
+    Соблюдает глобальный лимит бота и лимиты на отдельный чат (личный или групповой), учитывает retry_after
+    из ответа 429, схлопывает повторные редактирования одного сообщения и сохраняет порядок запросов
+    внутри чата. Запросы выполняются пулом потоков, поэтому удаления и редактирования можно ставить в
+    очередь без ожидания результата.
+
+    Фоновые запросы (удаление и оформление уже отправленных сообщений) идут отдельной очередью и выполняются,
+    только когда у чата нет обычных запросов в очереди, поэтому не встают перед ответами пользователю. Лимит
+    чата у обеих очередей общий: Telegram считает все запросы в чат вместе.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = setting.TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = setting.TELEGRAM_CHAT_RATE,
+        chat_burst: int = setting.TELEGRAM_CHAT_BURST,
+        group_rate_per_minute: int = setting.TELEGRAM_GROUP_RATE_PER_MINUTE,
+        workers: int = setting.TELEGRAM_SEND_WORKERS,
+        max_retries: int = setting.TELEGRAM_SEND_RETRIES,
+    ):
+        """
+        Args:
+            global_rate (float): Максимум запросов в секунду для всего бота
+            chat_rate (float): Максимум запросов в секунду для одного личного чата
+            chat_burst (int): Количество запросов в чат, которое можно отправить подряд без ожидания
+            group_rate_per_minute (int): Максимум запросов в минуту для одного группового чата
+            workers (int): Количество потоков, выполняющих запросы
+            max_retries (int): Количество повторов при ответе 429
+        """
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate_per_minute = group_rate_per_minute
+        self.workers = workers
+        self.max_retries = max_retries
+        self.__condition = threading.Condition()
+        self.__global_bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self.__chats: OrderedDict[int, deque[OutboundJob]] = OrderedDict()
+        self.__background_chats: OrderedDict[int, deque[OutboundJob]] = OrderedDict()
+        self.__buckets: dict[int, TokenBucket] = {}
+        self.__blocked_until: dict[int, float] = {}
+        self.__in_flight: set[int] = set()
+        self.__pending: dict[Hashable, OutboundJob] = {}
+        self.__executor: ThreadPoolExecutor | None = None
+
+    def call(self, method: Callable, chat_id: int, **kwargs) -> Any:
+        """
+        Ставит запрос в очередь и ждет его выполнения.
+
+        Args:
+            method (Callable): Метод бота, например bot.send_message
+            chat_id (int): Идентификатор чата
+            **kwargs: Аргументы метода (кроме chat_id)
+
+        Returns:
+            Any: Результат метода бота.
+
+        Raises:
+            telebot.apihelper.ApiTelegramException: Если Telegram вернул ошибку или лимит повторов исчерпан.
+        """
+        return self.submit(method, chat_id, **kwargs).result()
+
+    def submit(
+        self,
+        method: Callable,
+        chat_id: int,
+        coalesce_key: Hashable | None = None,
+        background: bool = False,
+        **kwargs,
+    ) -> Future:
+        """
+        Ставит запрос в очередь и сразу возвращает Future с его результатом.
+
+        Если в очереди уже есть невыполненный запрос с тем же coalesce_key, его аргументы заменяются
+        новыми, и возвращается Future этого запроса.
+
+        Args:
+            method (Callable): Метод бота, например bot.edit_message_text
+            chat_id (int): Идентификатор чата
+            coalesce_key (Hashable | None): Ключ схлопывания, например ("edit", chat_id, message_id)
+            background (bool): Фоновый запрос: выполняется после обычных запросов чата. Порядок относительно
+             обычных запросов не сохраняется.
+            **kwargs: Аргументы метода (кроме chat_id)
+
+        Returns:
+            Future: Результат выполнения запроса.
+        """
+        kwargs["chat_id"] = chat_id
+        with self.__condition:
+            self.__start()
+            if coalesce_key is not None and coalesce_key in self.__pending:
+                job = self.__pending[coalesce_key]
+                job.kwargs = kwargs
+                logger.info(f"Coalesced outbound request {coalesce_key}")
+                return job.future
+            job = OutboundJob(
+                method=method,
+                kwargs=kwargs,
+                chat_id=chat_id,
+                coalesce_key=coalesce_key,
+                background=background,
+            )
+            if coalesce_key is not None:
+                self.__pending[coalesce_key] = job
+            chats = self.__background_chats if background else self.__chats
+            chats.setdefault(chat_id, deque()).append(job)
+            self.__condition.notify_all()
+        return job.future
+
+    def __start(self):
+        if self.__executor is not None:
+            return
+        self.__executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="telegram-outbound"
+        )
+        dispatcher = threading.Thread(
+            target=self.__dispatch, name="telegram-outbound-dispatcher", daemon=True
+        )
+        dispatcher.start()
+
+    def __chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.__buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                rate = self.group_rate_per_minute / 60
+                capacity = min(self.chat_burst, self.group_rate_per_minute)
+            else:
+                rate = self.chat_rate
+                capacity = self.chat_burst
+            bucket = TokenBucket(rate=rate, capacity=capacity)
+            self.__buckets[chat_id] = bucket
+        return bucket
+
+    def __prune(self, now: float):
+        """
+        Удаляет состояние чатов, у которых нет запросов в очереди и лимит полностью восстановился.
+        """
+        for chat_id in list(self.__buckets):
+            if chat_id in self.__chats or chat_id in self.__background_chats or chat_id in self.__in_flight:
+                continue
+            if self.__buckets[chat_id].is_full(now) and self.__blocked_until.get(chat_id, 0) <= now:
+                del self.__buckets[chat_id]
+                self.__blocked_until.pop(chat_id, None)
+
+    def __next_job(self) -> tuple[OutboundJob | None, float | None]:
+        """
+        Выбирает следующий запрос, который можно выполнить прямо сейчас.
+
+        Returns:
+            tuple[OutboundJob | None, float | None]: Запрос и None, либо None и время ожидания до ближайшего
+             доступного запроса (None, если очередь пуста).
+        """
+        now = time.monotonic()
+        global_wait = self.__global_bucket.wait_time(now)
+        delay = None
+        for chats, background in ((self.__chats, False), (self.__background_chats, True)):
+            for chat_id, jobs in chats.items():
+                if chat_id in self.__in_flight:
+                    continue
+                # Фоновые запросы чата ждут, пока уйдут его обычные запросы
+                if background and chat_id in self.__chats:
+                    continue
+                wait = max(
+                    global_wait,
+                    self.__chat_bucket(chat_id).wait_time(now),
+                    self.__blocked_until.get(chat_id, 0) - now,
+                )
+                if wait > 0:
+                    delay = wait if delay is None else min(delay, wait)
+                    continue
+                job = jobs.popleft()
+                if jobs:
+                    chats.move_to_end(chat_id)
+                else:
+                    del chats[chat_id]
+                if job.coalesce_key is not None:
+                    self.__pending.pop(job.coalesce_key, None)
+                self.__global_bucket.consume(now)
+                self.__chat_bucket(chat_id).consume(now)
+                self.__in_flight.add(chat_id)
+                job.attempts += 1
+                if len(self.__buckets) > 1000:
+                    self.__prune(now)
+                return job, None
+        return None, delay
+
+    def __dispatch(self):
+        while True:
+            with self.__condition:
+                job, delay = self.__next_job()
+                while job is None:
+                    self.__condition.wait(timeout=delay)
+                    job, delay = self.__next_job()
+            self.__executor.submit(self.__execute, job)
+
+    def __execute(self, job: OutboundJob):
+        try:
+            result = job.method(**job.kwargs)
+        except telebot.apihelper.ApiTelegramException as exception:
+            if exception.error_code == 429 and job.attempts <= self.max_retries:
+                parameters = (exception.result_json or {}).get("parameters") or {}
+                retry_after = parameters.get("retry_after", 1)
+                logger.warning(
+                    f"Telegram flood limit for chat {job.chat_id}, retry after {retry_after}s"
+                )
+                with self.__condition:
+                    self.__blocked_until[job.chat_id] = time.monotonic() + retry_after
+                    self.__requeue(job)
+                    self.__in_flight.discard(job.chat_id)
+                    self.__condition.notify_all()
+                return
+            logger.error(f"Telegram request to chat {job.chat_id} failed: {exception.description}")
+            job.future.set_exception(exception)
+        except Exception as error:
+            logger.error(f"Telegram request to chat {job.chat_id} failed: {error}")
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+        with self.__condition:
+            self.__in_flight.discard(job.chat_id)
+            self.__condition.notify_all()
+
+    def __requeue(self, job: OutboundJob):
+        """
+        Возвращает запрос в начало очереди его чата после ответа 429.
+
+        Запрос снова регистрируется по coalesce_key, чтобы следующие запросы с этим ключом схлопывались с
+        ним. Если за время выполнения в очередь уже встал новый запрос с тем же ключом, устаревший запрос не
+        повторяется, а получает результат нового.
+        """
+        if job.coalesce_key is not None:
+            newer = self.__pending.get(job.coalesce_key)
+            if newer is not None:
+                newer.future.add_done_callback(lambda done: copy_future_result(source=done, target=job.future))
+                return
+            self.__pending[job.coalesce_key] = job
+        chats = self.__background_chats if job.background else self.__chats
+        chats.setdefault(job.chat_id, deque()).appendleft(job)
+        chats.move_to_end(job.chat_id, last=False)
+
+
+def copy_future_result(source: Future, target: Future):
+    """
+    Передает результат или исключение завершенного source в target.
+    """
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+outbound_queue = OutboundQueue()
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from core.config import setting
+from core.logging_config import logger
+
+
+class ReadThroughCache:
+    """
+    Кэш ответов API в памяти процесса бота с инвалидацией по событиям от API.
+
+    Каждая запись привязана к ключу кэша API (тегу), например user_course:id:1. API публикует событие с этим
+    ключом и новой версией при каждом изменении записи, после чего все записи с таким тегом удаляются, а
+    локальная версия тега увеличивается. Версия тега запоминается до запроса в API, и ответ не сохраняется,
+    если за время запроса пришло событие инвалидации, поэтому устаревшие данные не попадают в кэш из-за гонки.
+    """
+
+    def __init__(self, max_entries: int = setting.READ_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            max_entries (int): Максимальное количество записей, при превышении вытесняются давно не использованные
+        """
+        self.max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__entries: OrderedDict[str, tuple[Any, float, str]] = OrderedDict()
+        self.__tags: dict[str, set[str]] = {}
+        self.__versions: dict[str, int] = {}
+        self.__epoch = 0
+
+    def get_or_fetch(
+        self, key: str, fetch: Callable[[], Any], ttl: float, tag: str | None = None
+    ) -> Any:
+        """
+        Возвращает значение из кэша, а при его отсутствии получает его через fetch и сохраняет.
+
+        Args:
+            key (str): Ключ записи
+            fetch (Callable[[], Any]): Функция получения значения из API
+            ttl (float): Время жизни записи в секундах
+            tag (str | None): Ключ кэша API, по событию которого запись удаляется (по умолчанию равен key)
+
+        Returns:
+            Any: Значение из кэша или результат fetch. None не кэшируется.
+        """
+        tag = tag or key
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.__entries.move_to_end(key)
+                return entry[0]
+            version = (self.__epoch, self.__versions.get(tag, 0))
+        value = fetch()
+        if value is None:
+            return value
+        with self.__lock:
+            if (self.__epoch, self.__versions.get(tag, 0)) != version:
+                logger.info(f"Skip caching {key}: {tag} changed during request")
+                return value
+            self.__entries[key] = (value, time.monotonic() + ttl, tag)
+            self.__entries.move_to_end(key)
+            self.__tags.setdefault(tag, set()).add(key)
+            while len(self.__entries) > self.max_entries:
+                evicted_key, (_, _, evicted_tag) = self.__entries.popitem(last=False)
+                self.__discard_tag(evicted_tag, evicted_key)
+        return value
+
+    def __discard_tag(self, tag: str, key: str):
+        keys = self.__tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.__tags[tag]
+
+    def invalidate(self, tag: str):
+        """
+        Удаляет все записи, привязанные к ключу кэша API.
+
+        Args:
+            tag (str): Ключ кэша API
+        """
+        with self.__lock:
+            if len(self.__versions) > self.max_entries:
+                # Сброс версий меняет эпоху, поэтому запросы, начатые до сброса, тоже не попадут в кэш
+                self.__epoch += 1
+                self.__versions.clear()
+            self.__versions[tag] = self.__versions.get(tag, 0) + 1
+            for key in self.__tags.pop(tag, set()):
+                self.__entries.pop(key, None)
+
+    def handle_event(self, event: dict):
+        """
+        Обрабатывает событие инвалидации, опубликованное API.
+
+        Args:
+            event (dict): Событие вида {"key": "user_course:id:1"}
+        """
+        logger.info(f"Invalidate {event['key']}")
+        self.invalidate(tag=event["key"])
+
+    def clear(self):
+        """
+        Очищает кэш. Вызывается при (пере)подключении к каналу событий, так как пропущенные события
+        восстановить нельзя.
+        """
+        with self.__lock:
+            self.__epoch += 1
+            self.__entries.clear()
+            self.__tags.clear()
+            self.__versions.clear()
@@ -1,6 +1,8 @@
 import json
+import time
+import threading
 import redis
-from typing import Type
+from typing import Type, Callable
 from telebot import logger
 from pydantic import BaseModel
 from core.config import setting
@@ -46,6 +48,119 @@ class RedisClient:
         logger.info(f"Set cache by key {cache_key}  with ex={ex}")
         self.__client.set(cache_key, json.dumps(cached), ex=ex)
 
+    def get_value(self, cache_key: str) -> str | None:
+        """
+        Получает строковое значение из кэша по заданному ключу.
+
+        Args:
+            cache_key (str): Ключ для получения данных из кэша
+
+        Returns:
+            str | None: Значение, если ключ найден, иначе None.
+        """
+        record: bytes | None = self.__client.get(cache_key)
+        if record is not None:
+            return record.decode()
+
+    def set_value(self, cache_key: str, value: str, ex: int | None = None):
+        """
+        Устанавливает строковое значение в кэш без сериализации в JSON.
+
+        Args:
+            cache_key (str): Ключ для установки данных в кэш
+            value (str): Значение для кэширования
+            ex (int | None): Время жизни кэша в секундах (по умолчанию None)
+        """
+        self.__client.set(cache_key, value, ex=ex)
+
+    def push_list(self, cache_key: str, values: list[dict], ex: int | None = None):
+        """
+        Добавляет значения в конец списка и обновляет время жизни ключа одним pipeline-запросом.
+
+        Args:
+            cache_key (str): Ключ списка в кэше
+            values (list[dict]): Значения, которые нужно добавить в список
+            ex (int | None): Время жизни списка в секундах (по умолчанию None)
+        """
+        if not values:
+            return
+        pipeline = self.__client.pipeline(transaction=False)
+        pipeline.rpush(cache_key, *[json.dumps(value) for value in values])
+        if ex is not None:
+            pipeline.expire(cache_key, ex)
+        pipeline.execute()
+        logger.info(f"Push {len(values)} values to list by key {cache_key} with ex={ex}")
+
+    def get_list(self, cache_key: str) -> list[dict]:
+        """
+        Получает все значения списка по заданному ключу.
+
+        Args:
+            cache_key (str): Ключ списка в кэше
+
+        Returns:
+            list[dict]: Значения списка, пустой список если ключ не найден.
+        """
+        records = self.__client.lrange(cache_key, 0, -1)
+        return [json.loads(record) for record in records]
+
+    def pop_list(self, cache_key: str) -> list[dict]:
+        """
+        Атомарно получает все значения списка и удаляет ключ.
+
+        Args:
+            cache_key (str): Ключ списка в кэше
+
+        Returns:
+            list[dict]: Значения списка, пустой список если ключ не найден.
+        """
+        pipeline = self.__client.pipeline(transaction=True)
+        pipeline.lrange(cache_key, 0, -1)
+        pipeline.delete(cache_key)
+        records, _ = pipeline.execute()
+        return [json.loads(record) for record in records]
+
+    def delete(self, cache_key: str):
+        """
+        Удаляет ключ из кэша.
+
+        Args:
+            cache_key (str): Ключ для удаления
+        """
+        self.__client.delete(cache_key)
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None], on_connect: Callable[[], None]):
+        """
+        Подписывается на канал в фоновом потоке и передает обработчику каждое JSON сообщение.
+
+        При потере соединения поток переподключается и снова вызывает on_connect, так как сообщения,
+        опубликованные во время разрыва, теряются.
+
+        Args:
+            channel (str): Название канала
+            handler (Callable[[dict], None]): Обработчик сообщения
+            on_connect (Callable[[], None]): Вызывается после каждой успешной подписки
+        """
+        def listen():
+            while True:
+                try:
+                    pubsub = self.__client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(channel)
+                    on_connect()
+                    logger.info(f"Subscribed to channel {channel}")
+                    for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        try:
+                            handler(json.loads(message["data"]))
+                        except Exception as error:
+                            logger.error(f"Failed to handle message from channel {channel}: {error}")
+                except redis.RedisError as error:
+                    logger.error(f"Lost subscription to channel {channel}: {error}")
+                    time.sleep(1)
+
+        threading.Thread(target=listen, name=f"redis-subscribe-{channel}", daemon=True).start()
+
     def clear(self):
         """
           Очищает весь кэш, удаляя все ключи и базы данных.
@@ -0,0 +1,129 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from core.config import setting
+from core.logging_config import logger
+
+TRACEPARENT_HEADER = "traceparent"
+SERVICE_NAME = "telegram_app"
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    Отрезок времени выполнения операции бота. Формат совпадает со спанами API (OTLP/JSON), поэтому
+    спаны бота и API одной трассировки можно объединить в одну временную шкалу.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict[str, Any] | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.status = "OK"
+        self.error: str | None = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        """
+        Возвращает значение заголовка traceparent (W3C Trace Context) для запроса в API.
+
+        Returns:
+            str: Значение заголовка.
+        """
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": self.status},
+            "service": SERVICE_NAME,
+            "thread": threading.current_thread().name,
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"]["message"] = self.error
+        return span
+
+
+class Tracer:
+    """
+    Трассировщик бота. Создает спаны, связывает их через contextvars и дописывает завершенные спаны
+    в файл в формате JSON Lines, если задан путь.
+    """
+
+    def __init__(self, path: str | None = None):
+        """
+        Args:
+            path (str | None): Путь к файлу со спанами, если None, спаны не сохраняются
+        """
+        self.path = path
+        self.__lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, attributes: dict[str, Any] | None = None) -> Iterator[Span]:
+        """
+        Создает спан, который становится текущим на время выполнения блока.
+
+        Args:
+            name (str): Название операции
+            attributes (dict[str, Any] | None): Атрибуты спана
+
+        Yields:
+            Span: Созданный спан.
+        """
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        span = Span(
+            name=name,
+            trace_id=trace_id,
+            parent_id=parent.span_id if parent is not None else None,
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.status = "ERROR"
+            span.error = str(error)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self.__export(span)
+
+    def __export(self, span: Span):
+        if self.path is None:
+            return
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self.__lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(line)
+            except OSError as error:
+                logger.error(f"Failed to export span {span.name}: {error}")
+
+
+tracer = Tracer(path=setting.TRACE_EXPORT_PATH)
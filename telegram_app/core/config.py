@@ -16,6 +16,21 @@ class Settings(BaseSettings):
     DISCOUNT_STARS: int
     CURRENCY_STARS: str = ""
     PROVIDER_TOKEN: str
+    TELEGRAM_GLOBAL_RATE: float = 30
+    TELEGRAM_CHAT_RATE: float = 1
+    TELEGRAM_CHAT_BURST: int = 5
+    TELEGRAM_GROUP_RATE_PER_MINUTE: int = 20
+    TELEGRAM_SEND_WORKERS: int = 4
+    TELEGRAM_SEND_RETRIES: int = 3
+    TELEGRAM_STREAM_EDIT_INTERVAL: float = 1.5
+    STREAM_LLM_RESPONSES: bool = True
+    IMAGE_CACHE_DIR: str = "/tmp/telegram_app/images"
+    IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    CACHE_INVALIDATION_CHANNEL: str = "cache_invalidation"
+    READ_CACHE_MAX_ENTRIES: int = 10000
+    READ_CACHE_MUTABLE_TTL: int = 300
+    READ_CACHE_IMMUTABLE_TTL: int = 259200
+    TRACE_EXPORT_PATH: str | None = None
 
 
 setting = Settings()
@@ -1,5 +1,4 @@
 import re
-import time
 from typing import Literal
 
 import telebot
@@ -13,9 +12,9 @@ from telebot.types import (
     ForceReply,
 )
 from api.client import StorageAPI
+from api.outbound_queue import outbound_queue
 from core.logging_config import logger
 from schemas.create_education_schemas import CreatedEducationStage
-from schemas.education_schemas import MessageStorageSchema
 
 
 def get_message_types(message: Message | CallbackQuery):
@@ -138,6 +137,54 @@ def update_prepare_info(
     storage.redis_storage.set(cache_key=cache_key, cached=created_info_dict, ex=86400)
 
 
+# Telegram позволяет боту удалять сообщения только в течение 48 часов, дольше хранить историю нет смысла
+MESSAGE_HISTORY_TTL = 172800
+
+
+def message_history_key(
+    user_telegram_id: int, type_message: Literal["system", "education", "quiz"]
+) -> str:
+    """
+    Формирует ключ списка истории сообщений пользователя в кэше.
+
+    Args:
+        user_telegram_id (int): Идентификатор пользователя в Telegram.
+        type_message (Literal["system", "education", "quiz"]): Тип сообщения.
+
+    Returns:
+        str: Ключ списка истории сообщений.
+    """
+    return f"messages:user_telegram_id:{user_telegram_id}:type_message:{type_message}"
+
+
+def record_messages(
+    user_telegram: TelegramUser,
+    storage: StorageAPI,
+    type_message: Literal["system", "education", "quiz"],
+    messages: list[Message],
+):
+    """
+    Записывает ID отправленных сообщений в историю одной командой RPUSH.
+
+    Args:
+        user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе.
+        storage (StorageAPI): Экземпляр для работы с хранилищем данных.
+        type_message (Literal["system", "education", "quiz"]): Тип сообщения.
+        messages (list[Message]): Отправленные сообщения.
+    """
+    records = []
+    for message in messages:
+        record = {"message_id": message.message_id}
+        if type_message == "education":
+            record["text"] = message.text
+        records.append(record)
+    storage.redis_storage.push_list(
+        cache_key=message_history_key(user_telegram.id, type_message),
+        values=records,
+        ex=MESSAGE_HISTORY_TTL,
+    )
+
+
 def handler_message(
     bot: TeleBot,
     text: str,
@@ -176,55 +223,92 @@ def handler_message(
     Returns:
         Message: Объект отправленного или отредактированного сообщения.
     """
-    for try_count in range(3):
+    try:
+        if actin == "send":
+            sent_message = outbound_queue.call(
+                bot.send_message,
+                chat_id=chat_id,
+                text=text,
+                reply_markup=markup,
+                parse_mode=parse_mode,
+            )
+            record_messages(
+                user_telegram=user_telegram,
+                storage=storage,
+                type_message=type_message,
+                messages=[sent_message],
+            )
+            return sent_message
+        elif actin == "edit":
+            edited_message = outbound_queue.call(
+                bot.edit_message_text,
+                chat_id=chat_id,
+                text=text,
+                reply_markup=markup,
+                message_id=message_id,
+                parse_mode=parse_mode,
+            )
+            return edited_message
+    except telebot.apihelper.ApiTelegramException as exception:
+        logger.error(f"Failed to {actin} message in chat {chat_id}: {exception.description}")
+
+
+def handler_messages(
+    bot: TeleBot,
+    texts: list[str],
+    chat_id: int,
+    user_telegram: TelegramUser,
+    storage: StorageAPI,
+    type_message: Literal["system", "education", "quiz"],
+    parse_mode: str | None = None,
+    markup: (
+        InlineKeyboardMarkup
+        | ReplyKeyboardMarkup
+        | ReplyKeyboardRemove
+        | ForceReply
+        | None
+    ) = None,
+) -> list[Message]:
+    """
+    Отправляет несколько сообщений подряд и записывает их ID в историю одной командой.
+
+    Разметка клавиатуры прикрепляется только к последнему сообщению.
+
+    Args:
+        bot (TeleBot): Экземпляр Telegram бота.
+        texts (list[str]): Тексты сообщений в порядке отправки.
+        chat_id (int): Идентификатор чата.
+        user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе.
+        storage (StorageAPI): Экземпляр для работы с хранилищем данных.
+        type_message (Literal["system", "education", "quiz"]): Тип сообщения.
+        parse_mode (str | None): Режим форматирования текста.
+        markup (InlineKeyboardMarkup | ReplyKeyboardMarkup | ReplyKeyboardRemove | ForceReply | None):
+         Разметка клавиатуры.
+
+    Returns:
+        list[Message]: Отправленные сообщения.
+    """
+    sent_messages = []
+    for index, text in enumerate(texts):
+        reply_markup = markup if index == len(texts) - 1 else None
         try:
-            if actin == "send":
-                cache_key = (
-                    f"user_telegram_id:{user_telegram.id}:type_message:{type_message}"
-                )
-                storage_message = storage.redis_storage.get(
-                    base_model=MessageStorageSchema, cache_key=cache_key
-                )
-                if storage_message is None:
-                    storage_message = MessageStorageSchema.model_validate(
-                        {"messages": []}
-                    )
-                sent_message = bot.send_message(
-                    text=text,
-                    chat_id=chat_id,
-                    reply_markup=markup,
-                    parse_mode=parse_mode,
-                )
-                if type_message == "education":
-                    storage_message.messages.append(
-                        {
-                            "message_id": sent_message.message_id,
-                            "text": sent_message.text,
-                        }
-                    )
-                else:
-                    storage_message.messages.append(
-                        {"message_id": sent_message.message_id}
-                    )
-                storage.redis_storage.delete_keys_by_pattern(pattern=f"{cache_key}*")
-                storage.redis_storage.set(
-                    cache_key=cache_key, cached=storage_message.dict()
-                )
-
-                return sent_message
-            elif actin == "edit":
-                edited_message = bot.edit_message_text(
-                    text=text,
-                    chat_id=chat_id,
-                    reply_markup=markup,
-                    message_id=message_id,
-                    parse_mode=parse_mode,
-                )
-                return edited_message
+            sent_message = outbound_queue.call(
+                bot.send_message,
+                chat_id=chat_id,
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode,
+            )
+            sent_messages.append(sent_message)
         except telebot.apihelper.ApiTelegramException as exception:
-            if exception.error_code == 429:
-                logger.warning(exception.description)
-                time.sleep(2)
+            logger.error(f"Failed to send message in chat {chat_id}: {exception.description}")
+    record_messages(
+        user_telegram=user_telegram,
+        storage=storage,
+        type_message=type_message,
+        messages=sent_messages,
+    )
+    return sent_messages
 
 
 def append_user_message(
@@ -240,15 +324,11 @@ def append_user_message(
         storage (StorageAPI): Экземпляр для работы с хранилищем данных.
         type_message (Literal["system", "education", "quiz"]): Тип сообщения.
     """
-    cache_key = f"user_telegram_id:{user_telegram.id}:type_message:{type_message}"
-    storage_message = storage.redis_storage.get(
-        base_model=MessageStorageSchema, cache_key=cache_key
+    storage.redis_storage.push_list(
+        cache_key=message_history_key(user_telegram.id, type_message),
+        values=[{"message_id": user_telegram.message_id}],
+        ex=MESSAGE_HISTORY_TTL,
     )
-    if storage_message is None:
-        storage_message = MessageStorageSchema.model_validate({"messages": []})
-    storage_message.messages.append({"message_id": user_telegram.message_id})
-    storage.redis_storage.delete_keys_by_pattern(pattern=f"{cache_key}*")
-    storage.redis_storage.set(cache_key=cache_key, cached=storage_message.dict())
 
 
 def delete_messages(
@@ -257,21 +337,26 @@ def delete_messages(
     storage: StorageAPI,
     type_message: Literal["system", "education", "quiz"],
 ):
-    cache_key = f"user_telegram_id:{user_telegram.id}:type_message:{type_message}"
-    storage_message = storage.redis_storage.get(
-        base_model=MessageStorageSchema, cache_key=cache_key
-    )
-    if storage_message is None:
-        return
+    """
+    Ставит в очередь удаление всех сообщений из истории и очищает историю, не дожидаясь выполнения.
+    Удаления фоновые: выполняются после новых сообщений чата и не расходуют их лимит.
 
-    for message in storage_message.messages:
-        try:
-            bot.delete_message(
-                chat_id=user_telegram.chat_id, message_id=message["message_id"]
-            )
-        except Exception as e:
-            print(e)
-    storage.redis_storage.delete_keys_by_pattern(pattern=f"{cache_key}*")
+    Args:
+        bot (TeleBot): Экземпляр Telegram бота.
+        user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе.
+        storage (StorageAPI): Экземпляр для работы с хранилищем данных.
+        type_message (Literal["system", "education", "quiz"]): Тип сообщения.
+    """
+    messages = storage.redis_storage.pop_list(
+        cache_key=message_history_key(user_telegram.id, type_message)
+    )
+    for message in messages:
+        outbound_queue.submit(
+            bot.delete_message,
+            chat_id=user_telegram.chat_id,
+            background=True,
+            message_id=message["message_id"],
+        )
 
 
 def spoiler_message(
@@ -281,27 +366,38 @@ def spoiler_message(
     action: str = Literal["set", "pull off"],
     type_message: str = "education",
 ):
-    cache_key = f"user_telegram_id:{user_telegram.id}:type_message:{type_message}"
-    storage_message = storage.redis_storage.get(
-        base_model=MessageStorageSchema, cache_key=cache_key
-    )
-    if storage_message is None:
-        return
-    for message in storage_message.messages:
-        try:
-            if action == "set":
-                text = f'<span class="tg-spoiler">{message["text"]}</span>'
-            elif action == "pull off":
-                text = re.sub(r'<span class="tg-spoiler">', "", message["text"], 1)
-                text = re.sub(r"</span>(?!.*</span>)", "", text)
-
-            bot.edit_message_text(
-                message_id=message["message_id"],
-                text=text,
-                parse_mode="HTML",
-                chat_id=user_telegram.chat_id,
-            )
-        except Exception as e:
-            print(e)
+    """
+    Ставит в очередь скрытие под спойлер или снятие спойлера с сообщений из истории, не дожидаясь выполнения.
+
+    Повторные редактирования одного и того же сообщения, которые ещё не отправлены, схлопываются в последнее.
+    Редактирования фоновые: выполняются после новых сообщений чата и не расходуют их лимит.
+
+    Args:
+        bot (TeleBot): Экземпляр Telegram бота.
+        user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе.
+        storage (StorageAPI): Экземпляр для работы с хранилищем данных.
+        action (Literal["set", "pull off"]): Скрыть сообщения под спойлер или снять спойлер.
+        type_message (str): Тип сообщения.
+    """
+    cache_key = message_history_key(user_telegram.id, type_message)
     if action == "pull off":
-        storage.redis_storage.delete_keys_by_pattern(pattern=f"{cache_key}*")
+        messages = storage.redis_storage.pop_list(cache_key=cache_key)
+    else:
+        messages = storage.redis_storage.get_list(cache_key=cache_key)
+    for message in messages:
+        if not message.get("text"):
+            continue
+        if action == "set":
+            text = f'<span class="tg-spoiler">{message["text"]}</span>'
+        elif action == "pull off":
+            text = re.sub(r'<span class="tg-spoiler">', "", message["text"], 1)
+            text = re.sub(r"</span>(?!.*</span>)", "", text)
+        outbound_queue.submit(
+            bot.edit_message_text,
+            chat_id=user_telegram.chat_id,
+            coalesce_key=("edit", user_telegram.chat_id, message["message_id"]),
+            background=True,
+            message_id=message["message_id"],
+            text=text,
+            parse_mode="HTML",
+        )
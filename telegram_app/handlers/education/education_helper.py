@@ -1,3 +1,5 @@
+from html import escape
+
 from telebot import TeleBot
 from telebot.types import (
     Message,
@@ -7,10 +9,11 @@ from telebot.types import (
     ReplyKeyboardRemove,
 )
 from api.client import StorageAPI
+from api.outbound_queue import outbound_queue
 from handlers.balance.balance_command import balance_command_handler
 from handlers.dependencies import TelegramUser, handler_message, append_user_message
 from handlers.education.education_process import next_stage_education
-from handlers.education.utils import clean_and_escape_html
+from handlers.education.utils import StreamingMessage
 from handlers.help.help_command import help_command_handler
 from handlers.my_courses.my_courses_command import my_courses_command_handler
 from handlers.start.start_command import start_command_handler
@@ -124,7 +127,7 @@ def waiting_question(
             "content": f"{message.text}. Верни ответ на языке {user_telegram.language}",
         }
     )
-    handler_message(
+    placeholder = handler_message(
         bot=bot,
         text="🤔",
         chat_id=user_telegram.chat_id,
@@ -133,13 +136,27 @@ def waiting_question(
         type_message="system",
         actin="send",
     )
+    streaming_message = StreamingMessage(bot=bot, message=placeholder)
     answer = storage.get_answer(
-        content=content.content_data,
+        content={
+            key: value
+            for key, value in content.content_data.items()
+            if key != "telegram_html"
+        },
         history=dialog,
         language=user_telegram.language,
         user_course_id=user_course_id,
+        on_delta=streaming_message.update,
     )
     if answer.is_validate:
+        # Ответ записывается в историю обучающих сообщений, поэтому заглушка с частями ответа заменяется
+        # новым сообщением
+        if placeholder:
+            outbound_queue.submit(
+                bot.delete_message,
+                chat_id=user_telegram.chat_id,
+                message_id=placeholder.message_id,
+            )
         count += 1
         reply_markup = ReplyKeyboardRemove() if count == 3 else None
         msg = handler_message(
@@ -233,7 +250,7 @@ def waiting_question(
 def sos_answer(
     user_course_id: str, bot: TeleBot, storage: StorageAPI, user_telegram: TelegramUser
 ):
-    handler_message(
+    placeholder = handler_message(
         bot=bot,
         text="🤔",
         chat_id=user_telegram.chat_id,
@@ -263,6 +280,7 @@ def sos_answer(
         answer=answer.answer,
         feedback=answer.feedback,
         language=user_telegram.language,
+        on_delta=StreamingMessage(bot=bot, message=placeholder).update,
     )
     next_stage_btn = InlineKeyboardButton(
         text=Buttons.next_stage.text,
@@ -270,7 +288,8 @@ def sos_answer(
     )
     markup = InlineKeyboardMarkup(row_width=2)
     markup.add(next_stage_btn)
-    correct_feedback_html = clean_and_escape_html(correct_feedback.response)
+    # Комментарий очищает для Telegram API; если telegram_html нет, текст только экранируется
+    correct_feedback_html = correct_feedback.telegram_html or escape(correct_feedback.response or "")
     handler_message(
         bot=bot,
         text=correct_feedback_html,
@@ -278,7 +297,8 @@ def sos_answer(
         user_telegram=user_telegram,
         storage=storage,
         type_message="system",
-        actin="send",
+        actin="edit" if placeholder else "send",
+        message_id=placeholder.message_id if placeholder else None,
         markup=markup,
         parse_mode="HTML",
     )
@@ -7,6 +7,7 @@ from telebot.types import (
     InlineKeyboardMarkup,
 )
 from api.client import StorageAPI
+from api.outbound_queue import outbound_queue
 from handlers.balance.balance_command import balance_command_handler
 from handlers.dependencies import (
     TelegramUser,
@@ -16,7 +17,12 @@ from handlers.dependencies import (
     append_user_message,
 )
 from handlers.education.education_complited import completion_course
-from handlers.education.utils import show_content, check_activity
+from handlers.education.utils import (
+    StreamingMessage,
+    show_content,
+    check_activity,
+    send_inactive_course_message,
+)
 from handlers.help.help_command import help_command_handler
 from handlers.my_courses.my_courses_command import my_courses_command_handler
 from handlers.start.start_command import start_command_handler
@@ -52,8 +58,11 @@ def education_start(call: CallbackQuery, bot: TeleBot, storage: StorageAPI):
         storage.patch_user_course_info(
             user_course_id=user_course_id, current_stage=CurrentStage.education.value
         )
-        bot.delete_message(
-            chat_id=user_telegram.chat_id, message_id=user_telegram.message_id
+        outbound_queue.submit(
+            bot.delete_message,
+            chat_id=user_telegram.chat_id,
+            background=True,
+            message_id=user_telegram.message_id,
         )
         education(
             education_course=education_course,
@@ -69,8 +78,8 @@ def next_stage_education(
     """
     Переходит к следующему этапу обучения.
 
-    Проверяет активность курса, получает следующую стадию обучения и обновляет информацию о курсе.
-    В зависимости от текущей стадии запускает соответствующий процесс (обучение, вопросы или завершение курса).
+    Одним запросом к API переводит курс на следующую стадию и получает её материал или вопрос.
+    В зависимости от новой стадии запускает соответствующий процесс (обучение, вопросы или завершение курса).
 
     Args:
         user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе
@@ -78,18 +87,16 @@ def next_stage_education(
         storage (StorageAPI): Экземпляр для работы с хранилищем данных
         user_course_id (str): Идентификатор курса пользователя
     """
-    education_course = check_activity(
-        storage=storage,
-        bot=bot,
-        user_telegram=user_telegram,
-        user_course_id=user_course_id,
-    )
-    if not education_course:
+    advance = storage.advance_user_course(user_course_id=user_course_id)
+    if advance is None:
+        send_inactive_course_message(
+            storage=storage, user_telegram=user_telegram, bot=bot
+        )
         return
-    next_stage = storage.get_next_stage_education(user_course_id=user_course_id)
+    education_course = advance.user_course
     if (
-        next_stage.data.current_order_number == 1
-        and next_stage.stage.value == CurrentStage.education.value
+        education_course.current_order_number == 1
+        and education_course.current_stage == CurrentStage.education
     ):
         delete_messages(
             bot=bot, storage=storage, user_telegram=user_telegram, type_message="quiz"
@@ -98,32 +105,28 @@ def next_stage_education(
             bot=bot, storage=storage, user_telegram=user_telegram, action="pull off"
         )
     elif (
-        next_stage.data.current_order_number == 1
-        and next_stage.stage.value == CurrentStage.question.value
+        education_course.current_order_number == 1
+        and education_course.current_stage == CurrentStage.question
     ):
         spoiler_message(
             bot=bot, storage=storage, user_telegram=user_telegram, action="set"
         )
-    education_course = storage.patch_user_course_info(
-        user_course_id=user_course_id,
-        current_stage=next_stage.stage.value,
-        current_module_id=next_stage.data.current_module_id,
-        current_order_number=next_stage.data.current_order_number,
-        current_sub_module_id=next_stage.data.current_sub_module_id,
-    )
 
     if education_course.current_stage == CurrentStage.education:
-        education(
-            education_course=education_course,
-            storage=storage,
+        show_content(
+            text_content=advance.text_content,
+            image_content=advance.image_content,
             bot=bot,
+            storage=storage,
             user_telegram=user_telegram,
+            education_course=education_course,
         )
     elif education_course.current_stage in [
         CurrentStage.question,
         CurrentStage.ask_question,
     ]:
-        quiz(
+        ask_question(
+            question=advance.question,
             user_course_id=user_course_id,
             storage=storage,
             bot=bot,
@@ -196,6 +199,32 @@ def quiz(
         sub_module_id=current_education_stage.current_sub_module_id,
         order_number=current_education_stage.current_order_number,
     )
+    ask_question(
+        question=question,
+        user_course_id=user_course_id,
+        storage=storage,
+        bot=bot,
+        user_telegram=user_telegram,
+    )
+
+
+def ask_question(
+    question: QuestionsSchema,
+    user_course_id: str,
+    storage: StorageAPI,
+    bot: TeleBot,
+    user_telegram: TelegramUser,
+):
+    """
+    Задает пользователю вопрос в зависимости от его типа.
+
+    Args:
+        question (QuestionsSchema): Объект с информацией о вопросе
+        user_course_id (str): Идентификатор курса пользователя
+        storage (StorageAPI): Экземпляр для работы с хранилищем данных
+        bot (TeleBot): Экземпляр Telegram бота
+        user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе
+    """
     if question.question_type == QuestionType.multiple_choice:
         ask_multiple_choice_question(
             question=question,
@@ -478,7 +507,7 @@ def waiting_open_question(
             message_key=TranslationKeys.checking_answer_message,
             language_code=user_telegram.language,
         )
-        handler_message(
+        placeholder = handler_message(
             bot=bot,
             text=checking_answer.message_text,
             chat_id=user_telegram.chat_id,
@@ -490,11 +519,13 @@ def waiting_open_question(
         has_answer = storage.get_user_answer(
             question_id=question.id, telegram_id=user_telegram.id
         )
+        streaming_message = StreamingMessage(bot=bot, message=placeholder)
         answer = storage.check_answer(
             question=question.content,
             answer=user_telegram.message_text,
             language=user_telegram.language,
             user_course_id=user_course_id,
+            on_delta=streaming_message.update,
         )
         next_stage_btn = InlineKeyboardButton(
             text=Buttons.next_stage.text,
@@ -516,7 +547,8 @@ def waiting_open_question(
             user_telegram=user_telegram,
             storage=storage,
             type_message="quiz",
-            actin="send",
+            actin="edit" if placeholder else "send",
+            message_id=placeholder.message_id if placeholder else None,
             markup=markup,
         )
         storage.save_answer(
@@ -1,13 +1,23 @@
-from bs4 import BeautifulSoup, NavigableString
+import time
+
+import telebot
 from telebot import TeleBot
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, Message
 
 from api.client import StorageAPI
-from handlers.dependencies import TelegramUser, handler_message
+from api.outbound_queue import outbound_queue
+from core.config import setting
+from core.logging_config import logger
+from handlers.dependencies import TelegramUser, handler_message, handler_messages
 from handlers.utils import Buttons, TranslationKeys
 from schemas.course_schemas import ModuleContentsSchema, UserCoursesSchema
 
 
+# Лимиты Telegram на длину текста сообщения и подписи к фото
+TELEGRAM_MESSAGE_LIMIT = 4096
+TELEGRAM_CAPTION_LIMIT = 1024
+
+
 def show_content(
     text_content: ModuleContentsSchema,
     image_content: ModuleContentsSchema | None,
@@ -17,63 +27,35 @@ def show_content(
     education_course: UserCoursesSchema,
 ):
     """
-    Подготавливает материал для пользователя и отправляет ему в виде сообщения
+    Подготавливает материал для пользователя и отправляет его минимальным количеством сообщений.
 
-    Args:
+    Урок приходит из API уже очищенным и упакованным в сообщения до лимита Telegram (content_data["telegram_html"]),
+    заголовок отправляется подписью к изображению, если оно есть, иначе - вместе с текстом урока. Если заголовок
+    длиннее лимита подписи, изображение отправляется без подписи, а заголовок - вместе с текстом.
 
+    Args:
+        text_content (ModuleContentsSchema): Текстовый контент урока
+        image_content (ModuleContentsSchema | None): Изображение урока
+        bot (TeleBot): Экземпляр Telegram бота
+        storage (StorageAPI): Экземпляр для работы с хранилищем данных
+        user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе
+        education_course (UserCoursesSchema): Информация о текущем курсе пользователя
     """
-    text_content_data = text_content.content_data
-    main_title = f"{clean_and_escape_html(text_content_data.get('title', ''))}"
+    rendered = text_content.content_data["telegram_html"]
+    main_title = rendered["title"]
+    title_as_caption = len(main_title) <= TELEGRAM_CAPTION_LIMIT
     if image_content:
-        image = storage.get_image(fid=image_content.content_data["fid"])
-        bot.send_photo(
-            chat_id=user_telegram.chat_id,
-            photo=image,
-            caption=main_title,
-            parse_mode="HTML",
-        )
-    else:
-        handler_message(
+        send_lesson_image(
+            image_content=image_content,
+            caption=main_title if title_as_caption else None,
             bot=bot,
-            text=main_title,
-            chat_id=user_telegram.chat_id,
-            user_telegram=user_telegram,
             storage=storage,
-            type_message="education",
-            actin="send",
-            parse_mode="HTML",
-        )
-    introduction = f"{clean_and_escape_html(text_content_data.get('introduction', ''))}"
-    handler_message(
-        bot=bot,
-        text=introduction,
-        chat_id=user_telegram.chat_id,
-        user_telegram=user_telegram,
-        storage=storage,
-        type_message="education",
-        actin="send",
-        parse_mode="HTML",
-    )
-    sections = text_content_data.get("sections", [])
-    for section in sections:
-        body = ""
-        title = section.get("title")
-        content = section.get("content")
-        if title:
-            body += f"{clean_and_escape_html(title)}\n\n"
-        if content:
-            body += f"{clean_and_escape_html(content)}\n"
-        handler_message(
-            bot=bot,
-            text=body,
-            chat_id=user_telegram.chat_id,
             user_telegram=user_telegram,
-            storage=storage,
-            type_message="education",
-            actin="send",
-            parse_mode="HTML",
         )
-    conclusion = f"{text_content_data.get('conclusion', '')}"
+    if image_content and title_as_caption:
+        messages = rendered["messages"]
+    else:
+        messages = rendered["titled_messages"]
     markup = InlineKeyboardMarkup(row_width=5)
     user_course_id = education_course.id
     buttons = []
@@ -99,46 +81,111 @@ def show_content(
     )
     buttons.append(next_stage_btn)
     markup.add(*buttons)
-    handler_message(
+    handler_messages(
         bot=bot,
-        text=conclusion,
+        texts=messages,
         chat_id=user_telegram.chat_id,
         user_telegram=user_telegram,
         storage=storage,
         type_message="education",
-        actin="send",
         parse_mode="HTML",
         markup=markup,
     )
 
 
-def clean_and_escape_html(html):
+def send_lesson_image(
+    image_content: ModuleContentsSchema,
+    caption: str | None,
+    bot: TeleBot,
+    storage: StorageAPI,
+    user_telegram: TelegramUser,
+):
     """
-    Очищает HTML-код от всех тегов, кроме разрешенных, и преобразует специальные символы в HTML-сущности.
-
-    Эта функция удаляет все HTML-теги из входной строки, за исключением тех, которые указаны в списке разрешенных.
-    Также она заменяет символы "<" и ">" на соответствующие HTML-сущности (&lt; и &gt;)
-    в текстовых участках, которые не являются тегами.
-    Это предотвращает выполнение потенциально вредоносного кода при отображении строки как HTML.
+    Отправляет изображение урока по file_id Telegram, а если изображение ещё не загружалось, загружает файл
+    и запоминает полученный file_id для следующих учеников.
 
     Args:
-        - html (str): Строка, содержащая HTML-код, который нужно очистить.
+        image_content (ModuleContentsSchema): Изображение урока
+        caption (str | None): Подпись к изображению
+        bot (TeleBot): Экземпляр Telegram бота
+        storage (StorageAPI): Экземпляр для работы с хранилищем данных
+        user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе
+    """
+    telegram_file_id = storage.get_telegram_file_id(image_content=image_content)
+    if telegram_file_id:
+        try:
+            outbound_queue.call(
+                bot.send_photo,
+                chat_id=user_telegram.chat_id,
+                photo=telegram_file_id,
+                caption=caption,
+                parse_mode="HTML",
+            )
+            return
+        except telebot.apihelper.ApiTelegramException as exception:
+            logger.warning(f"Failed to send photo by file_id, uploading again: {exception.description}")
+    image = storage.get_image(fid=image_content.content_data["fid"])
+    sent_message = outbound_queue.call(
+        bot.send_photo,
+        chat_id=user_telegram.chat_id,
+        photo=image,
+        caption=caption,
+        parse_mode="HTML",
+    )
+    storage.set_telegram_file_id(
+        image_content=image_content, telegram_file_id=sent_message.photo[-1].file_id
+    )
 
-    Returns:
-        - str: Очищенная и безопасная для отображения как HTML строка.
+
+class StreamingMessage:
     """
-    allowed_tags = ["code", "b", "i", "u", "s", "pre"]
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup.find_all(True):
-        if tag.name not in allowed_tags:
-            tag.unwrap()
+    Сообщение-заглушка, текст которого обновляется по мере генерации ответа модели.
 
-    # Замена символов "<" и ">" на HTML-сущности в не-теговых частях
-    for content in soup.descendants:
-        if isinstance(content, NavigableString):
-            content.replace_with(content.replace("<", "&lt;").replace(">", "&gt;"))
+    Редактирования отправляются не чаще interval секунд и ставятся в outbound_queue с ключом схлопывания
+    сообщения, поэтому частые части ответа не упираются в лимиты Telegram на редактирование. Итоговый текст
+    с разметкой отправляется отдельно через handler_message с actin="edit".
+    """
+
+    def __init__(
+        self,
+        bot: TeleBot,
+        message: Message | None,
+        interval: float = setting.TELEGRAM_STREAM_EDIT_INTERVAL,
+    ):
+        """
+        Args:
+            bot (TeleBot): Экземпляр Telegram бота
+            message (Message | None): Отправленное сообщение-заглушка (None, если его не удалось отправить)
+            interval (float): Минимальный интервал между редактированиями в секундах
+        """
+        self.bot = bot
+        self.message = message
+        self.interval = interval
+        self.__edited_at = time.monotonic()
+        self.__text = message.text if message else None
 
-    return str(soup)
+    def update(self, text: str):
+        """
+        Обновляет текст сообщения, если с прошлого редактирования прошло не меньше interval секунд.
+
+        Args:
+            text (str): Полученный на данный момент текст ответа
+        """
+        now = time.monotonic()
+        if self.message is None or now - self.__edited_at < self.interval:
+            return
+        text = text.strip()[:TELEGRAM_MESSAGE_LIMIT]
+        if not text or text == self.__text:
+            return
+        self.__edited_at = now
+        self.__text = text
+        outbound_queue.submit(
+            self.bot.edit_message_text,
+            chat_id=self.message.chat.id,
+            coalesce_key=("edit", self.message.chat.id, self.message.message_id),
+            message_id=self.message.message_id,
+            text=text,
+        )
 
 
 def rating_up(call: CallbackQuery, bot: TeleBot, storage: StorageAPI):
@@ -227,7 +274,7 @@ def edit_rating(
     markup.add(*buttons)
     handler_message(
         bot=bot,
-        text=call.message.text,
+        text=call.message.html_text,
         chat_id=call.message.chat.id,
         user_telegram=user_telegram,
         storage=storage,
@@ -235,6 +282,7 @@ def edit_rating(
         actin="edit",
         message_id=call.message.message_id,
         markup=markup,
+        parse_mode="HTML",
     )
 
 
@@ -259,19 +307,35 @@ def check_activity(
         user_course_id=user_course_id
     )
     if not current_education_stage.active:
-        inactive_course = storage.get_translation(
-            message_key=TranslationKeys.inactive_course_message,
-            language_code=user_telegram.language,
-        )
-        handler_message(
-            bot=bot,
-            text=inactive_course.message_text,
-            chat_id=user_telegram.chat_id,
-            user_telegram=user_telegram,
-            storage=storage,
-            type_message="system",
-            actin="edit",
-            message_id=user_telegram.message_id,
+        send_inactive_course_message(
+            storage=storage, user_telegram=user_telegram, bot=bot
         )
         return
     return current_education_stage
+
+
+def send_inactive_course_message(
+    storage: StorageAPI, user_telegram: TelegramUser, bot: TeleBot
+):
+    """
+    Сообщает пользователю, что курс неактивен, заменяя текст сообщения, в котором была нажата кнопка.
+
+    Args:
+        storage (StorageAPI): Экземпляр для работы с хранилищем данных.
+        user_telegram (TelegramUser): Объект TelegramUser с информацией о пользователе.
+        bot (TeleBot): Экземпляр Telegram бота.
+    """
+    inactive_course = storage.get_translation(
+        message_key=TranslationKeys.inactive_course_message,
+        language_code=user_telegram.language,
+    )
+    handler_message(
+        bot=bot,
+        text=inactive_course.message_text,
+        chat_id=user_telegram.chat_id,
+        user_telegram=user_telegram,
+        storage=storage,
+        type_message="system",
+        actin="edit",
+        message_id=user_telegram.message_id,
+    )
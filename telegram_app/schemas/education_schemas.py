@@ -1,7 +1,7 @@
 import enum
 from typing import Optional
 from pydantic import BaseModel, Field
-from schemas.course_schemas import CurrentStage
+from schemas.course_schemas import CurrentStage, ModuleContentsSchema, UserCoursesSchema
 
 
 class QuestionType(enum.Enum):
@@ -44,6 +44,21 @@ class QuestionsSchema(BaseModel):
     order_number: int = Field(title="Порядковый номер контента", examples=[1])
 
 
+class UserCoursesAdvanceSchema(BaseModel):
+    user_course: UserCoursesSchema = Field(
+        title="Курс пользователя после перехода на следующую стадию"
+    )
+    text_content: Optional[ModuleContentsSchema] = Field(
+        default=None, title="Текст урока для стадии education"
+    )
+    image_content: Optional[ModuleContentsSchema] = Field(
+        default=None, title="Изображение урока для стадии education"
+    )
+    question: Optional[QuestionsSchema] = Field(
+        default=None, title="Вопрос для стадий question и ask_question"
+    )
+
+
 class BaseAnswerSchema(BaseModel):
     response: str | None
 
@@ -57,8 +72,4 @@ class ContentAnswerSchema(BaseAnswerSchema):
 
 
 class HelpSchema(BaseAnswerSchema):
-    pass
-
-
-class MessageStorageSchema(BaseModel):
-    messages: list
+    telegram_html: str | None = None